@@ -101,6 +101,27 @@ DATABASES = {
         'OPTIONS': {
             'driver': 'ODBC Driver 17 for SQL Server'
         },
+        # Загрузка в таблицу sales: 'to_sql', 'fast_executemany', 'multi_values', 'bulk_copy'.
+        # Для 'bulk_copy' STAGING_DIR должен быть доступен SQL Server по тому же пути.
+        # MODE: 'append' - дописывать строки, 'replace' - через промежуточную таблицу в одной транзакции
+        # заменять строки прошлых попыток отчета и отчета, который он заменяет (supersedes при загрузке):
+        # повторная обработка не дублирует строки. LOCK_TIMEOUT (сек) - ожидание параллельной замены
+        'LOADER': {
+            'STRATEGY': 'fast_executemany',
+            'CHUNK_SIZE': 1000,
+            'MAX_PARAMS': 2100,
+            'STAGING_DIR': None,
+            'MODE': 'replace',
+            'LOCK_TIMEOUT': 600,
+        },
+        # Пул соединений общего для процесса SQLAlchemy engine
+        'POOL': {
+            'SIZE': 5,
+            'MAX_OVERFLOW': 10,
+            'TIMEOUT': 30,
+            'PRE_PING': True,
+            'RECYCLE': 1800,
+        },
     }
 }
 
@@ -109,6 +130,85 @@ import os
 
 TEMP_MEDIA_ROOT = os.path.join(BASE_DIR, 'temp_media')
 
+# Очередь обработки отчетов (python manage.py run_etl_workers).
+# Воркер отмечает обрабатываемый отчет раз в HEARTBEAT_INTERVAL секунд; отчет без отметки
+# дольше LEASE_TIMEOUT секунд возвращается в очередь (попытка засчитывается в MAX_RETRIES)
+ETL_QUEUE = {
+    'CONCURRENCY': 2,
+    'MAX_RETRIES': 2,
+    'POLL_INTERVAL': 2.0,
+    'HEARTBEAT_INTERVAL': 30,
+    'LEASE_TIMEOUT': 300,
+}
+
+# Прием загруженных отчетов: файл один раз сохраняется в TEMP_MEDIA_ROOT под уникальным именем,
+# в объектное хранилище он загружается из этой копии в фоновом потоке (ASYNC_STORAGE).
+# DELETE_LOCAL - удалять копию, когда отчет обработан и загружен в хранилище.
+# Загрузки с ошибкой и не завершенные за RETRY_AFTER секунд повторяют свободные воркеры очереди
+ETL_UPLOAD = {
+    'ASYNC_STORAGE': True,
+    'STORAGE_THREADS': 2,
+    'DELETE_LOCAL': True,
+    'MAX_RETRIES': 5,
+    'RETRY_AFTER': 300,
+}
+
+# Пакетная обработка (python manage.py run_etl_batch, POST /api/etl/batches/).
+# PROCESSES: None - по числу ядер
+ETL_BATCH = {
+    'PROCESSES': None,
+}
+
+# Потоковая обработка CSV: файлы от CSV_CHUNKED_MIN_BYTES читаются частями.
+# EXCEL_ENGINE: 'auto' (calamine, если установлен python-calamine), 'calamine', 'openpyxl'
+# SHEETS: 'first' - только первый лист книги, 'all' - все листы с данными одной загрузкой;
+# SHEET_WORKERS - процессов для параллельного чтения листов (None - последовательно)
+ETL_EXTRACT = {
+    'EXCEL_ENGINE': 'auto',
+    'CSV_CHUNK_SIZE': 50000,
+    'CSV_CHUNKED_MIN_BYTES': 50 * 1024 * 1024,
+    'SHEETS': 'first',
+    'SHEET_WORKERS': None,
+}
+
+# Кэш извлеченных из файлов данных (Arrow IPC, нужен pyarrow) по хэшу содержимого файла:
+# повторная обработка того же файла не разбирает Excel заново.
+# MAX_BYTES - размер кэша, при превышении удаляются давно не читавшиеся записи
+ETL_EXTRACT_CACHE = {
+    'ENABLED': True,
+    'DIR': os.path.join(BASE_DIR, 'extract_cache'),
+    'MAX_BYTES': 2 * 1024 ** 3,
+    'STORE_OUTPUT': True,
+}
+
+# Логи pipeline копятся в буфере и сохраняются пачками на границах шагов.
+# BACKGROUND_INTERVAL (сек) - дополнительно сбрасывать буфер фоновым потоком
+ETL_LOG = {
+    'BACKGROUND_INTERVAL': None,
+}
+
+# Определение столбцов по выборке строк для больших отчетов.
+# CONFIG_PATH - файл конфига столбцов (None - reports/etl/transformers/config.json),
+# изменения файла подхватываются без перезапуска.
+# MAPPING_CACHE - повторно использовать соответствие столбцов для того же макета дистрибьютора.
+# PROFILE_WORKERS - процессов для подсчета профилей столбцов (None - в текущем процессе),
+# пул используется для таблиц от PROFILE_MIN_CELLS ячеек
+ETL_TRANSFORM = {
+    'SAMPLE_SIZE': 5000,
+    'SAMPLE_MIN_ROWS': 50000,
+    'SAMPLE_MARGIN': 0.05,
+    'CONFIG_PATH': None,
+    'MAPPING_CACHE': True,
+    'PROFILE_WORKERS': None,
+    'PROFILE_MIN_CELLS': 2_000_000,
+}
+
+# Замеры шагов pipeline (модель StageMetric, GET /api/metrics/).
+# RSS_SAMPLE_INTERVAL (сек) - период опроса RSS для пика памяти, None - только на границах шагов
+ETL_METRICS = {
+    'RSS_SAMPLE_INTERVAL': 0.05,
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
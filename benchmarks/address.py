@@ -0,0 +1,73 @@
+"""
+Сравнение сборки адреса в update_address_column: прежний построчный apply
+против операций над столбцами.
+
+    python -m benchmarks.address [--rows N] [--repeat N]
+"""
+import argparse
+import statistics
+import time
+
+import numpy as np
+import pandas as pd
+
+from reports.etl.transformers.transformers import Transformer
+
+COLUMNS = ["Адрес полностью", "Область/Край", "Город", "Улица, номер дома"]
+
+
+def apply_update_address_column(dataframe):
+    cols = ["Область/Край", "Город", "Улица, номер дома"]
+    dataframe["Адрес полностью"] = dataframe.apply(
+        lambda row: ', '.join(filter(None, [row[col] for col in cols]))
+        if row["Адрес полностью"] in row[cols].values and all(pd.notna(row[col]) and row[col] != '' for col in cols)
+        else row["Адрес полностью"], axis=1
+    )
+    return dataframe
+
+
+def make_addresses(rows, seed=0):
+    """
+    Выходной DataFrame с адресными столбцами: примерно в половине строк
+    "Адрес полностью" совпадает с городом или улицей, часть ячеек пуста.
+
+    """
+    rng = np.random.default_rng(seed)
+    region = rng.choice(np.array(['Пензенская обл.', 'Самарская обл.', '', None], dtype=object), rows,
+                        p=[0.45, 0.45, 0.05, 0.05])
+    city = rng.choice(np.array(['г. Пенза', 'г. Самара', None], dtype=object), rows, p=[0.5, 0.45, 0.05])
+    street = np.array([f'ул. Ленина, д. {i % 200}' for i in range(rows)], dtype=object)
+    full = np.where(rng.random(rows) < 0.5, np.where(rng.random(rows) < 0.5, city, street),
+                    'г. Пенза, ул. Мира, д. 1').astype(object)
+    return pd.DataFrame(dict(zip(COLUMNS, [full, region, city, street])))
+
+
+def measure(func, df, repeat):
+    timings = []
+    for _ in range(repeat):
+        frame = df.copy()
+        start = time.perf_counter()
+        func(frame)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, nargs='*', default=[10000, 50000])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    transformer = Transformer()
+    for rows in args.rows:
+        df = make_addresses(rows)
+        pd.testing.assert_frame_equal(transformer.update_address_column(df.copy()),
+                                      apply_update_address_column(df.copy()))
+
+        before = measure(apply_update_address_column, df, args.repeat)
+        after = measure(transformer.update_address_column, df, args.repeat)
+        print(f'{rows} строк: apply {before:8.3f} с, по столбцам {after:8.3f} с  x{before / after:6.1f}')
+
+
+if __name__ == '__main__':
+    main()
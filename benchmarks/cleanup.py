@@ -0,0 +1,95 @@
+"""
+Сравнение очистки пустых строк и столбцов: прежние циклы по строкам/столбцам
+против масок по всему DataFrame.
+
+    python -m benchmarks.cleanup [--rows N] [--columns N] [--repeat N]
+"""
+import argparse
+import statistics
+import time
+
+import numpy as np
+import pandas as pd
+
+from reports.etl.transformers.transformers import Transformer
+
+
+def loop_clear_excess_columns(df):
+    columns_to_drop = [
+        column_index for column_index in range(df.shape[1])
+        if df.iloc[:, column_index].isna().all()]
+    df.drop(df.columns[columns_to_drop], axis=1, inplace=True)
+    return df
+
+
+def loop_clear_excess_rows(df):
+    rows_to_drop = [
+        row_index for row_index in range(df.shape[0])
+        if df.iloc[row_index, :].isna().all()
+    ]
+    df.drop(rows_to_drop, axis=0, inplace=True)
+    df.reset_index(drop=True, inplace=True)
+    return df
+
+
+def make_sheet(rows, columns, empty_share=0.1, seed=0):
+    """
+    Лист отчета из строковых ячеек: часть строк и столбцов полностью пустые,
+    остальные ячейки пусты с вероятностью 0.3.
+
+    """
+    rng = np.random.default_rng(seed)
+    values = np.array(['Крем детский', 'ООО "Аптека"', '4606711100001', '12', None], dtype=object)
+    data = rng.choice(values, size=(rows, columns), p=[0.2, 0.2, 0.15, 0.15, 0.3])
+    data[rng.random(rows) < empty_share, :] = None
+    data[:, rng.random(columns) < empty_share] = None
+    return pd.DataFrame(data, columns=[f'Столбец {i}' for i in range(columns)])
+
+
+def measure(func, df, repeat):
+    timings = []
+    for _ in range(repeat):
+        frame = df.copy()
+        start = time.perf_counter()
+        func(frame)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def benchmark_sheet(df, repeat):
+    transformer = Transformer()
+    variants = {
+        'цикл': lambda frame: loop_clear_excess_rows(loop_clear_excess_columns(frame)),
+        'маска': lambda frame: transformer.clear_excess_rows(transformer.clear_excess_columns(frame)),
+        'маска, inplace': lambda frame: transformer.clear_excess_rows(
+            transformer.clear_excess_columns(frame, inplace=True), inplace=True),
+    }
+
+    expected = variants['цикл'](df.copy())
+    for func in variants.values():
+        pd.testing.assert_frame_equal(func(df.copy()), expected)
+
+    return {name: measure(func, df, repeat) for name, func in variants.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=100000, help='строк в "высоком" листе')
+    parser.add_argument('--columns', type=int, default=500, help='столбцов в "широком" листе')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    sheets = {
+        f'высокий {args.rows} x 15': make_sheet(args.rows, 15),
+        f'широкий 2000 x {args.columns}': make_sheet(2000, args.columns),
+    }
+    for title, df in sheets.items():
+        results = benchmark_sheet(df, args.repeat)
+        baseline = results['цикл']
+        print(title)
+        for name, seconds in results.items():
+            print(f'  {name:<16} {seconds:8.3f} с  x{baseline / seconds:7.1f}')
+
+
+if __name__ == '__main__':
+    main()
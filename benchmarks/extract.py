@@ -0,0 +1,59 @@
+"""
+Сравнение движков чтения .xlsx на файлах из temp_media.
+
+    python -m benchmarks.extract [файлы...] [--repeat N]
+"""
+import argparse
+import glob
+import os
+import statistics
+import time
+
+import pandas as pd
+
+from reports.etl.extractors.extractors import ExcelExtractor, CalamineWorkbook, rows_to_frame
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def measure(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def benchmark_file(path, repeat):
+    engines = ['openpyxl'] + (['calamine'] if CalamineWorkbook is not None else [])
+    baseline = pd.read_excel(path, dtype='object')
+
+    results = {'pd.read_excel (по умолчанию)': measure(lambda: pd.read_excel(path, dtype='object'), repeat)}
+    for engine in engines:
+        extractor = ExcelExtractor(engine)
+        pd.testing.assert_frame_equal(baseline, extractor.extract(path))
+        pd.testing.assert_frame_equal(baseline, rows_to_frame(extractor.iter_rows(path)))
+
+        results[f'{engine}: extract'] = measure(lambda: extractor.extract(path), repeat)
+        results[f'{engine}: iter_rows'] = measure(lambda: sum(1 for _ in extractor.iter_rows(path)), repeat)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('files', nargs='*')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    files = args.files or sorted(glob.glob(os.path.join(BASE_DIR, 'temp_media', '*.xlsx')))
+    for path in files:
+        results = benchmark_file(path, args.repeat)
+        baseline = results['pd.read_excel (по умолчанию)']
+        print(os.path.basename(path))
+        for name, seconds in results.items():
+            print(f'  {name:<32} {seconds:8.3f} с  x{baseline / seconds:5.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,277 @@
+"""
+Замеры pipeline на синтетических отчетах (benchmarks.synthetic): время, процессорное
+время и пик RSS извлечения, каждого подшага трансформации и загрузки в SQLite.
+Каждый отчет обрабатывается в отдельном процессе, чтобы пик памяти не зависел
+от предыдущих. Результаты сохраняются в JSON для сравнения между коммитами.
+
+    python -m benchmarks.pipeline [--rows N ...] [--formats xlsx xls csv] [--repeat N]
+                                  [--output results.json] [--compare previous.json]
+
+Отчет читается целиком, как файлы меньше CSV_CHUNKED_MIN_BYTES; столбцы каждый
+раз определяются заново (без MappingCache).
+"""
+import os
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'EtlProject.settings')
+django.setup()
+
+import argparse
+import datetime
+import json
+import multiprocessing
+import platform
+import statistics
+import subprocess
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import psutil
+import sqlalchemy
+from sqlalchemy import create_engine
+
+from benchmarks import synthetic
+from reports.etl.extractors.extractors import ExcelExtractor, OldExcelExtractor, CSVExtractor
+from reports.etl.loaders.loader import Loader
+from reports.etl.metrics import PipelineMetrics
+from reports.etl.pipeline import extract_first_sheet, get_extract_settings, get_transformer
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_VERSION = 1
+REPORT_ID = 1
+MONTH = '11'
+PERIOD = '2024-11'
+
+
+class BenchmarkMetrics(PipelineMetrics):
+    """
+    Замеры без сохранения в StageMetric: показатели остаются в results.
+
+    """
+
+    def __init__(self, sample_interval):
+        super().__init__(None, sample_interval)
+        self.results = []
+
+    def save(self):
+        with self.lock:
+            records, self.records = list(self.records.values()), {}
+        self.results += [
+            {'stage': record.stage, 'name': record.name, 'wall_time': record.wall_time, 'cpu_time': record.cpu_time,
+             'peak_rss': record.peak_rss, 'rows': record.rows}
+            for record in records
+        ]
+
+
+def get_extractor(path, engine):
+    if path.endswith('.xlsx'):
+        return ExcelExtractor(engine)
+    if path.endswith('.xls'):
+        return OldExcelExtractor(engine)
+    return CSVExtractor()
+
+
+def run_stages(path, db_engine, options, metrics):
+    """
+    Извлечение, трансформация и загрузка отчета так же, как в run_pipeline.
+
+    Returns:
+        Transformer: Трансформер после обработки (detection_mode).
+    """
+    extractor = get_extractor(path, options['excel_engine'])
+    with metrics.measure('extract') as record:
+        df = extract_first_sheet(extractor, path)
+        record.rows += len(df)
+
+    transformer = get_transformer(metrics)
+    transformer.mapping_cache = None
+    transformed_df = transformer.transform(df, synthetic.DISTRIBUTOR, MONTH)
+    del df
+
+    loader = Loader(db_engine, options['strategy'], {'MODE': options['mode']})
+    with loader.report_load(REPORT_ID, synthetic.DISTRIBUTOR, PERIOD) as target:
+        with metrics.measure('load', rows=len(transformed_df)):
+            target.load(transformed_df)
+            target.commit()
+    return transformer
+
+
+def summarize(runs):
+    """
+    Свести повторы: медиана времени, максимум пика RSS.
+
+    """
+    steps = {}
+    for run in runs:
+        for step in run:
+            steps.setdefault((step['stage'], step['name']), []).append(step)
+
+    return [
+        {
+            'stage': stage,
+            'name': name,
+            'rows': measurements[0]['rows'],
+            'wall_time': statistics.median(step['wall_time'] for step in measurements),
+            'cpu_time': statistics.median(step['cpu_time'] for step in measurements),
+            'peak_rss': max(step['peak_rss'] for step in measurements),
+            'wall_times': [step['wall_time'] for step in measurements],
+        }
+        for (stage, name), measurements in steps.items()
+    ]
+
+
+def run_case(path, options):
+    """
+    Задача отдельного процесса: обработать отчет options['repeat'] раз,
+    каждый раз в новую БД SQLite.
+
+    """
+    rss_start = psutil.Process().memory_info().rss
+    runs = []
+    detection_mode = None
+    for _ in range(options['repeat']):
+        with tempfile.TemporaryDirectory() as directory:
+            db_engine = create_engine(f"sqlite:///{os.path.join(directory, 'reports.sqlite')}")
+            try:
+                with BenchmarkMetrics(options['sample_interval']) as metrics:
+                    detection_mode = run_stages(path, db_engine, options, metrics).detection_mode
+            finally:
+                db_engine.dispose()
+        runs.append(metrics.results)
+    return {'rss_start': rss_start, 'detection_mode': detection_mode, 'steps': summarize(runs)}
+
+
+def benchmark_case(path, options):
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+        return executor.submit(run_case, path, options).result()
+
+
+def git_revision():
+    """
+    Returns:
+        tuple: (коммит, есть ли незафиксированные изменения) или (None, None) вне git.
+    """
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=BASE_DIR, capture_output=True, text=True,
+                                check=True).stdout.strip()
+        status = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=BASE_DIR,
+                                capture_output=True, text=True, check=True).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+    return commit, bool(status.strip())
+
+
+def environment():
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'memory': psutil.virtual_memory().total,
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'sqlalchemy': sqlalchemy.__version__,
+    }
+
+
+def step_title(step):
+    return f"{step['stage']}: {step['name']}" if step['name'] else step['stage']
+
+
+def print_case(case):
+    print(f"{case['format']}, {case['rows']} строк ({case['file_bytes'] / 1024 ** 2:.1f} МБ, "
+          f"столбцы определены: {case['detection_mode']})")
+    for step in case['steps']:
+        print(f"  {step_title(step):<52} {step['wall_time']:8.3f} с  cpu {step['cpu_time']:8.3f} с  "
+              f"RSS {step['peak_rss'] / 1024 ** 2:8.1f} МБ")
+
+
+def compare(previous, current):
+    """
+    Вывести изменение времени и пика памяти шагов относительно прошлых результатов.
+
+    """
+    previous_cases = {(case['format'], case['rows']): case for case in previous['cases'] if 'steps' in case}
+    print(f"Сравнение с {previous.get('commit') or 'предыдущими результатами'}")
+    for case in current['cases']:
+        baseline = previous_cases.get((case['format'], case['rows']))
+        if baseline is None or 'steps' not in case:
+            continue
+        baseline_steps = {(step['stage'], step['name']): step for step in baseline['steps']}
+        print(f"{case['format']}, {case['rows']} строк")
+        for step in case['steps']:
+            before = baseline_steps.get((step['stage'], step['name']))
+            if before is None:
+                continue
+            ratio = before['wall_time'] / step['wall_time'] if step['wall_time'] else float('inf')
+            rss = (step['peak_rss'] - before['peak_rss']) / 1024 ** 2
+            print(f"  {step_title(step):<52} {before['wall_time']:8.3f} -> {step['wall_time']:8.3f} с  "
+                  f"x{ratio:5.2f}  RSS {rss:+8.1f} МБ")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, nargs='*', default=[10000, 100000, 1000000])
+    parser.add_argument('--formats', nargs='*', choices=synthetic.FORMATS, default=list(synthetic.FORMATS))
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--data-dir', default=os.path.join(tempfile.gettempdir(), 'etl_benchmarks'),
+                        help='каталог синтетических отчетов (создаются один раз)')
+    parser.add_argument('--excel-engine', default=get_extract_settings()['EXCEL_ENGINE'])
+    parser.add_argument('--strategy', help='стратегия загрузки (по умолчанию - из настроек загрузчика)')
+    parser.add_argument('--mode', choices=['append', 'replace'], help='режим загрузки (по умолчанию - из настроек)')
+    parser.add_argument('--sample-interval', type=float, default=0.01, help='интервал опроса RSS, с')
+    parser.add_argument('--output', help='файл результатов JSON (по умолчанию pipeline-<коммит>.json в --data-dir)')
+    parser.add_argument('--compare', help='JSON прошлых замеров для сравнения')
+    args = parser.parse_args()
+
+    loader_options = Loader().options
+    options = {
+        'repeat': args.repeat,
+        'excel_engine': args.excel_engine,
+        'strategy': args.strategy or loader_options['STRATEGY'],
+        'mode': args.mode or loader_options['MODE'],
+        'sample_interval': args.sample_interval,
+    }
+    commit, dirty = git_revision()
+    results = {
+        'version': RESULTS_VERSION,
+        'created_at': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        'commit': commit,
+        'dirty': dirty,
+        'environment': environment(),
+        'options': {**options, 'seed': args.seed},
+        'cases': [],
+    }
+
+    for rows in args.rows:
+        for file_format in args.formats:
+            case = {'format': file_format, 'rows': rows}
+            reason = synthetic.unsupported_reason(rows, file_format)
+            if reason:
+                print(f'{file_format}, {rows} строк: пропущено ({reason})')
+                results['cases'].append({**case, 'skipped': reason})
+                continue
+
+            path = synthetic.generate_report(args.data_dir, rows, file_format, args.seed)
+            case.update(file=os.path.basename(path), file_bytes=os.path.getsize(path))
+            case.update(benchmark_case(path, options))
+            results['cases'].append(case)
+            print_case(case)
+
+    output = args.output or os.path.join(args.data_dir, f"pipeline-{(commit or 'nogit')[:10]}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f'Результаты: {output}')
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            compare(json.load(f), results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,217 @@
+"""
+Синтетические отчеты дистрибьюторов для замеров pipeline: по образцу файлов
+из temp_media - служебные строки над заголовком, пустой столбец, кириллические
+адреса, ИНН и штрихкоды числами (часть ИНН теряет ведущий ноль, как в Excel),
+суммы изредка строками вида "1 234,50" и строка "Итого" в конце.
+
+    python -m benchmarks.synthetic КАТАЛОГ [--rows N ...] [--formats xlsx xls csv] [--seed N]
+
+Для .xls нужен xlwt; в .xls на листе не больше XLS_MAX_ROWS строк.
+"""
+import argparse
+import os
+import uuid
+
+import numpy as np
+import pandas as pd
+
+try:
+    import xlwt
+except ImportError:  # Необязательная зависимость: без нее .xls не создаются
+    xlwt = None
+
+FORMATS = ('xlsx', 'xls', 'csv')
+XLS_MAX_ROWS = 65536
+
+DISTRIBUTOR = 'ООО "Синтез-Фарм"'
+TITLE_ROWS = [
+    ['Продажи с 01.11.2024 по 30.11.2024'],
+    [f'Дистрибьютор: {DISTRIBUTOR}'],
+    [],
+]
+HEADER = ['№ п/п', 'Код товара', 'Наименование товара', 'Штрихкод', 'Покупатель', 'ИНН покупателя', None,
+          'Адрес', 'Область', 'Город', 'Улица, дом', 'Количество', 'Сумма']
+
+PRODUCTS = [
+    ('Детский Крем (б/ф) 46 мл', 4606711140415, 66.78),
+    ('АТОПИК бальзам д/ежедневного ухода 100мл', 4606711703276, 312.40),
+    ('Помада губная гигиеническая "Морозко" 2,8 гр', 4606711100532, 42.54),
+    ('Шампунь детский с ромашкой 200 мл', 4606711141184, 118.90),
+    ('Пенка для умывания "Чистая линия" 150 мл', 4606711702859, 154.00),
+    ('Зубная паста детская "Клубника" 50 мл', 4606711707113, 89.35),
+    ('Гель для душа "Морской" 250 мл', 4606711706321, 132.10),
+    ('Масло детское массажное 200 мл', 4606711140736, 141.25),
+    ('Молочко для тела увлажняющее 200 мл', 46067117048250, 176.60),
+    ('Мыло туалетное "Земляничное" 90 гр', 4606711100310, 35.20),
+]
+CLIENTS = ['ООО "Аптека №{}"', 'ИП Хачатрян А.А., аптечный пункт №{}', 'ООО "Здоровье" Аптека №{}',
+           'АО "Фармация" Аптека №{}', 'ООО "Мелодия здоровья" №{}']
+PLACES = [
+    ('440004', 'Пензенская обл', 'Пенза'),
+    ('460048', 'Оренбургская обл', 'Оренбург'),
+    ('423455', 'Татарстан респ', 'Альметьевск'),
+    ('690091', 'Приморский край', 'Владивосток'),
+    ('443001', 'Самарская обл', 'Самара'),
+    ('450077', 'Башкортостан респ', 'Уфа'),
+    ('620014', 'Свердловская обл', 'Екатеринбург'),
+    ('350000', 'Краснодарский край', 'Краснодар'),
+]
+STREETS = ['Ленина', 'Экспериментальная', 'Томилинская', 'Камская', 'Мира', 'Советская', 'Гагарина',
+           'Привокзальная', 'Молодежная', 'Садовая']
+
+
+def make_report(rows, seed=0):
+    """
+    Лист отчета в том виде, как он лежит в файле: служебные строки, заголовок,
+    rows строк данных и итог. Значения - объекты Python, пустые ячейки - None.
+
+    Returns:
+        pd.DataFrame: Без заголовков столбцов (как pd.read_excel(header=None)).
+    """
+    rng = np.random.default_rng(seed)
+    product = rng.integers(len(PRODUCTS), size=rows)
+    client = rng.integers(2000, size=rows)
+    place = client % len(PLACES)
+    street = rng.integers(len(STREETS), size=rows)
+    house = rng.integers(1, 250, size=rows)
+    quantity = rng.integers(1, 48, size=rows)
+    # ИНН: юр. лица - 10 цифр, ИП - 12; у кодов регионов 01-09 ведущий ноль теряется в числе
+    inn = np.where(client % len(CLIENTS) == 1,
+                   rng.integers(10 ** 10, 10 ** 12, size=rows),
+                   rng.integers(10 ** 8, 10 ** 10, size=rows))
+    text_sum = rng.random(rows) < 0.05
+
+    data = []
+    for i in range(rows):
+        name, barcode, price = PRODUCTS[product[i]]
+        index, region, city = PLACES[place[i]]
+        street_house = f'ул {STREETS[street[i]]}, д. {house[i]}'
+        amount = round(float(quantity[i]) * price, 2)
+        data.append([
+            i + 1,
+            f'026A{product[i]:03d}{barcode % 10000:04d}',
+            name,
+            barcode,
+            CLIENTS[client[i] % len(CLIENTS)].format(client[i]),
+            int(inn[i]),
+            None,
+            f'{index}, {region}, г {city}, {street_house}',
+            region,
+            f'г {city}',
+            street_house,
+            int(quantity[i]),
+            f'{amount:,.2f}'.replace(',', ' ').replace('.', ',') if text_sum[i] else amount,
+        ])
+
+    footer = [[], ['Итого'] + [None] * (len(HEADER) - 3) + [int(quantity.sum()), None]]
+    lines = TITLE_ROWS + [HEADER] + data + footer
+    return pd.DataFrame([line + [None] * (len(HEADER) - len(line)) for line in lines], dtype=object)
+
+
+def write_xlsx(df, path):
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('Отгрузки')
+    for row in df.itertuples(index=False):
+        sheet.append(list(row))
+    workbook.save(path)
+
+
+def write_xls(df, path):
+    if xlwt is None:
+        raise RuntimeError('Для создания .xls установите xlwt')
+    if len(df) > XLS_MAX_ROWS:
+        raise ValueError(f'В .xls не больше {XLS_MAX_ROWS} строк на листе, получено {len(df)}')
+
+    workbook = xlwt.Workbook(encoding='utf-8')
+    sheet = workbook.add_sheet('Отгрузки')
+    for row_index, row in enumerate(df.itertuples(index=False)):
+        for column_index, value in enumerate(row):
+            if value is not None:
+                sheet.write(row_index, column_index, value)
+    workbook.save(path)
+
+
+def write_csv(df, path):
+    df.to_csv(path, header=False, index=False, encoding='utf-8')
+
+
+WRITERS = {'xlsx': write_xlsx, 'xls': write_xls, 'csv': write_csv}
+
+
+def total_rows(rows):
+    """
+    Число строк листа вместе со служебными строками и итогом.
+
+    """
+    return rows + len(TITLE_ROWS) + 3
+
+
+def unsupported_reason(rows, file_format):
+    """
+    Причина, по которой отчет в этом формате не создать, или None.
+
+    """
+    if file_format == 'xls' and xlwt is None:
+        return 'не установлен xlwt'
+    if file_format == 'xls' and total_rows(rows) > XLS_MAX_ROWS:
+        return f'в .xls не больше {XLS_MAX_ROWS} строк на листе'
+    return None
+
+
+def report_path(directory, rows, file_format, seed=0):
+    return os.path.join(directory, f'synthetic_{rows}_{seed}.{file_format}')
+
+
+def generate_report(directory, rows, file_format, seed=0, overwrite=False, df=None):
+    """
+    Создать файл отчета, если его еще нет. Файл записывается под временным
+    именем и переименовывается, поэтому прерванная генерация не оставляет
+    неполный отчет.
+
+    Args:
+        df (pd.DataFrame | None): Готовый результат make_report(rows, seed).
+
+    Returns:
+        str: Путь к файлу.
+    """
+    path = report_path(directory, rows, file_format, seed)
+    if os.path.exists(path) and not overwrite:
+        return path
+
+    os.makedirs(directory, exist_ok=True)
+    partial_path = os.path.join(directory, f'.{uuid.uuid4().hex}.{file_format}')
+    try:
+        WRITERS[file_format](make_report(rows, seed) if df is None else df, partial_path)
+        os.replace(partial_path, path)
+    finally:
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('directory')
+    parser.add_argument('--rows', type=int, nargs='*', default=[10000, 100000, 1000000])
+    parser.add_argument('--formats', nargs='*', choices=FORMATS, default=list(FORMATS))
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--overwrite', action='store_true')
+    args = parser.parse_args()
+
+    for rows in args.rows:
+        df = None
+        for file_format in args.formats:
+            reason = unsupported_reason(rows, file_format)
+            if reason:
+                print(f'{rows} строк, {file_format}: пропущено ({reason})')
+                continue
+            if df is None:
+                df = make_report(rows, args.seed)
+            path = generate_report(args.directory, rows, file_format, args.seed, args.overwrite, df)
+            print(f'{rows} строк, {file_format}: {path} ({os.path.getsize(path) / 1024 ** 2:.1f} МБ)')
+
+
+if __name__ == '__main__':
+    main()
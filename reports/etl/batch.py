@@ -0,0 +1,194 @@
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.conf import settings
+from django.db import close_old_connections, connections
+from django.db.models import Count, F
+from django.utils import timezone
+
+from reports.etl.pipeline import run_pipeline
+from reports.etl.queue import Heartbeat, get_queue_settings
+from reports.etl.uploads import cleanup_local_file, ensure_local_file
+from reports.models import ReportInfo, ReportBatch
+
+BATCH_DEFAULTS = {
+    'PROCESSES': None,  # None - по числу ядер
+}
+
+STATUSES = [status for status, _ in ReportInfo.STATUS_CHOICES]
+
+
+def get_batch_settings():
+    return {**BATCH_DEFAULTS, **getattr(settings, 'ETL_BATCH', {})}
+
+
+def get_processes(processes=None):
+    return processes or get_batch_settings()['PROCESSES'] or os.cpu_count() or 1
+
+
+def claim_report(report_id):
+    """
+    Захватить конкретный отчет условным UPDATE. Отчеты, которые уже обрабатывает
+    очередь или другой пакет, и обработанные отчеты не захватываются.
+
+    """
+    claimed = ReportInfo.objects.filter(id=report_id, status__in=['queued', 'error']).update(
+        status='processing',
+        attempts=F('attempts') + 1,
+        heartbeat_at=timezone.now(),
+        updated_at=timezone.now()
+    )
+    if claimed:
+        return ReportInfo.objects.get(id=report_id)
+    return None
+
+
+def process_report(report_id, max_retries):
+    """
+    Задача пакета: обработать отчет, повторяя при ошибке до max_retries раз.
+
+    Returns:
+        tuple: (report_id, итоговый статус или 'skipped', время в секундах).
+    """
+    close_old_connections()
+    start = time.perf_counter()
+    status = 'skipped'
+    try:
+        while True:
+            report = claim_report(report_id)
+            if report is None:
+                break
+            with Heartbeat(report.id):
+                run_pipeline(report.local_path, report.id, report.distributor, report.month,
+                             report.restart_stage, fetch_file=lambda: ensure_local_file(report))
+            report.refresh_from_db(fields=['status', 'attempts'])
+            status = report.status
+            if status != 'error' or report.attempts > max_retries:
+                break
+        if status != 'skipped':
+            cleanup_local_file(report_id)
+    finally:
+        close_old_connections()
+    return report_id, status, time.perf_counter() - start
+
+
+def _init_worker():
+    import django
+    django.setup()
+
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    # У каждого процесса пула свои соединения с БД
+    connections.close_all()
+
+
+class BatchProgress:
+    """
+    Сводный прогресс пакета для вывода после каждого обработанного отчета.
+
+    """
+
+    def __init__(self, total):
+        self.total = total
+        self.finished = 0
+        self.counts = {}
+        self.start = time.perf_counter()
+
+    def add(self, status):
+        self.finished += 1
+        self.counts[status] = self.counts.get(status, 0) + 1
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.start
+
+
+def run_batch(report_ids, processes=None, max_retries=None, progress=None):
+    """
+    Обработать отчеты в пуле из processes процессов.
+
+    Args:
+        progress: Функция (BatchProgress, report_id, status, seconds), вызывается после каждого отчета.
+
+    Returns:
+        dict: report_id -> итоговый статус.
+    """
+    processes = get_processes(processes)
+    if max_retries is None:
+        max_retries = get_queue_settings()['MAX_RETRIES']
+
+    report_ids = list(report_ids)
+    tracker = BatchProgress(len(report_ids))
+    results = {}
+
+    def finish(report_id, status, seconds):
+        results[report_id] = status
+        tracker.add(status)
+        if progress is not None:
+            progress(tracker, report_id, status, seconds)
+
+    if processes == 1:
+        for report_id in report_ids:
+            finish(*process_report(report_id, max_retries))
+        return results
+
+    # Соединения родителя не должны достаться процессам пула
+    connections.close_all()
+    with ProcessPoolExecutor(max_workers=min(processes, len(report_ids) or 1), initializer=_init_worker) as pool:
+        futures = [pool.submit(process_report, report_id, max_retries) for report_id in report_ids]
+        for future in as_completed(futures):
+            finish(*future.result())
+    return results
+
+
+def run_report_batch(batch, processes=None, max_retries=None, progress=None):
+    """
+    Обработать отчеты пакета ReportBatch и отметить его завершение.
+
+    """
+    ReportBatch.objects.filter(id=batch.id).update(status='running')
+    report_ids = list(batch.reports.order_by('id').values_list('id', flat=True))
+    try:
+        return run_batch(report_ids, processes or batch.processes, max_retries, progress)
+    finally:
+        ReportBatch.objects.filter(id=batch.id).update(status='done', finished_at=timezone.now())
+
+
+def batch_progress(batch):
+    """
+    Прогресс пакета по статусам его отчетов.
+
+    """
+    counts = dict.fromkeys(STATUSES, 0)
+    counts.update(batch.reports.values_list('status').annotate(count=Count('id')).order_by())
+    total = sum(counts.values())
+    finished = counts['done'] + counts['error']
+    return {
+        'id': batch.id,
+        'status': batch.status,
+        'processes': batch.processes,
+        'total': total,
+        'finished': finished,
+        'percent': round(100 * finished / total, 1) if total else 100.0,
+        'counts': counts,
+        'created_at': batch.created_at,
+        'finished_at': batch.finished_at,
+    }
+
+
+def launch_batch(batch):
+    """
+    Запустить run_etl_batch для пакета отдельным процессом, не дожидаясь завершения.
+    Код завершения забирает фоновый поток, иначе в веб-воркере остаются зомби-процессы.
+
+    """
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(settings.BASE_DIR, 'manage.py'), 'run_etl_batch', '--batch', str(batch.id)],
+        start_new_session=True,
+    )
+    threading.Thread(target=process.wait, name=f'etl-batch-{batch.id}-reaper', daemon=True).start()
+    return process
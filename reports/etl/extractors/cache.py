@@ -0,0 +1,293 @@
+import datetime
+import hashlib
+import json
+import logging
+import os
+import shutil
+import uuid
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+except ImportError:  # Необязательная зависимость: без нее кэш извлечения отключен
+    pa = None
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+META_FILE = 'meta.json'
+HASH_BLOCK_SIZE = 1024 * 1024
+
+# Вид значения ячейки -> в каком столбце Arrow хранится значение
+NULL, STR, INT, FLOAT, BOOL, TIMESTAMP, DATETIME, TIMEDELTA, NAT, DATE, TIME = range(11)
+INT64_MIN, INT64_MAX = np.iinfo(np.int64).min, np.iinfo(np.int64).max
+EPOCH = datetime.datetime(1970, 1, 1)
+
+
+class UnsupportedValue(TypeError):
+    pass
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def microseconds(delta):
+    return delta // datetime.timedelta(microseconds=1)
+
+
+def encode_value(value):
+    """
+    Returns:
+        tuple: (вид, строка, целое, число с плавающей точкой).
+    """
+    if value is None:
+        return NULL, None, 0, 0.0
+    if isinstance(value, str):
+        return STR, value, 0, 0.0
+    if isinstance(value, bool):
+        return BOOL, None, int(value), 0.0
+    if isinstance(value, int):
+        if not INT64_MIN <= value <= INT64_MAX:
+            raise UnsupportedValue(f'Целое вне int64: {value}')
+        return INT, None, value, 0.0
+    if isinstance(value, float):
+        return FLOAT, None, 0, value
+    if value is pd.NaT:
+        return NAT, None, 0, 0.0
+    if isinstance(value, pd.Timestamp) and value.tzinfo is None:
+        return TIMESTAMP, None, value.value, 0.0
+    if isinstance(value, datetime.datetime) and value.tzinfo is None:
+        return DATETIME, None, microseconds(value - EPOCH), 0.0
+    if isinstance(value, pd.Timedelta):
+        return TIMEDELTA, None, value.value, 0.0
+    if isinstance(value, datetime.date) and not isinstance(value, datetime.datetime):
+        return DATE, None, value.toordinal(), 0.0
+    if isinstance(value, datetime.time) and value.tzinfo is None:
+        return TIME, None, microseconds(datetime.datetime.combine(datetime.date.min, value)
+                                        - datetime.datetime.min), 0.0
+    raise UnsupportedValue(f'Неподдерживаемое значение {type(value).__name__}')
+
+
+def encode_frame(df):
+    """
+    DataFrame с object-столбцами -> таблица Arrow. Ячейки с разными типами
+    одного столбца раскладываются по типизированным столбцам: k<i> - вид значения,
+    s<i>/n<i>/f<i> - строка, целое, число с плавающей точкой (только нужные).
+
+    Returns:
+        tuple: (pa.Table, описание столбцов для meta.json).
+    """
+    if not isinstance(df.index, pd.RangeIndex) or df.index.start != 0 or df.index.step != 1:
+        raise UnsupportedValue('Ожидается RangeIndex')
+
+    arrays = {}
+    columns = []
+    for position, (name, series) in enumerate(df.items()):
+        if series.dtype != object:
+            raise UnsupportedValue(f'Столбец {name!r}: ожидается dtype object')
+        kind, _, _, _ = encode_value(name)
+        if kind not in (STR, INT, FLOAT):
+            raise UnsupportedValue(f'Неподдерживаемое название столбца {name!r}')
+        columns.append(name)
+
+        kinds, strings, ints, floats = zip(*map(encode_value, series.tolist())) if len(series) else ((), (), (), ())
+        kinds = np.array(kinds, dtype=np.int8)
+        arrays[f'k{position}'] = pa.array(kinds)
+        if (kinds == STR).any():
+            arrays[f's{position}'] = pa.array(strings, type=pa.string())
+        if np.isin(kinds, (INT, BOOL, TIMESTAMP, DATETIME, TIMEDELTA, DATE, TIME)).any():
+            arrays[f'n{position}'] = pa.array(np.array(ints, dtype=np.int64))
+        if (kinds == FLOAT).any():
+            arrays[f'f{position}'] = pa.array(np.array(floats, dtype=np.float64))
+
+    return pa.table(arrays) if arrays else pa.table({}), {'columns': columns, 'rows': len(df)}
+
+
+def decode_frame(table, meta):
+    """
+    Обратное преобразование encode_frame: значения и их типы восстанавливаются точно.
+
+    """
+    data = {}
+    names = set(table.column_names)
+    for position, name in enumerate(meta['columns']):
+        kinds = table.column(f'k{position}').to_numpy()
+        values = np.full(len(kinds), None, dtype=object)
+
+        if f's{position}' in names:
+            mask = kinds == STR
+            values[mask] = table.column(f's{position}').to_numpy(zero_copy_only=False)[mask]
+        if f'f{position}' in names:
+            mask = kinds == FLOAT
+            values[mask] = table.column(f'f{position}').to_numpy()[mask]
+        if f'n{position}' in names:
+            ints = table.column(f'n{position}').to_numpy()
+            converters = {
+                INT: lambda numbers: numbers,
+                BOOL: lambda numbers: numbers.astype(bool),
+                TIMESTAMP: lambda numbers: pd.to_datetime(numbers).astype(object),
+                DATETIME: lambda numbers: pd.to_datetime(numbers, unit='us').to_pydatetime(),
+                TIMEDELTA: lambda numbers: pd.to_timedelta(numbers).astype(object),
+                DATE: lambda numbers: [datetime.date.fromordinal(number) for number in numbers.tolist()],
+                TIME: lambda numbers: [(datetime.datetime.min + datetime.timedelta(microseconds=number)).time()
+                                       for number in numbers.tolist()],
+            }
+            for kind, convert in converters.items():
+                mask = kinds == kind
+                if mask.any():
+                    values[mask] = np.asarray(convert(ints[mask]), dtype=object)
+        values[kinds == NAT] = pd.NaT
+        data[position] = values
+
+    df = pd.DataFrame(data, index=pd.RangeIndex(meta['rows']), dtype=object)
+    df.columns = pd.Index(meta['columns'])
+    return df
+
+
+class ExtractCache:
+    """
+    Кэш извлеченных из файлов DataFrame в формате Arrow IPC. В нем же хранятся
+    результаты трансформации отчетов для повторной загрузки (output_key).
+
+    Ключ - SHA-256 содержимого файла и вариант извлечения (экстрактор, движок,
+    листы), поэтому повторная обработка того же файла, в том числе загруженного
+    повторно, не разбирает Excel заново. Файлы читаются через memory map.
+    Запись (каталог с meta.json и файлом на каждый лист) атомарна; при
+    превышении max_bytes удаляются давно не читавшиеся записи.
+
+    """
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    def key(self, path, variant, digest=None):
+        """
+        Args:
+            digest (str | None): Уже известный SHA-256 файла - тогда файл не читается.
+        """
+        return f'{digest or file_hash(path)}-{variant}'
+
+    def output_key(self, report_id):
+        return f'report-{report_id}-output'
+
+    def entry_path(self, key):
+        return os.path.join(self.directory, key)
+
+    def get(self, key):
+        """
+        Returns:
+            dict | None: название листа -> DataFrame или None, если записи нет.
+        """
+        entry = self.entry_path(key)
+        try:
+            with open(os.path.join(entry, META_FILE), encoding='utf-8') as f:
+                meta = json.load(f)
+            if meta.get('version') != FORMAT_VERSION:
+                return None
+
+            frames = {}
+            for sheet in meta['sheets']:
+                with pa.memory_map(os.path.join(entry, sheet['file']), 'r') as source:
+                    # Буферы таблицы ссылаются на отображенный файл: разбираем до закрытия
+                    table = pa.ipc.open_file(source).read_all()
+                    if sheet.get('format') == 'pandas':
+                        frames[sheet['name']] = table.to_pandas()
+                    else:
+                        frames[sheet['name']] = decode_frame(table, sheet)
+            os.utime(os.path.join(entry, META_FILE))  # отметка для LRU
+        except (OSError, ValueError, KeyError, pa.ArrowException) as e:
+            if not isinstance(e, FileNotFoundError):
+                logger.warning('Запись кэша извлечения %s не прочитана: %s', key, e)
+            return None
+        return frames
+
+    def put(self, key, frames, replace=False):
+        """
+        Сохранить листы. Извлеченные object-столбцы кодируются encode_frame,
+        типизированные (результат трансформации) сохраняются средствами pyarrow.
+        Возвращает False, если значения нельзя сохранить в Arrow или запись
+        не удалась - обработка продолжается без кэша.
+
+        Args:
+            replace (bool): Заменить существующую запись с тем же ключом.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        partial = os.path.join(self.directory, f'.{key}.{uuid.uuid4().hex}')
+        try:
+            os.makedirs(partial)
+            sheets = []
+            for position, (name, df) in enumerate(frames.items()):
+                if all(dtype == object for dtype in df.dtypes):
+                    table, meta = encode_frame(df)
+                else:
+                    table, meta = pa.Table.from_pandas(df, preserve_index=False), {'format': 'pandas'}
+                file_name = f'{position}.arrow'
+                with pa.OSFile(os.path.join(partial, file_name), 'wb') as sink:
+                    with pa.ipc.new_file(sink, table.schema) as writer:
+                        writer.write_table(table)
+                sheets.append({'name': name, 'file': file_name, **meta})
+
+            with open(os.path.join(partial, META_FILE), 'w', encoding='utf-8') as f:
+                json.dump({'version': FORMAT_VERSION, 'sheets': sheets}, f, ensure_ascii=False)
+            if replace:
+                self.remove(key)
+            os.rename(partial, self.entry_path(key))
+        except (OSError, UnsupportedValue, pa.ArrowException) as e:
+            shutil.rmtree(partial, ignore_errors=True)
+            if not os.path.isdir(self.entry_path(key)):  # запись уже могла сохранить другая обработка
+                logger.warning('Извлеченные данные не сохранены в кэш %s: %s', key, e)
+            return False
+
+        try:
+            self.evict()
+        except OSError as e:  # запись уже сохранена, вытеснение повторит следующая
+            logger.warning('Не удалось вытеснить записи кэша извлечения: %s', e)
+        return True
+
+    def remove(self, key):
+        entry = self.entry_path(key)
+        trash = os.path.join(self.directory, f'.{key}.{uuid.uuid4().hex}.removed')
+        try:
+            os.rename(entry, trash)  # читатели не увидят частично удаленную запись
+        except FileNotFoundError:
+            return
+        shutil.rmtree(trash, ignore_errors=True)
+
+    def entries(self):
+        """
+        Returns:
+            list: (время последнего чтения, размер в байтах, путь) по записям кэша.
+        """
+        entries = []
+        for name in os.listdir(self.directory):
+            entry = os.path.join(self.directory, name)
+            meta = os.path.join(entry, META_FILE)
+            if name.startswith('.') or not os.path.isfile(meta):
+                continue
+            try:
+                size = sum(os.path.getsize(os.path.join(entry, file)) for file in os.listdir(entry))
+                entries.append((os.path.getmtime(meta), size, entry))
+            except FileNotFoundError:  # запись удалила или заменила другая обработка
+                continue
+        return entries
+
+    def evict(self):
+        """
+        Удалить давно не читавшиеся записи, пока общий размер больше max_bytes.
+
+        """
+        entries = sorted(self.entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, entry in entries:
+            if total <= self.max_bytes:
+                break
+            self.remove(os.path.basename(entry))
+            total -= size
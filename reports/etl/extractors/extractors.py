@@ -1,14 +1,187 @@
+import datetime
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
 import pandas as pd
+from pandas.io.parsers import TextParser
+
+try:
+    from python_calamine import CalamineWorkbook
+except ImportError:  # Необязательная зависимость: без нее используется openpyxl/xlrd
+    CalamineWorkbook = None
+
+
+def resolve_excel_engine(engine, fallback):
+    """
+    Выбрать движок чтения Excel. 'auto' - calamine, если он установлен, иначе fallback.
+
+    """
+    if engine == 'auto':
+        return 'calamine' if CalamineWorkbook is not None else fallback
+    if engine == 'calamine' and CalamineWorkbook is None:
+        raise ImportError("Для движка 'calamine' нужен пакет python-calamine")
+    return engine
+
+
+def convert_cell(value):
+    """
+    Привести значение ячейки к тому же виду, что и pd.read_excel:
+    целые числа с плавающей точкой - к int, даты - к Timestamp, пустые строки - к None.
+
+    """
+    if isinstance(value, str) and not value:
+        return None
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if isinstance(value, datetime.date) and not isinstance(value, datetime.datetime):
+        return pd.Timestamp(value)
+    if isinstance(value, datetime.timedelta):
+        return pd.Timedelta(value)
+    return value
+
+
+def iter_calamine_rows(path):
+    workbook = CalamineWorkbook.from_path(path)
+    sheet = workbook.get_sheet_by_index(0)
+    for row in sheet.iter_rows():
+        yield tuple(convert_cell(value) for value in row)
+
+
+def rows_to_frame(rows):
+    """
+    Собрать DataFrame из строк так же, как pd.read_excel(dtype='object'):
+    первая строка становится заголовком, пустые хвосты строк отбрасываются.
+
+    """
+    data = []
+    for row in rows:
+        row = ["" if value is None else value for value in row]
+        while row and row[-1] == "":
+            row.pop()
+        data.append(row)
+
+    while data and not data[-1]:
+        data.pop()
+    if not data:
+        return pd.DataFrame()
+
+    width = max(len(row) for row in data)
+    data = [row + [""] * (width - len(row)) for row in data]
+    return TextParser(data, header=0, dtype=object).read()
+
+
+def read_sheet(path, engine, sheet_name):
+    return pd.read_excel(path, sheet_name=sheet_name, dtype='object', engine=engine)
+
+
+def sheet_has_data(df):
+    """
+    На листе есть данные, если кроме первой строки есть хотя бы одна непустая ячейка.
+
+    """
+    return bool(df.notna().to_numpy().any())
+
+
+def read_sheets(path, engine, workers=None):
+    """
+    Прочитать все листы книги с данными. Несколько листов читаются параллельно
+    в workers процессах: каждый процесс открывает книгу сам и разбирает свой лист.
+
+    Returns:
+        dict: название листа -> DataFrame, в порядке листов книги. Пустые листы пропускаются.
+    """
+    with pd.ExcelFile(path, engine=engine) as workbook:
+        names = workbook.sheet_names
+        if not workers or workers < 2 or len(names) < 2:
+            sheets = {name: workbook.parse(name, dtype='object') for name in names}
+            return {name: df for name, df in sheets.items() if sheet_has_data(df)}
+
+    try:
+        with ProcessPoolExecutor(max_workers=min(workers, len(names))) as pool:
+            frames = list(pool.map(read_sheet, [path] * len(names), [engine] * len(names), names))
+    except BrokenProcessPool:
+        return read_sheets(path, engine)
+    return {name: df for name, df in zip(names, frames) if sheet_has_data(df)}
+
 
 class ExcelExtractor:
+    def __init__(self, engine='auto'):
+        """
+        Args:
+            engine (str): 'auto', 'calamine' или 'openpyxl'.
+        """
+        self.engine = resolve_excel_engine(engine, 'openpyxl')
+
     def extract(self, path):
-        return pd.read_excel(path, dtype='object')
+        return pd.read_excel(path, dtype='object', engine=self.engine)
+
+    def extract_sheets(self, path, workers=None):
+        """
+        Все листы книги с данными (см. read_sheets).
+
+        """
+        return read_sheets(path, self.engine, workers)
+
+    def iter_rows(self, path):
+        """
+        Построчно читать первый лист, не загружая книгу целиком.
+        Пустые ячейки - None.
+
+        """
+        if self.engine == 'calamine':
+            yield from iter_calamine_rows(path)
+            return
+
+        from openpyxl import load_workbook
+
+        workbook = load_workbook(path, read_only=True, data_only=True, keep_links=False)
+        try:
+            for row in workbook.worksheets[0].iter_rows(values_only=True):
+                yield tuple(convert_cell(value) for value in row)
+        finally:
+            workbook.close()
+
 
 class OldExcelExtractor:
+    def __init__(self, engine='auto'):
+        """
+        Args:
+            engine (str): 'auto', 'calamine' или 'xlrd'.
+        """
+        self.engine = resolve_excel_engine(engine, 'xlrd')
+
     def extract(self, path):
-        return pd.read_excel(path, dtype='object', engine='xlrd')
+        return pd.read_excel(path, dtype='object', engine=self.engine)
+
+    def extract_sheets(self, path, workers=None):
+        """
+        Все листы книги с данными (см. read_sheets).
+
+        """
+        return read_sheets(path, self.engine, workers)
+
+    def iter_rows(self, path):
+        """
+        Построчно читать первый лист. xlrd не умеет читать .xls потоково,
+        поэтому без calamine лист читается целиком.
+
+        """
+        if self.engine == 'calamine':
+            yield from iter_calamine_rows(path)
+            return
+
+        df = pd.read_excel(path, dtype='object', engine=self.engine, header=None)
+        for row in df.itertuples(index=False):
+            yield tuple(None if pd.isna(value) else value for value in row)
 
 
 class CSVExtractor:
     def extract(self, path):
-        return pd.read_csv(path, dtype='object')
\ No newline at end of file
+        return pd.read_csv(path, dtype='object')
+
+    def extract_chunks(self, path, chunksize):
+        """
+        Читать CSV частями по chunksize строк, не загружая файл целиком.
+
+        """
+        return pd.read_csv(path, dtype='object', chunksize=chunksize)
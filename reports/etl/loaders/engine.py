@@ -0,0 +1,132 @@
+import os
+import threading
+
+from django.conf import settings
+from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+
+POOL_DEFAULTS = {
+    'SIZE': 5,
+    'MAX_OVERFLOW': 10,
+    'TIMEOUT': 30,
+    'PRE_PING': True,
+    'RECYCLE': 1800,
+}
+
+_engines = {}
+_lock = threading.Lock()
+
+
+def build_connection_url(db_conf):
+    """
+    Строка подключения SQLAlchemy по настройкам Django из settings.DATABASES.
+
+    """
+    if db_conf['ENGINE'] == 'django.db.backends.sqlite3':
+        return f"sqlite:///{db_conf['NAME']}"
+
+    user = db_conf['USER']
+    password = db_conf['PASSWORD']
+    host = db_conf['HOST']
+    port = db_conf.get('PORT', '1433')
+    name = db_conf['NAME']
+    driver = db_conf['OPTIONS']['driver']
+
+    return (
+        f"mssql+pyodbc://{user}:{password}@{host}:{port}/{name}"
+        f"?driver={driver.replace(' ', '+')}"
+    )
+
+
+def get_pool_settings(alias='reports'):
+    return {**POOL_DEFAULTS, **settings.DATABASES[alias].get('POOL', {})}
+
+
+def get_engine(alias='reports', **engine_kwargs):
+    """
+    Общий для процесса engine отчетной БД. Создается при первом обращении и
+    переиспользуется всеми загрузками с той же конфигурацией.
+
+    Args:
+        alias (str): Ключ settings.DATABASES.
+        engine_kwargs: Дополнительные параметры create_engine (например, fast_executemany).
+    """
+    url = build_connection_url(settings.DATABASES[alias])
+    pool = get_pool_settings(alias)
+    key = (alias, url, tuple(sorted(pool.items())), tuple(sorted(engine_kwargs.items())))
+
+    engine = _engines.get(key)
+    if engine is None:
+        with _lock:
+            engine = _engines.get(key)
+            if engine is None:
+                engine = create_engine(
+                    url,
+                    pool_size=pool['SIZE'],
+                    max_overflow=pool['MAX_OVERFLOW'],
+                    pool_timeout=pool['TIMEOUT'],
+                    pool_pre_ping=pool['PRE_PING'],
+                    pool_recycle=pool['RECYCLE'],
+                    **engine_kwargs
+                )
+                _engines[key] = engine
+    return engine
+
+
+def pool_metrics():
+    """
+    Состояние пулов всех созданных engine: размер, занятые и свободные соединения,
+    соединения сверх размера пула.
+
+    """
+    metrics = []
+    for (alias, url, _, _), engine in list(_engines.items()):
+        pool = engine.pool
+        metrics.append({
+            'alias': alias,
+            'url': make_url(url).render_as_string(hide_password=True),
+            'pid': os.getpid(),
+            'size': pool.size(),
+            'checked_in': pool.checkedin(),
+            'checked_out': pool.checkedout(),
+            'overflow': pool.overflow(),
+            'max_overflow': getattr(pool, '_max_overflow', None),
+        })
+    return metrics
+
+
+def pool_summary():
+    """
+    Краткое описание состояния пулов для SystemLog.
+
+    """
+    return '; '.join(
+        f"{metric['alias']}: size={metric['size']}, checked_out={metric['checked_out']}, "
+        f"checked_in={metric['checked_in']}, overflow={metric['overflow']}"
+        for metric in pool_metrics()
+    ) or None
+
+
+def dispose_engines():
+    """
+    Закрыть пулы всех engine.
+
+    """
+    with _lock:
+        for engine in _engines.values():
+            engine.dispose()
+        _engines.clear()
+
+
+def _reset_after_fork():
+    # Соединения пула, унаследованные при fork, нельзя использовать в дочернем процессе.
+    # Блокировка могла быть захвачена другим потоком родителя, поэтому создается заново.
+    global _lock
+    _lock = threading.Lock()
+    for engine in _engines.values():
+        engine.dispose(close=False)
+    _engines.clear()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
@@ -1,24 +1,220 @@
+import hashlib
+import uuid
+
 import pandas as pd
-from sqlalchemy import create_engine
+from sqlalchemy import BigInteger, Index, MetaData, Table, inspect, select, text
+from sqlalchemy.engine import make_url
 from django.conf import settings
 
+from reports.etl.loaders.engine import build_connection_url, get_engine
+from reports.etl.loaders.strategies import get_strategy
+from reports.etl.schema import sql_types
+
+LOADER_DEFAULTS = {
+    'STRATEGY': 'to_sql',
+    'CHUNK_SIZE': 1000,
+    'MAX_PARAMS': 2100,
+    'STAGING_DIR': None,
+    'MODE': 'append',
+    'LOCK_TIMEOUT': 600,  # с: ожидание блокировки дистрибьютора и периода в режиме 'replace'
+}
+
+LOAD_MODES = ('append', 'replace')
+
+# Ключ строк отчета в режиме 'replace'
+REPORT_COLUMN = 'ID отчета'
+
+
 class Loader:
+    def __init__(self, engine=None, strategy=None, options=None):
+        """
+        Args:
+            engine: Готовый SQLAlchemy engine. По умолчанию берется общий engine
+                процесса для settings.DATABASES['reports'].
+            strategy (str): Стратегия загрузки. По умолчанию DATABASES['reports']['LOADER']['STRATEGY'].
+            options (dict): Переопределение настроек DATABASES['reports']['LOADER'].
+        """
+        self.db_conf = settings.DATABASES['reports']
+        self.options = {**LOADER_DEFAULTS, **self.db_conf.get('LOADER', {}), **(options or {})}
+        self.strategy = get_strategy(strategy or self.options['STRATEGY'], self.options)
+        self.engine = engine
+        if self.options['MODE'] not in LOAD_MODES:
+            raise ValueError(f"Неизвестный режим загрузки: {self.options['MODE']}. Доступны: {', '.join(LOAD_MODES)}")
+
+    def get_engine(self):
+        if self.engine is None:
+            url = make_url(build_connection_url(self.db_conf))
+            self.engine = get_engine('reports', **self.strategy.engine_kwargs(url))
+        return self.engine
+
+    def load(self, df, table='sales', dtype=None):
+        """
+        Args:
+            dtype (dict | None): Типы SQLAlchemy столбцов. По умолчанию - по OUTPUT_SCHEMA.
+        """
+        self.strategy.load(df, table, self.get_engine(), sql_types(df.columns) if dtype is None else dtype)
+
+    def report_load(self, report_id, distributor, period, table='sales', superseded=(), check=None):
+        """
+        Загрузка одного отчета в режиме из настроек MODE: 'append' - строки
+        дописываются в таблицу, 'replace' - через промежуточную таблицу с заменой
+        строк прошлых попыток этого отчета и заменяемых им отчетов (ReplaceReportLoad).
+
+        Args:
+            period (str): Период отчета 'ГГГГ-ММ': загрузки одного дистрибьютора и периода
+                в режиме 'replace' выполняются по очереди.
+            superseded (Iterable[int]): ID отчетов, строки которых заменяет этот отчет.
+            check (Callable | None): Проверка перед фиксацией замены (под блокировкой);
+                исключение отменяет загрузку.
+        """
+        if self.options['MODE'] == 'replace':
+            return ReplaceReportLoad(self, report_id, distributor, period, table, superseded, check)
+        return AppendReportLoad(self, table)
+
+
+class AppendReportLoad:
+    """
+    Части отчета сразу дописываются в таблицу.
+
+    """
+
+    def __init__(self, loader, table):
+        self.loader = loader
+        self.table = table
+        self.rows = 0
+
     def load(self, df):
+        self.loader.load(df, self.table)
+        self.rows += len(df)
+
+    def commit(self):
+        return self.rows
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
+
+
+class ReplaceReportLoad:
+    """
+    Идемпотентная загрузка отчета по ID отчета.
+
+    Части отчета загружаются выбранной стратегией в промежуточную таблицу.
+    commit() в одной транзакции удаляет из основной таблицы строки этого же
+    отчета от прошлых попыток и строки заменяемых отчетов (superseded) и
+    переносит строки из промежуточной таблицы. Другие отчеты дистрибьютора
+    за тот же месяц (другие склады, другие годы) не затрагиваются. Удаление
+    идет по индексу ID отчета, поэтому повторная загрузка стоит столько же,
+    сколько первая. Без commit() основная таблица не меняется.
+
+    Замены одного дистрибьютора и периода выполняются по очереди (lock): иначе
+    загрузка заменяемого отчета, зафиксированная после заменяющего, оставила
+    бы в таблице обе версии.
+
+    """
+
+    def __init__(self, loader, report_id, distributor, period, table, superseded=(), check=None):
+        self.loader = loader
+        self.report_id = report_id
+        self.distributor = distributor
+        self.period = period
+        self.table = table
+        self.superseded = list(superseded)
+        self.check = check
+        self.stage_table = f'{table}_stage_{report_id}_{uuid.uuid4().hex[:8]}'
+        self.template = None
+        self.rows = 0
+
+    def load(self, df):
+        df = df.assign(**{REPORT_COLUMN: self.report_id})
+        if self.template is None:
+            self.template = df.head(0)
+        self.loader.load(df, self.stage_table, self.sql_types(df))
+        self.rows += len(df)
+
+    def sql_types(self, df):
+        return {**sql_types(df.columns), REPORT_COLUMN: BigInteger()}
+
+    def prepare_table(self, engine):
+        """
+        Создать основную таблицу, если ее нет, добавить столбец ID отчета и индекс по нему.
+
+        """
+        if not inspect(engine).has_table(self.table):
+            self.template.to_sql(self.table, con=engine, if_exists='append', index=False,
+                                 dtype=self.sql_types(self.template))
+
+        quote = engine.dialect.identifier_preparer.quote
+        columns = {column['name'] for column in inspect(engine).get_columns(self.table)}
+        if REPORT_COLUMN not in columns:
+            with engine.begin() as connection:
+                connection.exec_driver_sql(f'ALTER TABLE {quote(self.table)} ADD {quote(REPORT_COLUMN)} BIGINT')
+
+        table = Table(self.table, MetaData(), autoload_with=engine)
+        Index(f'ix_{self.table}_report_id', table.c[REPORT_COLUMN]).create(engine, checkfirst=True)
+        return table
+
+    def lock(self, connection):
+        """
+        Блокировка дистрибьютора и периода до конца транзакции: sp_getapplock в SQL Server,
+        pg_advisory_xact_lock в PostgreSQL. SQLite блокирует запись в БД целиком
+        до конца транзакции, в остальных СУБД транзакция выполняется как SERIALIZABLE.
+
+        """
+        key = hashlib.sha1(f'{self.table}|{self.distributor}|{self.period}'.encode()).hexdigest()
+        timeout = self.loader.options['LOCK_TIMEOUT']
+        dialect = connection.dialect.name
+        if dialect == 'mssql':
+            result = connection.execute(text(
+                "SET NOCOUNT ON; DECLARE @result int; "
+                "EXEC @result = sp_getapplock @Resource = :resource, @LockMode = 'Exclusive', "
+                "@LockOwner = 'Transaction', @LockTimeout = :timeout; SELECT @result"
+            ), {'resource': f'etl_report_load:{key}', 'timeout': int(timeout * 1000)}).scalar()
+            if result < 0:
+                raise TimeoutError(f'Не получена блокировка загрузки {self.distributor} за {self.period}: '
+                                   f'sp_getapplock вернул {result}')
+        elif dialect == 'postgresql':
+            connection.execute(text(f"SET LOCAL lock_timeout = '{int(timeout * 1000)}ms'"))
+            connection.execute(text('SELECT pg_advisory_xact_lock(hashtext(:key))'), {'key': key})
+
+    def commit(self):
+        """
+        Заменить строки прошлых попыток отчета и заменяемых отчетов строками отчета.
+
+        Returns:
+            int: Число загруженных строк.
+        """
+        if self.template is None:
+            return 0  # пустой отчет не удаляет ранее загруженные строки
 
-        db_conf = settings.DATABASES['reports']
+        engine = self.loader.get_engine()
+        table = self.prepare_table(engine)
+        stage = Table(self.stage_table, MetaData(), autoload_with=engine)
+        columns = [column.name for column in stage.columns]
 
-        user = db_conf['USER']
-        password = db_conf['PASSWORD']
-        host = db_conf['HOST']
-        port = db_conf.get('PORT', '1433')
-        name = db_conf['NAME']
-        driver = db_conf['OPTIONS']['driver']
+        with engine.connect() as connection:
+            if connection.dialect.name not in ('mssql', 'postgresql', 'sqlite'):
+                connection.execution_options(isolation_level='SERIALIZABLE')
+            with connection.begin():
+                self.lock(connection)
+                connection.execute(table.delete().where(
+                    table.c[REPORT_COLUMN].in_([self.report_id, *self.superseded])))
+                # После DELETE: в SQLite блокировка записи берется только на нем
+                if self.check is not None:
+                    self.check()
+                connection.execute(table.insert().from_select(columns, select(*(stage.c[name] for name in columns))))
+        return self.rows
 
-        conn_str = (
-            f"mssql+pyodbc://{user}:{password}@{host}:{port}/{name}"
-            f"?driver={driver.replace(' ', '+')}"
-        )
+    def drop_stage(self, engine):
+        with engine.begin() as connection:
+            Table(self.stage_table, MetaData()).drop(connection, checkfirst=True)
 
-        engine = create_engine(conn_str)
+    def __enter__(self):
+        return self
 
-        df.to_sql('sales', con=engine, if_exists='append', index=False)
+    def __exit__(self, exc_type, exc_value, traceback):
+        # Промежуточная таблица удаляется и после commit(), и при ошибке
+        if self.template is not None:
+            self.drop_stage(self.loader.get_engine())
@@ -0,0 +1,162 @@
+import csv
+import os
+import tempfile
+import uuid
+
+from sqlalchemy import inspect
+
+
+class LoadStrategy:
+    """
+    Способ загрузки DataFrame в таблицу отчетной БД.
+
+    """
+    name = None
+
+    def __init__(self, options):
+        self.options = options
+
+    def engine_kwargs(self, url):
+        """
+        Дополнительные параметры create_engine, нужные стратегии.
+
+        """
+        return {}
+
+    def load(self, df, table, engine, dtype=None):
+        """
+        Args:
+            dtype (dict | None): Типы SQLAlchemy столбцов для создания таблицы.
+        """
+        raise NotImplementedError
+
+
+class ToSqlStrategy(LoadStrategy):
+    """
+    DataFrame.to_sql с настройками по умолчанию: по одному INSERT на строку.
+
+    """
+    name = 'to_sql'
+
+    def load(self, df, table, engine, dtype=None):
+        df.to_sql(table, con=engine, if_exists='append', index=False, dtype=dtype)
+
+
+class FastExecutemanyStrategy(LoadStrategy):
+    """
+    pyodbc fast_executemany: параметры всей пачки строк передаются на сервер
+    одним обращением. На других драйверах работает как обычный executemany.
+
+    """
+    name = 'fast_executemany'
+
+    def engine_kwargs(self, url):
+        if url.get_backend_name() == 'mssql' and url.get_driver_name() == 'pyodbc':
+            return {'fast_executemany': True}
+        return {}
+
+    def load(self, df, table, engine, dtype=None):
+        df.to_sql(table, con=engine, if_exists='append', index=False, chunksize=self.options['CHUNK_SIZE'],
+                  dtype=dtype)
+
+
+class MultiValuesStrategy(LoadStrategy):
+    """
+    INSERT ... VALUES (...), (...), ... по CHUNK_SIZE строк в одном запросе.
+    Размер пачки уменьшается, чтобы не превысить MAX_PARAMS параметров запроса
+    (2100 для SQL Server).
+
+    """
+    name = 'multi_values'
+
+    def rows_per_statement(self, df):
+        max_rows = max(1, (self.options['MAX_PARAMS'] - 1) // max(1, len(df.columns)))
+        return min(self.options['CHUNK_SIZE'], max_rows)
+
+    def load(self, df, table, engine, dtype=None):
+        df.to_sql(table, con=engine, if_exists='append', index=False, method='multi',
+                  chunksize=self.rows_per_statement(df), dtype=dtype)
+
+
+class BulkCopyStrategy(LoadStrategy):
+    """
+    Выгрузка DataFrame во временный CSV и загрузка файла целиком.
+
+    SQL Server читает файл сам через BULK INSERT, поэтому STAGING_DIR должен быть
+    доступен серверу по тому же пути. Для остальных СУБД файл загружается
+    пачками через executemany драйвера.
+
+    """
+    name = 'bulk_copy'
+
+    def load(self, df, table, engine, dtype=None):
+        # Создаем таблицу, если ее еще нет, и выравниваем порядок столбцов по ней:
+        # BULK INSERT сопоставляет поля файла со столбцами по позиции.
+        df.head(0).to_sql(table, con=engine, if_exists='append', index=False, dtype=dtype)
+        columns = [column['name'] for column in inspect(engine).get_columns(table)]
+        df = df.reindex(columns=columns)
+
+        path = self.stage(df)
+        try:
+            if engine.dialect.name == 'mssql':
+                self.bulk_insert(path, table, engine)
+            else:
+                self.copy_rows(path, table, columns, engine)
+        finally:
+            os.remove(path)
+
+    def stage(self, df):
+        staging_dir = self.options['STAGING_DIR'] or tempfile.gettempdir()
+        os.makedirs(staging_dir, exist_ok=True)
+        path = os.path.join(staging_dir, f'sales_{uuid.uuid4().hex}.csv')
+        df.to_csv(path, index=False, encoding='utf-8', lineterminator='\n')
+        return path
+
+    def bulk_insert(self, path, table, engine):
+        statement = (
+            f"BULK INSERT [{table}] FROM '{path}' "
+            f"WITH (FORMAT = 'CSV', FIRSTROW = 2, CODEPAGE = '65001', "
+            f"FIELDTERMINATOR = ',', ROWTERMINATOR = '0x0a', TABLOCK)"
+        )
+        with engine.begin() as connection:
+            connection.exec_driver_sql(statement)
+
+    def copy_rows(self, path, table, columns, engine):
+        quote = engine.dialect.identifier_preparer.quote
+        placeholder = '?' if engine.dialect.paramstyle == 'qmark' else '%s'
+        statement = (
+            f"INSERT INTO {quote(table)} ({', '.join(quote(column) for column in columns)}) "
+            f"VALUES ({', '.join(placeholder for _ in columns)})"
+        )
+        chunk_size = self.options['CHUNK_SIZE']
+
+        connection = engine.raw_connection()
+        try:
+            cursor = connection.cursor()
+            with open(path, encoding='utf-8', newline='') as staged:
+                reader = csv.reader(staged)
+                next(reader)  # заголовок
+                batch = []
+                for row in reader:
+                    batch.append([value if value != '' else None for value in row])
+                    if len(batch) >= chunk_size:
+                        cursor.executemany(statement, batch)
+                        batch = []
+                if batch:
+                    cursor.executemany(statement, batch)
+            connection.commit()
+        finally:
+            connection.close()
+
+
+STRATEGIES = {
+    strategy.name: strategy
+    for strategy in (ToSqlStrategy, FastExecutemanyStrategy, MultiValuesStrategy, BulkCopyStrategy)
+}
+
+
+def get_strategy(name, options):
+    try:
+        return STRATEGIES[name](options)
+    except KeyError:
+        raise ValueError(f"Неизвестная стратегия загрузки: {name}. Доступны: {', '.join(STRATEGIES)}")
@@ -1,5 +1,15 @@
+import atexit
+import threading
+import weakref
+
+from django.db import connection
+from django.utils import timezone
+
 from reports.models import SystemLog
 
+_active_buffers = weakref.WeakSet()
+
+
 def log_to_db(report_id, message, step='other', log_level='info', details=None):
     SystemLog.objects.create(
         report_id=report_id,
@@ -8,3 +18,91 @@ def log_to_db(report_id, message, step='other', log_level='info', details=None):
         log_level=log_level,
         details=details
     )
+
+
+class LogBuffer:
+    """
+    Буфер SystemLog одного отчета. Записи копятся в памяти с временем вызова log()
+    и сохраняются одним bulk_create: при смене шага, при ошибке, при выходе из
+    контекста и, если задан background_interval, фоновым потоком.
+
+    """
+
+    def __init__(self, report_id, background_interval=None):
+        self.report_id = report_id
+        self.entries = []
+        self.current_step = None
+        self.lock = threading.Lock()
+        # Сохранение выполняется под отдельной блокировкой, чтобы пачки из фонового
+        # потока и основного не перемешались и id шли в порядке записи
+        self.flush_lock = threading.Lock()
+        self.stop_event = None
+        self.thread = None
+
+        if background_interval:
+            self.stop_event = threading.Event()
+            self.thread = threading.Thread(
+                target=self.background_flush, args=(background_interval,),
+                name=f'log-buffer-{report_id}', daemon=True
+            )
+            self.thread.start()
+
+        _active_buffers.add(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def log(self, message, step='other', log_level='info', details=None):
+        entry = SystemLog(
+            report_id=self.report_id,
+            message=message,
+            step=step,
+            log_level=log_level,
+            details=details,
+            timestamp=timezone.now()
+        )
+
+        with self.lock:
+            step_changed = self.current_step is not None and step != self.current_step
+            self.current_step = step
+
+        if step_changed:
+            self.flush()
+
+        with self.lock:
+            self.entries.append(entry)
+
+        if log_level == 'error':
+            self.flush()
+
+    def flush(self):
+        with self.flush_lock:
+            with self.lock:
+                entries, self.entries = self.entries, []
+            if entries:
+                SystemLog.objects.bulk_create(entries)
+
+    def background_flush(self, interval):
+        try:
+            while not self.stop_event.wait(interval):
+                self.flush()
+        finally:
+            # У потока свое соединение с БД, его нужно закрыть
+            connection.close()
+
+    def close(self):
+        if self.thread is not None:
+            self.stop_event.set()
+            self.thread.join()
+            self.thread = None
+        self.flush()
+        _active_buffers.discard(self)
+
+
+@atexit.register
+def flush_active_buffers():
+    for buffer in list(_active_buffers):
+        buffer.close()
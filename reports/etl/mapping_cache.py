@@ -0,0 +1,29 @@
+from django.db.models import F
+from django.utils import timezone
+
+from reports.models import ColumnMapping
+
+
+class MappingCache:
+    """
+    Соответствия столбцов, сохраненные в ColumnMapping по дистрибьютору и
+    отпечатку заголовков (см. Transformer.map_columns).
+
+    """
+
+    def get(self, distributor, fingerprint):
+        """
+        Returns:
+            dict | None: new_column -> позиция исходного столбца или None.
+        """
+        entry = ColumnMapping.objects.filter(distributor=distributor, fingerprint=fingerprint).first()
+        if entry is None:
+            return None
+        ColumnMapping.objects.filter(id=entry.id).update(hits=F('hits') + 1, last_used_at=timezone.now())
+        return entry.mapping
+
+    def put(self, distributor, fingerprint, mapping):
+        ColumnMapping.objects.update_or_create(
+            distributor=distributor, fingerprint=fingerprint,
+            defaults={'mapping': mapping, 'last_used_at': timezone.now()},
+        )
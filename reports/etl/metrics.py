@@ -0,0 +1,175 @@
+import os
+import socket
+import threading
+import time
+from contextlib import contextmanager
+
+import psutil
+from django.db import transaction
+from django.utils import timezone
+
+from reports.etl.loaders.engine import pool_metrics
+from reports.models import PoolMetric, StageMetric
+
+POOL_METRIC_FIELDS = ('alias', 'url', 'size', 'checked_in', 'checked_out', 'overflow', 'max_overflow')
+
+
+class StageRecord:
+    """
+    Накопленные показатели одного шага. Повторные замеры с тем же (stage, name),
+    например по частям CSV, суммируются, а пик памяти берется максимальный.
+
+    """
+
+    def __init__(self, stage, name):
+        self.stage = stage
+        self.name = name
+        self.wall_time = 0.0
+        self.cpu_time = 0.0
+        self.peak_rss = 0
+        self.rows = 0
+
+    def update_peak(self, rss):
+        if rss > self.peak_rss:
+            self.peak_rss = rss
+
+
+class PipelineMetrics:
+    """
+    Замеры шагов pipeline одного отчета: время, процессорное время, пик RSS и
+    число строк. RSS опрашивается фоновым потоком каждые sample_interval секунд;
+    без него пик считается только по началу и концу шага.
+
+    Показатели сохраняются в StageMetric при выходе из контекста.
+
+    """
+
+    def __init__(self, report_id, sample_interval=None):
+        self.report_id = report_id
+        self.sample_interval = sample_interval
+        self.process = psutil.Process()
+        self.records = {}  # (stage, name) -> StageRecord, в порядке первого замера
+        self.active = []
+        self.lock = threading.Lock()
+        self.stop_event = None
+        self.thread = None
+
+    def __enter__(self):
+        if self.sample_interval:
+            self.stop_event = threading.Event()
+            self.thread = threading.Thread(
+                target=self.sample_rss, name=f'metrics-{self.report_id}', daemon=True
+            )
+            self.thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def rss(self):
+        return self.process.memory_info().rss
+
+    def sample_rss(self):
+        while not self.stop_event.wait(self.sample_interval):
+            rss = self.rss()
+            with self.lock:
+                for record in self.active:
+                    record.update_peak(rss)
+
+    @contextmanager
+    def measure(self, stage, name='', rows=0):
+        """
+        Замерить блок кода как шаг stage (extract, transform, load).
+
+        Args:
+            name (str): Подшаг, например функция из columns_config. '' - шаг целиком.
+            rows (int): Число обработанных строк, можно дополнить через record.rows.
+
+        Yields:
+            StageRecord: Накопленные показатели шага.
+        """
+        with self.lock:
+            record = self.records.setdefault((stage, name), StageRecord(stage, name))
+            record.rows += rows
+            record.update_peak(self.rss())
+            self.active.append(record)
+
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        try:
+            yield record
+        finally:
+            wall = time.perf_counter() - wall_start
+            cpu = time.process_time() - cpu_start
+            with self.lock:
+                record.wall_time += wall
+                record.cpu_time += cpu
+                record.update_peak(self.rss())
+                self.active.remove(record)
+
+    def iterate(self, stage, iterable, name=''):
+        """
+        Замерить получение каждого элемента итератора, например чтение частей CSV.
+        Строки считаются по len() элементов.
+
+        """
+        iterator = iter(iterable)
+        while True:
+            with self.measure(stage, name) as record:
+                item = next(iterator, None)
+                if item is not None:
+                    record.rows += len(item)
+            if item is None:
+                return
+            yield item
+
+    def close(self):
+        if self.thread is not None:
+            self.stop_event.set()
+            self.thread.join()
+            self.thread = None
+        self.save()
+
+    def save(self):
+        with self.lock:
+            records, self.records = list(self.records.values()), {}
+
+        StageMetric.objects.bulk_create([
+            StageMetric(
+                report_id=self.report_id,
+                stage=record.stage,
+                name=record.name,
+                wall_time=record.wall_time,
+                cpu_time=record.cpu_time,
+                peak_rss=record.peak_rss,
+                rows=record.rows,
+            )
+            for record in records
+        ])
+
+
+def worker_name():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def save_pool_metrics():
+    """
+    Сохранить состояние пулов соединений процесса в PoolMetric: снимок заменяет
+    предыдущий снимок этого процесса.
+
+    """
+    worker = worker_name()
+    updated_at = timezone.now()
+    rows = [PoolMetric(worker=worker, updated_at=updated_at, **{field: metric[field] for field in POOL_METRIC_FIELDS})
+            for metric in pool_metrics()]
+    with transaction.atomic():
+        PoolMetric.objects.filter(worker=worker).delete()
+        PoolMetric.objects.bulk_create(rows)
+
+
+def clear_pool_metrics():
+    """
+    Удалить снимок пулов процесса при остановке воркера.
+
+    """
+    PoolMetric.objects.filter(worker=worker_name()).delete()
@@ -1,69 +1,414 @@
+from django.conf import settings
 from django.utils import timezone
 
-from reports.etl.extractors.extractors import ExcelExtractor, OldExcelExtractor, CSVExtractor
+from reports.etl.extractors import cache
+from reports.etl.extractors.extractors import ExcelExtractor, OldExcelExtractor, CSVExtractor, rows_to_frame
+from reports.etl.loaders.engine import pool_summary
 from reports.etl.loaders.loader import Loader
-from reports.etl.logger import log_to_db
+from reports.etl.logger import LogBuffer
+from reports.etl.mapping_cache import MappingCache
+from reports.etl.metrics import PipelineMetrics, save_pool_metrics
+from reports.etl.transformers.config_manager import get_config_manager
+from reports.etl.transformers.header import HeaderDetector
 from reports.etl.transformers.transformers import Transformer
-import tracemalloc
-import time
-import psutil
+import itertools
 import os
 
 from reports.models import ReportInfo
 
 
-def run_pipeline(local_path, report_id, distr, month):
-    try:
-        # process = psutil.Process(os.getpid())
-        # start_mem = process.memory_info().rss
-        #
-        # start = time.perf_counter()
+EXTRACT_DEFAULTS = {
+    'EXCEL_ENGINE': 'auto',
+    'CSV_CHUNK_SIZE': 50000,
+    'CSV_CHUNKED_MIN_BYTES': 50 * 1024 * 1024,
+    'SHEETS': 'first',
+    'SHEET_WORKERS': None,
+}
 
-        log_to_db(report_id, 'Запуск обработки файла')
+EXTRACT_CACHE_DEFAULTS = {
+    'ENABLED': True,
+    'DIR': None,  # None - каталог extract_cache рядом с TEMP_MEDIA_ROOT
+    'MAX_BYTES': 2 * 1024 ** 3,
+    'STORE_OUTPUT': True,  # сохранять результат трансформации для повторной загрузки (reprocess с шага load)
+}
 
-        if local_path.endswith(".xlsx") :
-            log_to_db(report_id, 'Начало извлечения .xlsx', step='extract')
-            extractor = ExcelExtractor()
-        elif local_path.endswith(".xls"):
-            log_to_db(report_id, 'Начало извлечения .xls', step='extract')
-            extractor = OldExcelExtractor()
-        elif local_path.endswith(".csv"):
-            log_to_db(report_id, 'Начало извлечения .csv', step='extract')
-            extractor = CSVExtractor()
-        else:
-            log_to_db(report_id, 'Расширение не соответствует требованиям', step='extract', log_level='error',
-                      details=ValueError("Unsupported file format"))
-            raise ValueError("Unsupported file format")
+TRANSFORM_DEFAULTS = {
+    'SAMPLE_SIZE': None,
+    'SAMPLE_MIN_ROWS': 50000,
+    'SAMPLE_MARGIN': 0.05,
+    'CONFIG_PATH': None,
+    'MAPPING_CACHE': True,
+    'PROFILE_WORKERS': None,
+    'PROFILE_MIN_CELLS': 2_000_000,
+}
 
-        df = extractor.extract(local_path)
+LOG_DEFAULTS = {
+    'BACKGROUND_INTERVAL': None,
+}
+
+METRICS_DEFAULTS = {
+    'RSS_SAMPLE_INTERVAL': 0.05,
+}
+
+DETECTION_MODES = {
+    'sample': 'по выборке строк',
+    'full': 'по всем строкам',
+    'cache': 'по сохраненному соответствию дистрибьютора',
+}
+
+RESTART_STAGES = {
+    'extract': 'извлечения',
+    'transform': 'трансформации',
+    'load': 'загрузки',
+}
+
+
+def get_transformer(metrics=None):
+    options = {**TRANSFORM_DEFAULTS, **getattr(settings, 'ETL_TRANSFORM', {})}
+    return Transformer(
+        sample_size=options['SAMPLE_SIZE'],
+        sample_min_rows=options['SAMPLE_MIN_ROWS'],
+        sample_margin=options['SAMPLE_MARGIN'],
+        metrics=metrics,
+        config_manager=get_config_manager(options['CONFIG_PATH']),
+        mapping_cache=MappingCache() if options['MAPPING_CACHE'] else None,
+        profile_workers=options['PROFILE_WORKERS'],
+        profile_min_cells=options['PROFILE_MIN_CELLS'],
+    )
+
+
+def get_extract_settings():
+    return {**EXTRACT_DEFAULTS, **getattr(settings, 'ETL_EXTRACT', {})}
+
+
+def get_extract_cache_settings():
+    return {**EXTRACT_CACHE_DEFAULTS, **getattr(settings, 'ETL_EXTRACT_CACHE', {})}
+
+
+def get_extract_cache():
+    """
+    Кэш извлечения из настроек или None, если он выключен или не установлен pyarrow.
+
+    """
+    options = get_extract_cache_settings()
+    if not options['ENABLED'] or cache.pa is None:
+        return None
+    directory = options['DIR'] or os.path.join(os.path.dirname(settings.TEMP_MEDIA_ROOT), 'extract_cache')
+    return cache.ExtractCache(directory, options['MAX_BYTES'])
+
+
+def extract_first_sheet(extractor, local_path):
+    """
+    Первый лист отчета. Excel читается построчно (iter_rows): заголовок ищется по мере
+    чтения (HeaderDetector.detect_rows) по тем же правилам, что для pd.read_excel, и в
+    DataFrame собираются только строки данных под ним, без служебных строк.
+    Трансформация находит этот заголовок в первой строке.
+    CSV и .xls без calamine (xlrd читает лист только целиком) читаются как есть.
+
+    """
+    if isinstance(extractor, CSVExtractor) or extractor.engine not in ('calamine', 'openpyxl'):
+        return extractor.extract(local_path)
+    headers, rows = HeaderDetector().detect_rows(extractor.iter_rows(local_path))
+    # Заголовки ставятся после сборки: rows_to_frame переименовал бы повторяющиеся
+    df = rows_to_frame(itertools.chain([list(range(len(headers)))], rows))
+    df.columns = headers + [f'Unnamed: {i}' for i in range(len(headers), df.shape[1])]
+    return df
+
+
+def extract_cached(extractor, local_path, sheets, logs, refresh=False, report_id=None, fetch_file=None):
+    """
+    Извлечь листы файла через кэш: при повторной обработке того же файла
+    данные читаются из Arrow IPC без разбора Excel. Хэш файла сохраняется
+    в отчете, поэтому при попадании в кэш файл не нужен локально.
+
+    Args:
+        sheets (str): 'first' - один DataFrame (extract), 'all' - все листы (extract_sheets).
+        refresh (bool): Извлечь файл заново и перезаписать запись кэша (reprocess с шага extract).
+        fetch_file (callable | None): Получить локальную копию файла, когда нужно его содержимое.
+
+    Returns:
+        dict: название листа (None для 'first') -> DataFrame.
+    """
+    def extract():
+        if fetch_file is not None:
+            fetch_file()
+        if sheets == 'all':
+            return extractor.extract_sheets(local_path, get_extract_settings()['SHEET_WORKERS'])
+        return {None: extract_first_sheet(extractor, local_path)}
+
+    extract_cache = get_extract_cache()
+    if extract_cache is None:
+        return extract()
+
+    variant = '-'.join(filter(None, [type(extractor).__name__, getattr(extractor, 'engine', None), sheets]))
+    digest = None
+    if report_id is not None and not refresh:  # извлечение заново пересчитывает и хэш
+        digest = ReportInfo.objects.filter(id=report_id).values_list('file_hash', flat=True).first()
+    if digest is None:
+        if fetch_file is not None:
+            fetch_file()
+        digest = cache.file_hash(local_path)
+        if report_id is not None:
+            ReportInfo.objects.filter(id=report_id).update(file_hash=digest)
+    key = extract_cache.key(local_path, variant, digest)
+    frames = None if refresh else extract_cache.get(key)
+    if frames is not None:
+        logs.log('Данные извлечены из кэша', step='extract', details=key)
+        return frames
+
+    frames = extract()
+    extract_cache.put(key, frames, replace=refresh)
+    return frames
+
+
+def store_output(report_id, df):
+    """
+    Сохранить результат трансформации отчета в кэш: повторная обработка с шага
+    load загружает его без извлечения и трансформации.
+
+    """
+    extract_cache = get_extract_cache()
+    if extract_cache is not None and get_extract_cache_settings()['STORE_OUTPUT']:
+        extract_cache.put(extract_cache.output_key(report_id), {None: df}, replace=True)
+
+
+def get_stored_output(report_id):
+    """
+    Returns:
+        pd.DataFrame | None: Сохраненный результат трансформации или None, если его нет.
+    """
+    extract_cache = get_extract_cache()
+    if extract_cache is None:
+        return None
+    frames = extract_cache.get(extract_cache.output_key(report_id))
+    return frames[None] if frames is not None else None
+
+
+def use_chunked_csv(local_path):
+    """
+    Большие CSV обрабатываются потоково, чтобы память не зависела от размера файла.
+
+    """
+    return os.path.getsize(local_path) >= get_extract_settings()['CSV_CHUNKED_MIN_BYTES']
+
+
+def log_detection_mode(logs, transformer):
+    logs.log(f'Столбцы определены {DETECTION_MODES[transformer.detection_mode]}', step='transform',
+             details=transformer.detection_details)
+
+
+def log_dropped_codes(logs, transformer):
+    if transformer.dropped_codes:
+        logs.log('Значения, не являющиеся кодом, не загружены', step='transform',
+                 details=', '.join(f'{column}: {count}' for column, count in transformer.dropped_codes.items()))
+
+
+def run_chunked_csv(extractor, local_path, report_id, distr, month, logs, metrics):
+    """
+    Потоковая обработка CSV: каждая часть сразу после трансформации загружается в БД,
+    поэтому в памяти одновременно находится только одна часть файла.
+
+    """
+    chunksize = get_extract_settings()['CSV_CHUNK_SIZE']
+    chunks = metrics.iterate('extract', extractor.extract_chunks(local_path, chunksize))
+
+    ReportInfo.objects.filter(id=report_id).update(status='processing', updated_at=timezone.now())
+
+    logs.log(f'Начало потоковой обработки .csv частями по {chunksize} строк', step='transform')
+    transformer = get_transformer(metrics)
+
+    rows = 0
+    with report_load(report_id, distr, month) as target:
+        for part in transformer.transform_chunks(chunks, distr, month):
+            if rows == 0:
+                log_detection_mode(logs, transformer)
+            with metrics.measure('load', rows=len(part)):
+                target.load(part)
+            rows += len(part)
+        with metrics.measure('load', 'commit'):
+            target.commit()
+
+    log_dropped_codes(logs, transformer)
+    logs.log(f'Потоковая обработка завершена, загружено строк: {rows}', step='load')
+
+
+def run_sheets(extractor, local_path, report_id, distr, month, logs, metrics, refresh=False, fetch_file=None):
+    """
+    Обработка всех листов книги с данными: листы читаются параллельно,
+    трансформируются и загружаются одним DataFrame.
+
+    """
+    with metrics.measure('extract') as record:
+        sheets = extract_cached(extractor, local_path, 'all', logs, refresh, report_id, fetch_file)
+        record.rows += sum(len(df) for df in sheets.values())
+    logs.log(f'Извлечено листов с данными: {len(sheets)}', step='extract', details=', '.join(sheets))
+
+    ReportInfo.objects.filter(id=report_id).update(status='processing', updated_at=timezone.now())
+
+    logs.log('Начало трансформации листов', step='transform')
+    transformer = get_transformer(metrics)
+    transformed_df = transformer.transform_sheets(sheets, distr, month)
+    if transformer.skipped_sheets:
+        logs.log('Листы без строк данных пропущены', step='transform', details=', '.join(transformer.skipped_sheets))
+    log_detection_mode(logs, transformer)
+    log_dropped_codes(logs, transformer)
+    logs.log(f'Трансформация завершена, макетов листов: {transformer.sheet_layouts}', step='transform')
+    store_output(report_id, transformed_df)
+
+    logs.log('Начало загрузки отчета в БД', step='load')
+    load_report(transformed_df, report_id, distr, month, metrics)
+
+
+def superseded_report_ids(report):
+    """
+    ID отчетов, которые заменяет отчет: заменяемый им, заменяемый тем и т.д.
+
+    """
+    report_ids = []
+    while report.supersedes_id:
+        report_ids.append(report.supersedes_id)
+        report = ReportInfo.objects.only('supersedes_id').get(id=report.supersedes_id)
+    return report_ids
+
+
+def check_not_superseded(report_id):
+    superseding_id = ReportInfo.objects.filter(supersedes_id=report_id).values_list('id', flat=True).first()
+    if superseding_id:
+        raise ValueError(f'Отчет заменен отчетом {superseding_id}, загрузка отменена')
+
+
+def report_load(report_id, distr, month):
+    """
+    Загрузка отчета в режиме из настроек загрузчика (MODE). В режиме 'replace' строки
+    отчета заменяют строки его прошлых попыток и заменяемых им отчетов (supersedes),
+    а замененный отчет не загружается.
+
+    """
+    report = ReportInfo.objects.only('period', 'supersedes_id').get(id=report_id)
+    return Loader().report_load(report_id, distr, report.period or month, superseded=superseded_report_ids(report),
+                                check=lambda: check_not_superseded(report_id))
+
+
+def load_report(df, report_id, distr, month, metrics):
+    """
+    Загрузить трансформированный отчет в режиме из настроек загрузчика (MODE).
+
+    """
+    with report_load(report_id, distr, month) as target:
+        with metrics.measure('load', rows=len(df)):
+            target.load(df)
+            target.commit()
+
+
+def get_log_buffer(report_id):
+    options = {**LOG_DEFAULTS, **getattr(settings, 'ETL_LOG', {})}
+    return LogBuffer(report_id, background_interval=options['BACKGROUND_INTERVAL'])
+
+
+def get_metrics(report_id):
+    options = {**METRICS_DEFAULTS, **getattr(settings, 'ETL_METRICS', {})}
+    return PipelineMetrics(report_id, sample_interval=options['RSS_SAMPLE_INTERVAL'])
+
+
+def run_stages(local_path, report_id, distr, month, logs, metrics, refresh=False, fetch_file=None):
+    """
+    Извлечение, трансформация и загрузка файла отчета.
+
+    Args:
+        fetch_file (callable | None): Получить локальную копию файла (см. run_pipeline).
+    """
+    excel_engine = get_extract_settings()['EXCEL_ENGINE']
+    if local_path.endswith(".xlsx") :
+        extractor = ExcelExtractor(excel_engine)
+        logs.log('Начало извлечения .xlsx', step='extract', details=f'Движок: {extractor.engine}')
+    elif local_path.endswith(".xls"):
+        extractor = OldExcelExtractor(excel_engine)
+        logs.log('Начало извлечения .xls', step='extract', details=f'Движок: {extractor.engine}')
+    elif local_path.endswith(".csv"):
+        logs.log('Начало извлечения .csv', step='extract')
+        extractor = CSVExtractor()
+    else:
+        logs.log('Расширение не соответствует требованиям', step='extract', log_level='error',
+                 details=ValueError("Unsupported file format"))
+        raise ValueError("Unsupported file format")
+
+    # Выбор построчного чтения CSV зависит от размера файла
+    if isinstance(extractor, CSVExtractor) and fetch_file is not None:
+        fetch_file()
+
+    if isinstance(extractor, CSVExtractor) and use_chunked_csv(local_path):
+        run_chunked_csv(extractor, local_path, report_id, distr, month, logs, metrics)
+    elif not isinstance(extractor, CSVExtractor) and get_extract_settings()['SHEETS'] == 'all':
+        run_sheets(extractor, local_path, report_id, distr, month, logs, metrics, refresh, fetch_file)
+    else:
+        with metrics.measure('extract') as record:
+            df = extract_cached(extractor, local_path, 'first', logs, refresh, report_id, fetch_file)[None]
+            record.rows += len(df)
 
         ReportInfo.objects.filter(id=report_id).update(status='processing', updated_at=timezone.now())
 
-        log_to_db(report_id, 'Начало трансформации файла', step='transform')
-        transformer = Transformer()
+        logs.log('Начало трансформации файла', step='transform')
+        transformer = get_transformer(metrics)
         transformed_df = transformer.transform(df, distr, month)
-        log_to_db(report_id, 'Трансформация завершена, получен DF', step='transform')
-
-        log_to_db(report_id, 'Начало загрузки отчета в БД', step='load')
-        loader = Loader()
-        loader.load(transformed_df)
-
-        # end = time.perf_counter()
-        #
-        # end_mem = process.memory_info().rss
-        # used_mb = (end_mem - start_mem) / 1024 / 1024
-        #
-        # print(f"ETL использовал: {used_mb:.2f} MB за {end - start:.2f} сек")
-
-        log_to_db(report_id, 'Загрузка отчета в БД завершена', step='load')
-
-        ReportInfo.objects.filter(id=report_id).update(status='done', updated_at=timezone.now())
-        log_to_db(report_id, f'Загрузка отчета {report_id} завершена')
-    except Exception as e:
-        error_type = type(e).__name__
-        ReportInfo.objects.filter(id=report_id).update(
-            status='error',
-            details=f'{error_type}: {str(e)}',
-            updated_at = timezone.now()
-        )
-        log_to_db(report_id, 'Обработка отчета прервана исключением', log_level='error', details=f'{error_type}: {str(e)}',)
\ No newline at end of file
+        log_detection_mode(logs, transformer)
+        log_dropped_codes(logs, transformer)
+        logs.log('Трансформация завершена, получен DF', step='transform')
+        store_output(report_id, transformed_df)
+
+        logs.log('Начало загрузки отчета в БД', step='load')
+        load_report(transformed_df, report_id, distr, month, metrics)
+
+
+def run_stored_output(report_id, distr, month, logs, metrics):
+    """
+    Повторная обработка с шага load: загрузить сохраненный результат трансформации.
+
+    Returns:
+        bool: False, если результата нет и отчет нужно обработать полностью.
+    """
+    df = get_stored_output(report_id)
+    if df is None:
+        logs.log('Сохраненный результат трансформации не найден, отчет обрабатывается полностью', step='load')
+        return False
+
+    ReportInfo.objects.filter(id=report_id).update(status='processing', updated_at=timezone.now())
+    logs.log('Начало загрузки сохраненного результата трансформации в БД', step='load')
+    load_report(df, report_id, distr, month, metrics)
+    return True
+
+
+def run_pipeline(local_path, report_id, distr, month, stage=None, fetch_file=None):
+    """
+    Обработать отчет: извлечь, трансформировать и загрузить в БД.
+
+    Args:
+        stage (str | None): Шаг повторной обработки (RESTART_STAGES): 'extract' - извлечь
+            файл заново без кэша, 'transform' - трансформировать заново (извлечение из кэша),
+            'load' - загрузить сохраненный результат трансформации.
+        fetch_file (callable | None): Получить локальную копию файла из хранилища
+            (ensure_local_file). Вызывается, только если шагу нужно содержимое файла.
+    """
+    with get_log_buffer(report_id) as logs, get_metrics(report_id) as metrics:
+        try:
+            logs.log('Запуск обработки файла')
+            if stage:
+                logs.log(f'Повторная обработка с шага {RESTART_STAGES[stage]}', details=stage)
+
+            if stage != 'load' or not run_stored_output(report_id, distr, month, logs, metrics):
+                run_stages(local_path, report_id, distr, month, logs, metrics, refresh=stage == 'extract',
+                           fetch_file=fetch_file)
+
+            logs.log('Загрузка отчета в БД завершена', step='load', details=pool_summary())
+
+            ReportInfo.objects.filter(id=report_id).update(status='done', restart_stage=None, updated_at=timezone.now())
+            logs.log(f'Загрузка отчета {report_id} завершена')
+        except Exception as e:
+            error_type = type(e).__name__
+            ReportInfo.objects.filter(id=report_id).update(
+                status='error',
+                details=f'{error_type}: {str(e)}',
+                updated_at = timezone.now()
+            )
+            logs.log('Обработка отчета прервана исключением', log_level='error', details=f'{error_type}: {str(e)}',)
+
+        save_pool_metrics()
@@ -0,0 +1,276 @@
+import datetime
+import logging
+import signal
+import multiprocessing
+import multiprocessing.connection
+import threading
+
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections, connection, connections
+from django.db.models import F, Q
+from django.utils import timezone
+
+from reports.etl.loaders.engine import dispose_engines
+from reports.etl.logger import log_to_db
+from reports.etl.metrics import clear_pool_metrics
+from reports.etl.pipeline import run_pipeline
+from reports.etl.uploads import cleanup_local_file, ensure_local_file, retry_uploads
+from reports.models import ReportInfo
+
+QUEUE_DEFAULTS = {
+    'CONCURRENCY': 2,
+    'MAX_RETRIES': 2,
+    'POLL_INTERVAL': 2.0,
+    'HEARTBEAT_INTERVAL': 30,
+    'LEASE_TIMEOUT': 300,
+}
+
+logger = logging.getLogger(__name__)
+
+
+def get_queue_settings():
+    """
+    Настройки очереди обработки отчетов с учетом settings.ETL_QUEUE.
+
+    """
+    return {**QUEUE_DEFAULTS, **getattr(settings, 'ETL_QUEUE', {})}
+
+
+def claim_next_job():
+    """
+    Атомарно забрать самый старый отчет со статусом queued.
+
+    Захват выполняется условным UPDATE, поэтому один и тот же отчет не может
+    достаться двум воркерам даже без блокировок строк (SQLite).
+
+    Returns:
+        ReportInfo | None: Захваченный отчет или None, если очередь пуста.
+    """
+    while True:
+        report_id = (ReportInfo.objects.filter(status='queued')
+                     .order_by('created_at', 'id')
+                     .values_list('id', flat=True)
+                     .first())
+        if report_id is None:
+            return None
+
+        claimed = ReportInfo.objects.filter(id=report_id, status='queued').update(
+            status='processing',
+            attempts=F('attempts') + 1,
+            heartbeat_at=timezone.now(),
+            updated_at=timezone.now()
+        )
+        if claimed:
+            return ReportInfo.objects.get(id=report_id)
+
+
+class Heartbeat:
+    """
+    Фоновый поток, который раз в interval секунд отмечает в heartbeat_at, что отчет
+    еще обрабатывается. По устаревшей отметке requeue_stale_jobs находит отчеты,
+    процесс которых завершился, не закончив обработку.
+
+    """
+
+    def __init__(self, report_id, interval=None):
+        self.report_id = report_id
+        self.interval = interval or get_queue_settings()['HEARTBEAT_INTERVAL']
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def __enter__(self):
+        self.thread = threading.Thread(target=self.run, name=f'heartbeat-{self.report_id}', daemon=True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop_event.set()
+        self.thread.join()
+
+    def run(self):
+        try:
+            while not self.stop_event.wait(self.interval):
+                # Пропущенная отметка не страшна, остановившийся поток - да: отчет вернули бы
+                # в очередь во время обработки
+                try:
+                    ReportInfo.objects.filter(id=self.report_id, status='processing').update(
+                        heartbeat_at=timezone.now())
+                except DatabaseError as e:
+                    logger.warning('Heartbeat отчета %s не сохранен: %s', self.report_id, e)
+                    connection.close()
+        finally:
+            # У потока свое соединение с БД, его нужно закрыть
+            connection.close()
+
+
+def requeue_stale_jobs(lease_timeout=None, max_retries=None):
+    """
+    Вернуть в очередь отчеты в статусе processing, для которых больше lease_timeout
+    секунд не было heartbeat (воркер убит или завершился аварийно). Прерванная
+    обработка засчитывается в попытки: после max_retries повторов отчет получает
+    статус error.
+
+    Returns:
+        int: Число возвращенных в очередь или завершенных с ошибкой отчетов.
+    """
+    queue_settings = get_queue_settings()
+    if lease_timeout is None:
+        lease_timeout = queue_settings['LEASE_TIMEOUT']
+    if max_retries is None:
+        max_retries = queue_settings['MAX_RETRIES']
+
+    stale = timezone.now() - datetime.timedelta(seconds=lease_timeout)
+    stale_reports = ReportInfo.objects.filter(
+        Q(heartbeat_at__lt=stale) | Q(heartbeat_at__isnull=True, updated_at__lt=stale), status='processing')
+
+    recovered = 0
+    for report_id, attempts in stale_reports.values_list('id', 'attempts'):
+        # Условный UPDATE: отчет, который одновременно восстановил другой воркер, не учитывается дважды
+        if attempts <= max_retries:
+            updated = stale_reports.filter(id=report_id).update(status='queued', updated_at=timezone.now())
+            message = (f'Обработка прервана: воркер не отвечает. Отчет возвращен в очередь '
+                       f'(попытка {attempts} из {max_retries + 1})')
+        else:
+            updated = stale_reports.filter(id=report_id).update(
+                status='error', details='Обработка прервана: воркер не отвечает', updated_at=timezone.now())
+            message = 'Обработка прервана: воркер не отвечает, попытки исчерпаны'
+        if updated:
+            log_to_db(report_id, message, log_level='error')
+            recovered += updated
+    return recovered
+
+
+def run_job(report, max_retries=None):
+    """
+    Выполнить pipeline для захваченного отчета и при ошибке вернуть его в очередь,
+    пока не исчерпан лимит повторов.
+
+    """
+    if max_retries is None:
+        max_retries = get_queue_settings()['MAX_RETRIES']
+
+    with Heartbeat(report.id):
+        run_pipeline(report.local_path, report.id, report.distributor, report.month, report.restart_stage,
+                     fetch_file=lambda: ensure_local_file(report))
+
+    report.refresh_from_db(fields=['status', 'attempts'])
+    if report.status == 'error' and report.attempts <= max_retries:
+        ReportInfo.objects.filter(id=report.id, status='error').update(status='queued', updated_at=timezone.now())
+        log_to_db(report.id, f'Отчет возвращен в очередь (попытка {report.attempts} из {max_retries + 1})')
+    else:
+        cleanup_local_file(report.id)
+
+
+def worker_loop(stop_event=None, poll_interval=None, max_retries=None, once=False):
+    """
+    Цикл воркера: забирает отчеты из очереди, пока не будет установлен stop_event.
+
+    Args:
+        stop_event: multiprocessing.Event для остановки после текущего отчета.
+        once (bool): Завершиться, как только очередь опустеет.
+    """
+    queue_settings = get_queue_settings()
+    if poll_interval is None:
+        poll_interval = queue_settings['POLL_INTERVAL']
+    if stop_event is None:
+        stop_event = multiprocessing.Event()
+
+    while not stop_event.is_set():
+        # Ошибка одной итерации (например, временная недоступность БД) не завершает воркер
+        try:
+            requeue_stale_jobs(max_retries=max_retries)
+            report = claim_next_job()
+            if report is None:
+                # Свободный воркер повторяет несостоявшиеся загрузки файлов в хранилище
+                retry_uploads()
+                if once:
+                    return
+                stop_event.wait(poll_interval)
+                continue
+            run_job(report, max_retries)
+        except Exception:
+            logger.exception('Ошибка в цикле воркера очереди')
+            close_old_connections()
+            stop_event.wait(poll_interval)
+
+
+def _worker_main(stop_event, poll_interval, max_retries, once):
+    import django
+    django.setup()
+
+    # Ctrl+C получает вся группа процессов: остановкой управляет родитель
+    # через stop_event, текущий отчет дорабатывается до конца.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    # Соединения, унаследованные от родителя при fork, использовать нельзя.
+    connections.close_all()
+    try:
+        worker_loop(stop_event, poll_interval, max_retries, once)
+    finally:
+        clear_pool_metrics()
+        dispose_engines()
+        connections.close_all()
+
+
+class WorkerPool:
+    """
+    Пул процессов-воркеров, обрабатывающих очередь отчетов. Воркер, завершившийся
+    аварийно, перезапускается.
+
+    """
+
+    def __init__(self, concurrency=None, poll_interval=None, max_retries=None, once=False):
+        queue_settings = get_queue_settings()
+        self.concurrency = concurrency or queue_settings['CONCURRENCY']
+        self.poll_interval = poll_interval if poll_interval is not None else queue_settings['POLL_INTERVAL']
+        self.max_retries = max_retries if max_retries is not None else queue_settings['MAX_RETRIES']
+        self.once = once
+        self.stop_event = multiprocessing.Event()
+        self.processes = []
+
+    def start_worker(self, index):
+        process = multiprocessing.Process(
+            target=_worker_main,
+            args=(self.stop_event, self.poll_interval, self.max_retries, self.once),
+            name=f'etl-worker-{index}',
+            daemon=False,
+        )
+        process.start()
+        return process
+
+    def start(self):
+        connections.close_all()
+        for index in range(self.concurrency):
+            self.processes.append(self.start_worker(index))
+
+    def stop(self, *args):
+        self.stop_event.set()
+
+    def join(self):
+        """
+        Дождаться завершения воркеров. Воркер с ненулевым кодом выхода, завершившийся
+        не по stop_event, запускается заново не раньше чем через poll_interval.
+
+        """
+        while True:
+            running = [process for process in self.processes if process.is_alive()]
+            for index, process in enumerate(self.processes):
+                if process.is_alive() or process.exitcode == 0:
+                    continue
+                process.join()
+                if self.stop_event.is_set():
+                    continue
+                logger.error('Воркер %s завершился с кодом %s, перезапуск', process.name, process.exitcode)
+                if self.stop_event.wait(self.poll_interval):
+                    continue
+                self.processes[index] = self.start_worker(index)
+                running.append(self.processes[index])
+            if not running:
+                return
+            multiprocessing.connection.wait([process.sentinel for process in running], timeout=self.poll_interval)
+
+    def run(self):
+        signal.signal(signal.SIGINT, self.stop)
+        signal.signal(signal.SIGTERM, self.stop)
+        self.start()
+        self.join()
@@ -0,0 +1,33 @@
+from django.utils import timezone
+
+from reports.models import ReportInfo
+
+DEFAULT_STAGE = 'transform'
+
+
+def reprocess_reports(reports, stage=DEFAULT_STAGE):
+    """
+    Поставить отчеты в очередь на повторную обработку с шага stage без повторной
+    загрузки файла. Отчеты, которые сейчас обрабатываются, и замененные более
+    новыми отчетами (supersedes) не затрагиваются: повторная загрузка замененного
+    отчета вернула бы в таблицу его устаревшие строки.
+
+    Args:
+        reports: QuerySet ReportInfo.
+        stage (str): 'extract', 'transform' или 'load' (ReportInfo.STAGE_CHOICES).
+
+    Returns:
+        list: Идентификаторы поставленных в очередь отчетов.
+    """
+    report_ids = list(reports.exclude(status='processing').filter(superseded_by__isnull=True)
+                      .values_list('id', flat=True))
+    # Условный UPDATE: отчет, захваченный воркером после выборки, остается у воркера
+    ReportInfo.objects.filter(id__in=report_ids).exclude(status='processing').update(
+        status='queued',
+        attempts=0,
+        restart_stage=stage,
+        details=None,
+        updated_at=timezone.now()
+    )
+    return list(ReportInfo.objects.filter(id__in=report_ids, status='queued', restart_stage=stage)
+                .order_by('id').values_list('id', flat=True))
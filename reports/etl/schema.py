@@ -0,0 +1,142 @@
+import pandas as pd
+from sqlalchemy.types import Float, Numeric, Unicode, UnicodeText
+
+TEXT = 'text'
+NUMBER = 'number'
+MONEY = 'money'
+CATEGORY = 'category'
+CODE = 'code'
+
+# Схема выходного DataFrame (таблица sales). Столбцы, которых нет в схеме
+# (например, добавленные конфигом дистрибьютора), считаются текстовыми.
+#   number - число с плавающей точкой, строки вида "1 234,50" разбираются;
+#   money - сумма: разбирается как number, хранится с точностью до копеек (NUMERIC(18, 2));
+#   category - повторяющееся значение, одно на весь отчет;
+#   code - строка цифр допустимой длины (lengths), числа из Excel без потерянных нулей.
+OUTPUT_SCHEMA = {
+    'Название продукта': {'type': TEXT},
+    'Отгрузка, шт': {'type': NUMBER},
+    'Отгрузка, руб': {'type': MONEY},
+    'Клиент': {'type': TEXT},
+    'ИНН клиента': {'type': CODE, 'lengths': (10, 12)},
+    'Адрес полностью': {'type': TEXT},
+    'Штрихкод продукта': {'type': CODE, 'lengths': (8, 12, 13, 14)},
+    'Область/Край': {'type': TEXT},
+    'Город': {'type': TEXT},
+    'Улица, номер дома': {'type': TEXT},
+    'Дистрибьютор': {'type': CATEGORY, 'length': 255},
+    'Месяц': {'type': CATEGORY, 'length': 20},
+}
+
+SPACES = "[\\s\u00a0\u202f']"  # пробелы подставлены символами: регулярные выражения pyarrow не поддерживают \u
+
+
+def column_schema(column):
+    return OUTPUT_SCHEMA.get(column, {'type': TEXT})
+
+
+def parse_numbers(series):
+    """
+    Разобрать числа: значения из Excel уже числовые, строки допускают пробелы
+    между разрядами и десятичную запятую ("1 234,50"). Неразобранные - NaN.
+
+    """
+    numbers = pd.to_numeric(series, errors='coerce')
+    unparsed = numbers.isna() & series.notna()
+    if unparsed.any():
+        text = series[unparsed].astype(str).str.replace(SPACES, '', regex=True)
+        # Если есть и запятая, и точка, десятичный - последний из них ("1,234.50", "1.234,50"),
+        # другой разделяет разряды. Одна запятая без точки - десятичная
+        comma_decimal = text.str.rfind(',') > text.str.rfind('.')
+        text = text.where(comma_decimal, text.str.replace(',', '', regex=False))
+        text = text.where(~comma_decimal, text.str.replace('.', '', regex=False).str.replace(',', '.', regex=False))
+        numbers = numbers.astype('float64')
+        numbers[unparsed] = pd.to_numeric(text, errors='coerce')
+    return numbers.astype('float64')
+
+
+def normalize_codes(series, lengths):
+    """
+    Коды (ИНН, штрихкод) как строки цифр. У чисел из Excel восстанавливаются
+    потерянные ведущие нули до ближайшей допустимой длины. Из строк с пояснениями
+    ("ИНН 7707083893", "7707083893/770701001") берется первый код допустимой длины.
+    Значения без кода или длиннее max(lengths) заменяются на NA (см. count_dropped).
+
+    """
+    numeric = series.map(lambda value: isinstance(value, (int, float)) and not isinstance(value, bool))
+    raw = series.astype('string')
+    text = raw.str.replace(SPACES, '', regex=True).str.replace(r'\.0+$', '', regex=True)
+    digits = text.str.fullmatch(r'\d+').fillna(False).astype(bool)
+
+    # Без lookaround: регулярные выражения pyarrow его не поддерживают. Сначала ищем в строке
+    # с пробелами ("7707083893 770701001"), затем без них ("ИНН 77 07 08 38 93")
+    code = '|'.join(rf'\d{{{length}}}' for length in sorted(lengths, reverse=True))
+    pattern = rf'(?:^|\D)({code})(?:\D|$)'
+    extracted = raw.str.extract(pattern, expand=False).fillna(text.str.extract(pattern, expand=False))
+    text = text.where(digits & (text.str.len() <= max(lengths)), extracted.where(~digits))
+
+    # Дополняются только числа, которым до допустимой длины не хватает одной-двух цифр
+    previous = 0
+    for length in lengths:
+        padded = numeric & text.str.len().between(max(previous + 1, length - 2), length - 1).fillna(False).astype(bool)
+        if padded.any():
+            text[padded] = text[padded].str.zfill(length)
+        previous = length
+    return text
+
+
+def count_dropped(series, typed):
+    """
+    Число непустых исходных значений, замененных на NA при приведении типа.
+
+    """
+    filled = series.astype('string').str.replace(SPACES, '', regex=True).fillna('') != ''
+    return int((filled & typed.isna()).sum())
+
+
+def apply_schema(df, dropped=None):
+    """
+    Привести столбцы выходного DataFrame к типам OUTPUT_SCHEMA.
+
+    Args:
+        dropped (dict | None): Сюда добавляется число значений кодов (ИНН, штрихкод),
+            отброшенных как некорректные, по столбцам.
+    """
+    typed = {}
+    for column, series in df.items():
+        schema = column_schema(column)
+        if schema['type'] == NUMBER:
+            typed[column] = parse_numbers(series)
+        elif schema['type'] == MONEY:
+            typed[column] = parse_numbers(series).round(2)
+        elif schema['type'] == CODE:
+            typed[column] = normalize_codes(series, schema['lengths'])
+            count = count_dropped(series, typed[column]) if dropped is not None else 0
+            if count:
+                dropped[column] = dropped.get(column, 0) + count
+        elif schema['type'] == CATEGORY:
+            typed[column] = series.astype('string').astype('category')
+        else:
+            typed[column] = series.astype('string')
+    return pd.DataFrame(typed, index=df.index)
+
+
+def sql_types(columns):
+    """
+    Типы SQLAlchemy для DataFrame.to_sql(dtype=...) по схеме.
+
+    """
+    types = {}
+    for column in columns:
+        schema = column_schema(column)
+        if schema['type'] == NUMBER:
+            types[column] = Float(precision=53)
+        elif schema['type'] == MONEY:
+            types[column] = Numeric(18, 2)
+        elif schema['type'] == CODE:
+            types[column] = Unicode(max(schema['lengths']))
+        elif schema['type'] == CATEGORY:
+            types[column] = Unicode(schema['length'])
+        elif column in OUTPUT_SCHEMA:
+            types[column] = UnicodeText()
+    return types
@@ -0,0 +1,217 @@
+import re
+
+from reports.etl.transformers.matchers import PUNCTUATION, compile_keywords, has_cyrillic
+
+FIO_PATTERN = re.compile(r'^[А-ЯЁ][а-яё]+ [А-ЯЁ]\.[А-ЯЁ]\.$')  # 'Фамилия И.О.'
+FIO_MIN_MATCHES = 10
+
+# Функции из columns_config, которые определяются по профилям столбцов,
+# а не по заголовкам
+PROFILE_FUNCTIONS = {
+    "find_most_matches_column",
+    "find_word_matches_column",
+    "find_filtered_word_matches_column",
+    "find_numeric_column_with_length_matches",
+}
+
+
+def best_column(columns, counts, total_rows):
+    """
+    Выбрать первый столбец с максимальным числом совпадений, если совпадений
+    не меньше половины строк.
+
+    """
+    max_matches = 0
+    best = None
+
+    for column, matches in zip(columns, counts):
+        if matches > max_matches:
+            max_matches = matches
+            best = column
+
+    if max_matches < total_rows / 2:
+        return None
+
+    return best
+
+
+class ProfileSpec:
+    """
+    Набор признаков, которые нужно посчитать для каждого столбца, чтобы
+    определить все цели из columns_config.
+
+    """
+
+    def __init__(self, config, matchers=None):
+        """
+        Args:
+            matchers (dict | None): Ключ конфига -> KeywordMatcher. None - скомпилировать из config.
+        """
+        if matchers is None:
+            matchers = compile_keywords(config)
+
+        self.substrings = {}  # ключ конфига -> регулярное выражение по подстрокам
+        self.words = {}  # ключ конфига -> множество слов
+        self.filtered = {}  # (ключ включения, ключ исключения) -> (множество, множество)
+        self.lengths = False
+
+        for column in config["columns_config"]:
+            function = column["function"]
+            keys = column["config_key"]
+            if function == "find_most_matches_column":
+                self.substrings[keys[0]] = matchers[keys[0]].substring
+            elif function == "find_word_matches_column":
+                self.words[keys[0]] = matchers[keys[0]].words
+            elif function == "find_filtered_word_matches_column":
+                self.filtered[(keys[0], keys[1])] = (matchers[keys[0]].words, matchers[keys[1]].words)
+            elif function == "find_numeric_column_with_length_matches":
+                self.lengths = True
+
+
+class ColumnProfile:
+    """
+    Признаки одного столбца: число совпадений по каждому ключу конфига,
+    гистограмма длин цифровых значений, наличие кириллицы и число ФИО.
+
+    """
+
+    def __init__(self, name, non_empty):
+        self.name = name
+        self.non_empty = non_empty
+        self.has_cyrillic = False
+        self.substring_hits = {}
+        self.word_hits = {}
+        self.filtered_hits = {}
+        self.length_histogram = {}
+        self.fio_hits = 0
+
+
+def tokenize(lowered, separator):
+    """
+    Разбить значения на слова после замены запятых и точек на separator.
+    Индекс результата - номер исходной строки.
+
+    """
+    return lowered.str.replace(PUNCTUATION, separator, regex=True).str.split().explode()
+
+
+def count_rows(tokens, include, exclude=None):
+    """
+    Посчитать строки, где есть слово из include и нет слов из exclude.
+
+    """
+    rows = tokens.index[tokens.isin(include)].unique()
+    if exclude:
+        rows = rows.difference(tokens.index[tokens.isin(exclude)])
+    return len(rows)
+
+
+def profile_column(name, series, spec):
+    """
+    Посчитать все признаки столбца за один проход по его значениям.
+
+    Args:
+        name: Название столбца.
+        series (pd.Series): Значения столбца.
+        spec (ProfileSpec): Какие признаки нужны.
+
+    Returns:
+        ColumnProfile: Профиль столбца.
+    """
+    values = series.dropna().astype(str).reset_index(drop=True)
+    lowered = values.str.lower()
+
+    profile = ColumnProfile(name, len(values))
+    profile.has_cyrillic = has_cyrillic(series)
+
+    for key, pattern in spec.substrings.items():
+        profile.substring_hits[key] = int(lowered.str.contains(pattern).sum())
+
+    # Пословные признаки имеют смысл только для столбцов с кириллицей
+    if profile.has_cyrillic:
+        if spec.words:
+            tokens = tokenize(lowered, " ")
+            for key, words in spec.words.items():
+                profile.word_hits[key] = count_rows(tokens, words)
+
+        if spec.filtered:
+            tokens = tokenize(lowered, "")
+            for pair, (include, exclude) in spec.filtered.items():
+                profile.filtered_hits[pair] = count_rows(tokens, include, exclude)
+
+    if spec.lengths:
+        stripped = values.str.strip()
+        digits = stripped[stripped.str.isdigit()]
+        profile.length_histogram = {int(length): int(count) for length, count in
+                                    digits.str.len().value_counts().items()}
+
+    profile.fio_hits = int(values.str.match(FIO_PATTERN).sum())
+
+    return profile
+
+
+class ColumnClassifier:
+    """
+    Определяет все целевые столбцы по профилям, посчитанным один раз для
+    каждого столбца исходного DataFrame.
+
+    """
+
+    def __init__(self, config, matchers=None):
+        self.config = config
+        self.matchers = matchers if matchers is not None else compile_keywords(config)
+        self.spec = ProfileSpec(config, self.matchers)
+
+    def profile(self, dataframe):
+        """
+        Посчитать профили всех столбцов DataFrame.
+
+        """
+        return [profile_column(name, series, self.spec) for name, series in dataframe.items()]
+
+    def profile_fio(self, dataframe):
+        """
+        Профили, в которых посчитано только число ФИО.
+
+        """
+        profiles = []
+        for name, series in dataframe.items():
+            values = series.dropna().astype(str)
+            profile = ColumnProfile(name, len(values))
+            profile.fio_hits = int(values.str.match(FIO_PATTERN).sum())
+            profiles.append(profile)
+        return profiles
+
+    def column_scores(self, column, profiles):
+        """
+        Число совпадений каждого столбца для одной записи columns_config.
+
+        """
+        function = column["function"]
+        keys = column["config_key"]
+
+        if function == "find_most_matches_column":
+            return [profile.substring_hits.get(keys[0], 0) for profile in profiles]
+        if function == "find_word_matches_column":
+            return [profile.word_hits.get(keys[0], 0) for profile in profiles]
+        if function == "find_filtered_word_matches_column":
+            return [profile.filtered_hits.get((keys[0], keys[1]), 0) for profile in profiles]
+        if function == "find_numeric_column_with_length_matches":
+            lengths = self.config[keys[0]]['items']
+            return [sum(profile.length_histogram.get(length, 0) for length in lengths) for profile in profiles]
+
+        raise ValueError(f"Функция {function} не определяется по профилям столбцов")
+
+    def resolve(self, column, profiles, total_rows):
+        """
+        Найти исходный столбец для одной записи columns_config.
+
+        """
+        return best_column([profile.name for profile in profiles], self.column_scores(column, profiles), total_rows)
+
+    def fio_columns(self, profiles):
+        """
+        Столбцы, содержащие ФИО в формате 'Фамилия И.О.'.
+
+        """
+        return [profile.name for profile in profiles if profile.fio_hits > FIO_MIN_MATCHES]
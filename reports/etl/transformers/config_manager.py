@@ -0,0 +1,227 @@
+import json
+import logging
+import os
+import threading
+from pathlib import Path
+
+from reports.etl.transformers.classifier import ColumnClassifier
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONFIG_PATH = Path(__file__).resolve().parent / 'config.json'
+
+# Функция из columns_config -> число ключей в config_key
+FUNCTION_KEYS = {
+    "find_most_matches_column": 1,
+    "find_word_matches_column": 1,
+    "find_filtered_word_matches_column": 2,
+    "find_numeric_column_with_length_matches": 1,
+    "find_header": 1,
+    "find_most_matches_header": 1,
+}
+
+DISTRIBUTORS_KEY = 'distributors'
+
+
+class ConfigError(ValueError):
+    pass
+
+
+def validate_config(config, source='config'):
+    """
+    Проверить схему конфига: записи columns_config ссылаются на известные функции
+    и существующие ключи со списком items. Ошибки собираются все сразу.
+
+    """
+    if not isinstance(config, dict):
+        raise ConfigError(f'{source}: ожидается объект JSON')
+
+    errors = []
+    for key, value in config.items():
+        if key in ('columns_config', DISTRIBUTORS_KEY):
+            continue
+        if not isinstance(value, dict) or not isinstance(value.get('items'), list):
+            errors.append(f'{key}: ожидается объект со списком items')
+        elif not all(isinstance(item, (str, int)) for item in value['items']):
+            errors.append(f'{key}: items должны быть строками или числами')
+
+    columns = config.get('columns_config')
+    if not isinstance(columns, list) or not columns:
+        errors.append('columns_config: ожидается непустой список')
+        columns = []
+
+    new_columns = set()
+    for position, column in enumerate(columns):
+        name = column.get('new_column') if isinstance(column, dict) else None
+        where = f'columns_config[{position}]'
+        if not isinstance(name, str) or not name:
+            errors.append(f'{where}: нет new_column')
+            continue
+        if name in new_columns:
+            errors.append(f'{where}: повторяется new_column "{name}"')
+        new_columns.add(name)
+
+        function = column.get('function')
+        keys = column.get('config_key')
+        if function not in FUNCTION_KEYS:
+            errors.append(f'{where}: неизвестная функция {function}')
+            continue
+        if not isinstance(keys, list) or len(keys) != FUNCTION_KEYS[function]:
+            errors.append(f'{where}: для {function} нужно ключей в config_key: {FUNCTION_KEYS[function]}')
+            continue
+        for key in keys:
+            if key not in config or key in ('columns_config', DISTRIBUTORS_KEY):
+                errors.append(f'{where}: нет ключа {key}')
+            elif function == "find_numeric_column_with_length_matches" and isinstance(config[key], dict) and not all(
+                    isinstance(item, int) for item in config[key].get('items') or []):
+                errors.append(f'{where}: для {function} items ключа {key} должны быть числами')
+
+    if errors:
+        raise ConfigError(f'{source}: ' + '; '.join(errors))
+
+
+def merge_override(config, override):
+    """
+    Конфиг дистрибьютора: ключи с items из override заменяют базовые целиком,
+    записи columns_config заменяются по new_column или добавляются.
+
+    """
+    merged = {key: value for key, value in config.items() if key != DISTRIBUTORS_KEY}
+    for key, value in override.items():
+        if key != 'columns_config':
+            merged[key] = value
+
+    override_columns = override.get('columns_config', [])
+    if not isinstance(override_columns, list):
+        raise ConfigError('columns_config: ожидается список')
+
+    columns = {column['new_column']: column for column in config['columns_config']}
+    for column in override_columns:
+        columns[column.get('new_column') if isinstance(column, dict) else None] = column
+    merged['columns_config'] = list(columns.values())
+    return merged
+
+
+class ConfigState:
+    """
+    Проверенный конфиг одной версии файла и скомпилированные по нему классификаторы.
+    После создания не изменяется, кроме кэша классификаторов дистрибьюторов.
+
+    """
+
+    def __init__(self, config, version):
+        self.config = config
+        self.version = version
+        self.overrides = config.get(DISTRIBUTORS_KEY, {})
+        self.classifiers = {None: ColumnClassifier(config)}
+        self.lock = threading.Lock()
+
+        if not isinstance(self.overrides, dict):
+            raise ConfigError(f'{DISTRIBUTORS_KEY}: ожидается объект дистрибьютор -> конфиг')
+        for distributor, override in self.overrides.items():
+            if not isinstance(override, dict):
+                raise ConfigError(f'{DISTRIBUTORS_KEY}.{distributor}: ожидается объект')
+            validate_config(merge_override(config, override), f'{DISTRIBUTORS_KEY}.{distributor}')
+
+    def classifier(self, distributor):
+        key = distributor.strip() if isinstance(distributor, str) else None
+        if key not in self.overrides:
+            key = None
+
+        classifier = self.classifiers.get(key)
+        if classifier is None:
+            with self.lock:
+                classifier = self.classifiers.get(key)
+                if classifier is None:
+                    classifier = ColumnClassifier(merge_override(self.config, self.overrides[key]))
+                    self.classifiers[key] = classifier
+        return classifier
+
+
+class ConfigManager:
+    """
+    Конфиг определения столбцов с перечитыванием файла на лету.
+
+    При каждом обращении сравнивается mtime и размер файла. Новая версия
+    проверяется и компилируется целиком, затем подменяется одним присваиванием:
+    уже идущие трансформации продолжают работать со своим классификатором.
+    Если новая версия не проходит проверку, остается предыдущая.
+
+    Переопределения для дистрибьютора задаются в разделе "distributors":
+    {"distributors": {"ООО Дистрибьютор": {"product": {"items": [...]}, "columns_config": [...]}}}
+
+    """
+
+    def __init__(self, path=DEFAULT_CONFIG_PATH):
+        self.path = Path(path)
+        self.lock = threading.Lock()
+        self.state = None
+        self.last_error = None
+        self.rejected_version = None  # версия файла, не прошедшая проверку
+        self.reload()
+
+    def file_version(self):
+        stat = os.stat(self.path)
+        return stat.st_mtime_ns, stat.st_size
+
+    def reload(self):
+        """
+        Перечитать файл, если он изменился. Возвращает True, если конфиг обновлен.
+
+        """
+        with self.lock:
+            version = None
+            try:
+                version = self.file_version()
+                if self.state is not None and version in (self.state.version, self.rejected_version):
+                    return False
+                with open(self.path, encoding='utf-8') as f:
+                    config = json.load(f)
+                validate_config(config, str(self.path))
+                state = ConfigState(config, version)
+            except (OSError, ValueError) as error:
+                if self.state is None:
+                    raise
+                self.last_error = error
+                self.rejected_version = version
+                logger.error('Конфиг %s не применен, используется предыдущая версия: %s', self.path, error)
+                return False
+
+            self.state = state
+            self.last_error = None
+            self.rejected_version = None
+            return True
+
+    def current(self):
+        state = self.state
+        try:
+            changed = self.file_version() not in (state.version, self.rejected_version)
+        except OSError:
+            changed = False  # файл временно отсутствует при замене - работаем с текущей версией
+        if changed:
+            self.reload()
+            state = self.state
+        return state
+
+    def get(self, distributor=None):
+        """
+        Скомпилированный классификатор для дистрибьютора (или базовый).
+
+        """
+        return self.current().classifier(distributor)
+
+
+_managers = {}
+_managers_lock = threading.Lock()
+
+
+def get_config_manager(path=None):
+    """
+    Общий ConfigManager процесса для файла конфига.
+
+    """
+    path = Path(path or DEFAULT_CONFIG_PATH).resolve()
+    with _managers_lock:
+        if path not in _managers:
+            _managers[path] = ConfigManager(path)
+        return _managers[path]
@@ -0,0 +1,142 @@
+import itertools
+
+import numpy as np
+import pandas as pd
+
+HEADER_WINDOW = 100  # строк, проверяемых за один шаг
+
+
+class NoDataRowsError(ValueError):
+    """
+    На листе нет строки с числовыми значениями - начала данных.
+
+    """
+
+
+def is_numeric_cell(cell):
+    """
+    Число или строка из цифр с разделителями ',' и '.'.
+
+    """
+    if isinstance(cell, str):
+        return cell.replace(",", "").replace(".", "").isdigit()
+    return isinstance(cell, (int, float)) and not pd.isna(cell)
+
+
+numeric_mask = np.frompyfunc(is_numeric_cell, 1, 1)
+
+
+def first_numeric_row(block):
+    """
+    Позиция первой строки двумерного массива, в которой есть числовое значение, или None.
+
+    """
+    if block.size == 0:
+        return None
+    rows = numeric_mask(block).astype(bool).any(axis=1)
+    return int(rows.argmax()) if rows.any() else None
+
+
+def column_headers(top, fallback):
+    """
+    Заголовок каждого столбца - последнее непустое значение в строках над данными.
+    Если над данными столбец пуст, берется название из fallback.
+
+    """
+    if top.shape[0] == 0:
+        return list(fallback)
+
+    filled = ~pd.isna(top)
+    last = top.shape[0] - 1 - filled[::-1].argmax(axis=0)
+    values = top[last, np.arange(top.shape[1])]
+    return [value if found else name for value, found, name in zip(values, filled.any(axis=0), fallback)]
+
+
+def sheet_labels(row, width):
+    """
+    Названия столбцов из первой строки листа, как у pd.read_excel(header=0): пустые
+    ячейки - 'Unnamed: <номер>', повторы - с суффиксами '.1', '.2' и т.д.
+
+    """
+    labels = []
+    counts = {}
+    for i in range(width):
+        value = row[i] if i < len(row) else None
+        if value is None or value == '':
+            labels.append(f'Unnamed: {i}')
+            continue
+        count = counts.get(value, 0)
+        counts[value] = count + 1
+        labels.append(f'{value}.{count}' if count else value)
+    return labels
+
+
+def to_block(rows, width):
+    return np.array([list(row) + [None] * (width - len(row)) for row in rows], dtype=object).reshape(-1, width)
+
+
+class HeaderDetector:
+    """
+    Поиск заголовка отчета: первая строка с числовым значением считается началом
+    данных, заголовок столбца - ближайшее непустое значение над ней.
+
+    Строки проверяются окнами по window строк, поэтому на обычных отчетах
+    просматривается только верх листа. max_rows ограничивает поиск; None - весь лист.
+
+    """
+
+    def __init__(self, window=HEADER_WINDOW, max_rows=None):
+        self.window = window
+        self.max_rows = max_rows
+
+    def detect(self, dataframe):
+        """
+        Returns:
+            tuple: (позиция первой строки данных, список заголовков).
+        """
+        limit = len(dataframe) if self.max_rows is None else min(len(dataframe), self.max_rows)
+
+        for offset in range(0, limit, self.window):
+            block = dataframe.iloc[offset:min(offset + self.window, limit)].to_numpy(dtype=object)
+            position = first_numeric_row(block)
+            if position is not None:
+                start = offset + position
+                top = dataframe.iloc[:start].to_numpy(dtype=object)
+                return start, column_headers(top, dataframe.columns)
+
+        raise NoDataRowsError("Не удалось найти строку с числовыми значениями.")
+
+    def detect_rows(self, rows):
+        """
+        Найти заголовок в потоке строк (например, ExcelExtractor.iter_rows), читая
+        его только до первой строки данных.
+
+        Как и при pd.read_excel(header=0) с detect: первая строка листа никогда не
+        считается данными и дает запасные названия столбцов (sheet_labels), строки
+        данных ищутся со второй.
+
+        Returns:
+            tuple: (список заголовков, итератор строк данных начиная с первой).
+        """
+        rows = iter(rows)
+        first = next(rows, None)
+        if first is None:
+            raise NoDataRowsError("Не удалось найти строку с числовыми значениями.")
+        buffer = []
+        width = len(first)
+
+        while self.max_rows is None or len(buffer) < self.max_rows:
+            size = self.window if self.max_rows is None else min(self.window, self.max_rows - len(buffer))
+            batch = list(itertools.islice(rows, size))
+            if not batch:
+                break
+            width = max(width, max(len(row) for row in batch))
+            position = first_numeric_row(to_block(batch, width))
+            if position is not None:
+                start = len(buffer) + position
+                buffer.extend(batch)
+                headers = column_headers(to_block(buffer[:start], width), sheet_labels(first, width))
+                return headers, itertools.chain(buffer[start:], rows)
+            buffer.extend(batch)
+
+        raise NoDataRowsError("Не удалось найти строку с числовыми значениями.")
@@ -0,0 +1,92 @@
+import re
+from collections import Counter
+
+PUNCTUATION = re.compile(r"[,.]")
+CYRILLIC = re.compile(r"[а-я]")
+NEVER_MATCH = re.compile(r"(?!)")
+
+
+def substring_pattern(keywords):
+    """
+    Одно регулярное выражение, совпадающее, если строка содержит любое из ключевых слов.
+
+    """
+    keywords = [re.escape(keyword) for keyword in keywords if isinstance(keyword, str)]
+    if not keywords:
+        return NEVER_MATCH
+    return re.compile("|".join(keywords))
+
+
+def word_pattern(keywords):
+    """
+    Одно регулярное выражение, совпадающее, если одно из разделенных пробелами слов
+    строки полностью равно ключевому слову.
+
+    """
+    keywords = [re.escape(keyword) for keyword in keywords if isinstance(keyword, str)]
+    if not keywords:
+        return NEVER_MATCH
+    return re.compile(r"(?<!\S)(?:" + "|".join(keywords) + r")(?!\S)")
+
+
+class KeywordMatcher:
+    """
+    Ключевые слова одного ключа конфига, скомпилированные один раз при загрузке
+    конфига: множества для точного сравнения и по словам, общие регулярные
+    выражения для поиска подстрок и слов.
+
+    """
+
+    def __init__(self, keywords):
+        self.keywords = list(keywords)
+        strings = [keyword for keyword in self.keywords if isinstance(keyword, str)]
+
+        self.exact = frozenset(self.keywords)
+        self.words = frozenset(strings)
+        self.substring = substring_pattern(strings)
+        self.word = word_pattern(strings)
+        self.counts = Counter(strings)
+
+    def count_contained(self, text):
+        """
+        Сколько ключевых слов (с повторами в списке) содержится в text как подстроки.
+
+        """
+        if not self.substring.search(text):
+            return 0
+        return sum(count for keyword, count in self.counts.items() if keyword in text)
+
+
+def keyword_matcher(keywords):
+    """
+    KeywordMatcher для списка ключевых слов; готовый KeywordMatcher возвращается как есть.
+
+    """
+    if isinstance(keywords, KeywordMatcher):
+        return keywords
+    return KeywordMatcher(keywords)
+
+
+def compile_keywords(config):
+    """
+    KeywordMatcher для каждого ключа конфига со списком items.
+
+    """
+    return {
+        key: KeywordMatcher(value['items'])
+        for key, value in config.items()
+        if isinstance(value, dict) and 'items' in value
+    }
+
+
+def has_cyrillic(series):
+    """
+    Проверить, есть ли в столбце хотя бы одна строка со строчной (после lower) кириллицей.
+
+    """
+    try:
+        lowered = series.str.lower()
+    except AttributeError:
+        # В столбце нет ни одного строкового значения
+        return False
+    return bool(lowered.str.contains(CYRILLIC, na=False).any())
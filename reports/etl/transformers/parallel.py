@@ -0,0 +1,157 @@
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+import pandas as pd
+
+from reports.etl.transformers.classifier import profile_column
+
+PARALLEL_MIN_CELLS = 2_000_000  # меньше - профили считаются в одном процессе
+
+_executor = None
+_executor_workers = None
+_executor_lock = threading.Lock()
+
+
+def get_executor(workers):
+    """
+    Общий пул процессов для подсчета профилей. Создается при первом обращении.
+
+    """
+    global _executor, _executor_workers
+    with _executor_lock:
+        if _executor is None or _executor_workers != workers:
+            if _executor is not None:
+                _executor.shutdown(wait=False)
+            _executor = ProcessPoolExecutor(max_workers=workers)
+            _executor_workers = workers
+        return _executor
+
+
+def reset_executor():
+    global _executor, _executor_workers
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+        _executor_workers = None
+
+
+def _forget_executor():
+    # Пул родителя после fork непригоден: дочерний процесс создаст свой
+    global _executor, _executor_workers, _executor_lock
+    _executor = None
+    _executor_workers = None
+    _executor_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_forget_executor)
+
+
+class SharedColumns:
+    """
+    Непустые значения столбцов DataFrame в разделяемой памяти в виде строк:
+    один буфер UTF-8 на все столбцы и массив смещений символов, как в строковом
+    массиве Arrow. Процессы пула читают буферы напрямую, без передачи данных
+    через pickle.
+
+    """
+
+    def __init__(self, dataframe):
+        texts = []
+        offsets = []
+        self.columns = []  # (позиция, название, начало в байтах, конец в байтах, первое смещение, число значений)
+
+        byte_position = 0
+        offset_position = 0
+        for position, (name, series) in enumerate(dataframe.items()):
+            values = series.dropna().astype(str).tolist()
+            lengths = np.fromiter(map(len, values), dtype=np.int64, count=len(values))
+            data = ''.join(values).encode('utf-8')
+
+            texts.append(data)
+            offsets.append(np.concatenate(([0], np.cumsum(lengths))))
+            self.columns.append((position, name, byte_position, byte_position + len(data),
+                                 offset_position, len(values)))
+            byte_position += len(data)
+            offset_position += len(values) + 1
+
+        offsets = np.concatenate(offsets) if offsets else np.zeros(0, dtype=np.int64)
+        self.data = SharedMemory(create=True, size=max(1, byte_position))
+        self.offsets = SharedMemory(create=True, size=max(1, offsets.nbytes))
+        self.offsets_length = len(offsets)
+
+        position = 0
+        for data in texts:
+            self.data.buf[position:position + len(data)] = data
+            position += len(data)
+        np.ndarray(offsets.shape, dtype=np.int64, buffer=self.offsets.buf)[:] = offsets
+
+    def close(self):
+        for block in (self.data, self.offsets):
+            block.close()
+            block.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def split(self, parts):
+        """
+        Разбить столбцы на parts групп примерно равного объема данных.
+
+        """
+        groups = [[] for _ in range(min(parts, len(self.columns)))]
+        sizes = [0] * len(groups)
+        for column in sorted(self.columns, key=lambda column: column[3] - column[2], reverse=True):
+            smallest = sizes.index(min(sizes))
+            groups[smallest].append(column)
+            sizes[smallest] += column[3] - column[2] + column[5]
+        return [group for group in groups if group]
+
+
+def profile_shared(data_name, offsets_name, offsets_length, columns, spec):
+    """
+    Задача процесса пула: посчитать профили группы столбцов из разделяемой памяти.
+
+    Returns:
+        list: (позиция столбца, ColumnProfile).
+    """
+    data = SharedMemory(name=data_name)
+    offsets_block = SharedMemory(name=offsets_name)
+    offsets = np.ndarray((offsets_length,), dtype=np.int64, buffer=offsets_block.buf)
+    try:
+        results = []
+        for position, name, byte_start, byte_end, first, count in columns:
+            text = bytes(data.buf[byte_start:byte_end]).decode('utf-8')
+            bounds = offsets[first:first + count + 1].tolist()
+            values = [text[start:end] for start, end in zip(bounds[:-1], bounds[1:])]
+            results.append((position, profile_column(name, pd.Series(values, dtype=object), spec)))
+        return results
+    finally:
+        # Представления буфера нужно освободить до закрытия разделяемой памяти
+        del offsets
+        data.close()
+        offsets_block.close()
+
+
+def profile_parallel(dataframe, spec, workers):
+    """
+    Посчитать профили столбцов в пуле из workers процессов.
+
+    Returns:
+        list: ColumnProfile в порядке столбцов dataframe.
+    """
+    executor = get_executor(workers)
+    with SharedColumns(dataframe) as shared:
+        futures = [
+            executor.submit(profile_shared, shared.data.name, shared.offsets.name, shared.offsets_length, group, spec)
+            for group in shared.split(workers * 2)
+        ]
+        results = [item for future in futures for item in future.result()]
+
+    return [profile for _, profile in sorted(results, key=lambda item: item[0])]
@@ -1,86 +1,417 @@
 import pandas as pd
-import json
-from pathlib import Path
 import numpy as np
+import hashlib
+import json
 import re
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import nullcontext
+
+from reports.etl.schema import apply_schema
+from reports.etl.transformers.classifier import PROFILE_FUNCTIONS, best_column
+from reports.etl.transformers.config_manager import get_config_manager
+from reports.etl.transformers.header import HeaderDetector, NoDataRowsError
+from reports.etl.transformers.matchers import PUNCTUATION, keyword_matcher, has_cyrillic
+from reports.etl.transformers.parallel import PARALLEL_MIN_CELLS, profile_parallel, reset_executor
 
 pd.set_option('display.max_rows', None)
 pd.set_option('display.max_column', None)
 
-with open(Path(__file__).resolve().parent / './config.json', encoding='utf-8') as f:
-    config = json.load(f)
+
+MAPPING_SAMPLE_SIZE = 500  # строк для проверки сохраненного соответствия
+
+
+def header_fingerprint(columns, config):
+    """
+    Отпечаток макета отчета: заголовки столбцов по порядку и конфиг, по которому
+    определялись столбцы. Изменение любого из них дает новый отпечаток.
+
+    """
+    payload = json.dumps([[str(column) for column in columns], config], ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
 
 
 class Transformer:
+    def __init__(self, sample_size=None, sample_min_rows=50000, sample_margin=0.05, metrics=None,
+                 config_manager=None, mapping_cache=None, profile_workers=None,
+                 profile_min_cells=PARALLEL_MIN_CELLS):
+        """
+        Args:
+            sample_size (int | None): Размер выборки строк для определения столбцов.
+                None - столбцы всегда определяются по всем строкам.
+            sample_min_rows (int): Выборка используется только для отчетов от этого числа строк.
+            sample_margin (float): Доля выборки, на которую лучший кандидат должен отличаться
+                от второго и от порога в половину строк, иначе выполняется полный проход.
+            metrics (PipelineMetrics | None): Замеры подшагов трансформации.
+            config_manager (ConfigManager | None): Источник конфига. None - общий для config.json.
+            mapping_cache (MappingCache | None): Сохраненные соответствия столбцов по дистрибьюторам.
+            profile_workers (int | None): Процессов для подсчета профилей столбцов.
+                None или 1 - в текущем процессе.
+            profile_min_cells (int): Профили считаются в пуле только для таблиц от этого числа ячеек.
+        """
+        self.sample_size = sample_size
+        self.sample_min_rows = sample_min_rows
+        self.sample_margin = sample_margin
+        self.metrics = metrics
+        self.header_detector = HeaderDetector()
+        self.config_manager = config_manager or get_config_manager()
+        self.mapping_cache = mapping_cache
+        self.profile_workers = profile_workers
+        self.profile_min_cells = profile_min_cells
+        self.detection_mode = None
+        self.detection_details = None
+        # Значения кодов, отброшенные apply_schema как некорректные, по столбцам
+        self.dropped_codes = {}
+        self.profiles = None
+        self.sheet_layouts = None
+        self.skipped_sheets = []
+
+    def measure(self, name, rows=0):
+        """
+        Замерить подшаг трансформации, если заданы metrics.
+
+        """
+        if self.metrics is None:
+            return nullcontext()
+        return self.metrics.measure('transform', name, rows)
+
     def transform(self, df, distr, month):
+        with self.measure('', len(df)):
+            df = self.clean(df)
+            mapping = self.map_columns(df, self.config_manager.get(distr), distr)
 
+            return self.build_output(df, mapping, distr, month)
+
+    def clean(self, df):
+        """
+        Найти заголовок и убрать лишние строки и столбцы.
+
+        """
+        with self.measure('define_header_and_clean_rows', len(df)):
+            df = self.define_header_and_clean_rows(df)
+        with self.measure('clear_excess_columns', len(df)):
+            df = self.clear_excess_columns(df)
+        with self.measure('clear_excess_rows', len(df)):
+            df = self.clear_excess_rows(df)
+        return df
+
+    def transform_sheets(self, sheets, distr, month):
+        """
+        Трансформировать несколько листов книги в один DataFrame.
+
+        Каждый лист очищается отдельно, а соответствие столбцов определяется
+        один раз для каждого макета (набора заголовков): листы с одинаковыми
+        заголовками используют соответствие первого такого листа. Листы без
+        строк данных (например, примечания из одного текста) пропускаются,
+        их названия сохраняются в skipped_sheets.
+
+        Args:
+            sheets (dict): Название листа -> DataFrame, как возвращает extract_sheets.
+
+        Returns:
+            pd.DataFrame: Трансформированные листы подряд. В sheet_layouts сохраняется
+            число различных макетов.
+        """
+        if not sheets:
+            raise ValueError("В книге нет листов с данными")
+
+        rows = sum(len(df) for df in sheets.values())
+        with self.measure('', rows):
+            classifier = self.config_manager.get(distr)
+            mappings = {}
+            parts = []
+            self.skipped_sheets = []
+            for name, df in sheets.items():
+                try:
+                    df = self.clean(df)
+                except NoDataRowsError:
+                    self.skipped_sheets.append(name)
+                    continue
+                layout = tuple(df.columns)
+                if layout not in mappings:
+                    mappings[layout] = self.map_columns(df, classifier, distr)
+                parts.append(self.build_output(df, mappings[layout], distr, month))
+
+            if not parts:
+                raise NoDataRowsError(f"Ни на одном листе не найдены строки данных: {', '.join(self.skipped_sheets)}")
+            self.sheet_layouts = len(mappings)
+            return pd.concat(parts, ignore_index=True)
+
+    def transform_chunks(self, chunks, distr, month):
+        """
+        Потоковая трансформация: заголовок и соответствие столбцов определяются
+        по первой части, остальные части только переименовываются и переносятся
+        в выходной формат.
+
+        Args:
+            chunks: Итератор DataFrame с одинаковыми столбцами (например, pd.read_csv(chunksize=...)).
+
+        Yields:
+            pd.DataFrame: Трансформированная часть отчета.
+        """
+        chunks = iter(chunks)
+        first = next(chunks, None)
+        if first is None:
+            return
+
+        # Замер не охватывает yield: пока генератор приостановлен, часть загружается
+        with self.measure('', len(first)):
+            with self.measure('define_header_and_clean_rows', len(first)):
+                df = self.define_header_and_clean_rows(first)
+            headers = list(df.columns)
+            with self.measure('clear_excess_columns', len(df)):
+                df = self.clear_excess_columns(df)
+            with self.measure('clear_excess_rows', len(df)):
+                df = self.clear_excess_rows(df)
+
+            mapping = self.map_columns(df, self.config_manager.get(distr), distr)
+            part = self.build_output(df, mapping, distr, month)
+        yield part
+
+        for chunk in chunks:
+            with self.measure('', len(chunk)):
+                chunk.columns = headers
+                with self.measure('clear_excess_rows', len(chunk)):
+                    chunk = self.clear_excess_rows(chunk)
+                part = self.build_output(chunk, mapping, distr, month)
+            yield part
+
+    def build_output(self, df, mapping, distr, month):
+        """
+        Собрать выходной DataFrame по найденному соответствию столбцов.
+
+        Args:
+            df (pd.DataFrame): Очищенный DataFrame с заголовками.
+            mapping (dict): new_column -> исходный столбец или None.
+        """
+        with self.measure('build_output', len(df)):
+            new_df = pd.DataFrame()
+
+            for new_column, result in mapping.items():
+                if result:
+                    new_df[new_column] = df[result]
+                else:
+                    new_df[new_column] = np.nan
+
+
+            new_df['Дистрибьютор'] = distr
+            new_df['Месяц'] = month
+
+
+            new_df = self.update_address_column(new_df)
+
+            return apply_schema(new_df, self.dropped_codes)
+
+    def map_columns(self, df, classifier, distr):
+        """
+        Соответствие столбцов с учетом сохраненного для дистрибьютора макета.
+
+        Если заголовки и конфиг совпадают с сохраненными, соответствие берется из
+        mapping_cache после быстрой проверки на выборке строк. Иначе столбцы
+        определяются заново, и результат сохраняется.
+
+        """
+        if self.mapping_cache is None or not distr:
+            return self.detect_columns(df, classifier)
+
+        columns = list(df.columns)
+        fingerprint = header_fingerprint(columns, classifier.config)
+        positions = self.mapping_cache.get(distr, fingerprint)
+
+        if positions is not None:
+            mapping = {new_column: None if position is None else columns[position]
+                       for new_column, position in positions.items()}
+            with self.measure('mapping_cache', len(df)):
+                valid = self.validate_mapping(df, classifier, mapping)
+            if valid:
+                self.detection_mode = 'cache'
+                self.detection_details = None
+                self.profiles = None
+                return mapping
+
+        mapping = self.detect_columns(df, classifier)
+        if positions is not None:
+            self.detection_details = 'Сохраненное соответствие не подтвердилось на выборке'
+        self.mapping_cache.put(distr, fingerprint, {
+            new_column: None if source is None else columns.index(source)
+            for new_column, source in mapping.items()
+        })
+        return mapping
+
+    def validate_mapping(self, df, classifier, mapping):
+        """
+        Проверить сохраненное соответствие на выборке: каждый столбец, найденный по
+        значениям, должен по-прежнему совпадать с ключевыми словами хотя бы в
+        половине строк (столбец клиента - либо содержать ФИО).
+
+        """
+        sample = self.sample_rows(df, MAPPING_SAMPLE_SIZE) if len(df) > MAPPING_SAMPLE_SIZE else df
+        threshold = len(sample) / 2
+        profiles = {}
+
+        for column in classifier.config["columns_config"]:
+            source = mapping.get(column["new_column"])
+            if source is None or column["function"] not in PROFILE_FUNCTIONS:
+                continue
+            if source not in profiles:
+                profiles[source] = classifier.profile(sample[[source]].iloc[:, :1])[0]
+            profile = profiles[source]
+            if classifier.column_scores(column, [profile])[0] >= threshold:
+                continue
+            if column["new_column"] == "Клиент" and profile.fio_hits >= threshold:
+                continue
+            return False
+
+        return True
+
+    def detect_columns(self, df, classifier):
+        """
+        Определить исходный столбец для каждой записи columns_config.
+
+        На больших отчетах столбцы сначала определяются по выборке строк. Если для
+        какой-либо цели лучший кандидат близок ко второму или к порогу, выполняется
+        полный проход. Выбранный режим сохраняется в detection_mode.
+
+        Returns:
+            dict: new_column -> название исходного столбца или None.
+        """
+        self.detection_details = None
+
+        if self.sample_size and len(df) >= self.sample_min_rows and len(df) > self.sample_size:
+            sample = self.sample_rows(df, self.sample_size)
+            with self.measure('profile', len(sample)):
+                profiles = self.profile_columns(classifier, sample)
+            ambiguous = self.ambiguous_columns(classifier, profiles, len(sample))
+            if not ambiguous:
+                self.detection_mode = 'sample'
+                self.profiles = None
+                self.detection_details = f'Выборка {len(sample)} из {len(df)} строк'
+                return self.resolve_columns(df, classifier, profiles, len(sample))
+            self.detection_details = f'Близкие кандидаты по выборке: {", ".join(ambiguous)}'
+
+        self.detection_mode = 'full'
+        with self.measure('profile', len(df)):
+            self.profiles = self.profile_columns(classifier, df)
+        return self.resolve_columns(df, classifier, self.profiles, len(df))
+
+    def profile_columns(self, classifier, df):
+        """
+        Профили столбцов df. Большие таблицы считаются в пуле процессов по группам
+        столбцов, небольшие - в текущем процессе: запуск задач дороже выигрыша.
+
+        """
+        workers = self.profile_workers or 1
+        if workers > 1 and len(df.columns) > 1 and df.size >= self.profile_min_cells:
+            try:
+                return profile_parallel(df, classifier.spec, workers)
+            except BrokenProcessPool:
+                # Процесс пула завершился аварийно - пересоздаем пул при следующем вызове
+                reset_executor()
+        return classifier.profile(df)
+
+    def resolve_columns(self, df, classifier, profiles, total_rows):
+        """
+        Сопоставить записи columns_config столбцам по профилям, а заголовочные
+        функции выполнить по заголовкам df.
+
+        """
         function_mapping = {
-            "find_most_matches_column": self.find_most_matches_column,
             "find_most_matches_header": self.find_most_matches_header,
-            "find_word_matches_column": self.find_word_matches_column,
             "find_header": self.find_header,
-            "find_numeric_column_with_length_matches": self.find_numeric_column_with_length_matches,
-            "find_filtered_word_matches_column": self.find_filtered_word_matches_column
         }
 
-        df = self.define_header_and_clean_rows(df)
-        df = self.clear_excess_columns(df)
-        df = self.clear_excess_rows(df)
+        mapping = {}
+        for column in classifier.config["columns_config"]:
+            # Профили столбцов общие для всех функций и замеряются отдельно как 'profile'
+            with self.measure(column["function"], total_rows):
+                if column["function"] in PROFILE_FUNCTIONS:
+                    result = classifier.resolve(column, profiles, total_rows)
+                else:
+                    func = function_mapping[column["function"]]
+                    result = func(df, *[classifier.matchers[key] for key in column["config_key"]])
+            mapping[column["new_column"]] = result
 
-        new_df = pd.DataFrame()
+        if mapping.get("Клиент") is None:  # Клиент не найден по ключевым словам
+            with self.measure('detect_fio_columns', len(df)):
+                fio_columns = self.detect_fio_columns(df, classifier)  # Ищем столбец с ФИО
+            if fio_columns:  # Если нашли хотя бы один такой столбец
+                mapping["Клиент"] = fio_columns[0]  # Берем первый найденный столбец
 
-        for column in config["columns_config"]:
-            func = function_mapping[column["function"]]
-            if len(column["config_key"]) == 1:
-                result = func(df, config[column["config_key"][0]]['items'])
-            else:
-                result = func(df, config[column["config_key"][0]]['items'], config[column["config_key"][1]]['items'])
-            if result:
-                # print(column["new_column"], result)
-                new_df[column["new_column"]] = df[result]
-            else:
-                new_df[column["new_column"]] = np.nan
+        return mapping
 
+    def sample_rows(self, df, size):
+        """
+        Стратифицированная выборка: строки делятся на size равных последовательных
+        интервалов, из каждого берется одна строка. Пустые строки к этому моменту
+        уже удалены clear_excess_rows.
 
-        new_df['Дистрибьютор'] = distr
-        new_df['Месяц'] = month
+        """
+        rng = np.random.default_rng(0)
+        bounds = np.linspace(0, len(df), size + 1).astype(int)
+        positions = bounds[:-1] + (rng.random(size) * np.diff(bounds)).astype(int)
+        return df.iloc[positions].reset_index(drop=True)
 
+    def ambiguous_columns(self, classifier, profiles, total_rows):
+        """
+        Записи columns_config, которые нельзя уверенно определить по выборке.
 
-        new_df = self.update_address_column(new_df)
+        """
+        margin = self.sample_margin * total_rows
+        threshold = total_rows / 2
+        ambiguous = []
 
-        if new_df["Клиент"].isna().all():  # Если ВСЕ значения NaN
-            fio_columns = self.find_fio_columns(df)  # Ищем столбец с ФИО
-            if fio_columns:  # Если нашли хотя бы один такой столбец
-                new_df["Клиент"] = df[fio_columns[0]]  # Берем первый найденный столбец
+        for column in classifier.config["columns_config"]:
+            if column["function"] not in PROFILE_FUNCTIONS:
+                continue
+            scores = sorted(classifier.column_scores(column, profiles), reverse=True) + [0, 0]
+            top, runner_up = scores[0], scores[1]
+            if abs(top - threshold) < margin or (top >= threshold and top - runner_up < margin):
+                ambiguous.append(column["new_column"])
 
+        return ambiguous
 
-        if not new_df["ИНН клиента"].isna().all():
-            new_df[['ИНН клиента', 'Штрихкод продукта']] = new_df[['ИНН клиента', 'Штрихкод продукта']].astype(str)
+    def detect_fio_columns(self, df, classifier):
+        """
+        Столбцы с ФИО: по уже посчитанным профилям, а после выборки - по всем строкам.
 
-        return new_df
+        """
+        if self.profiles is not None:
+            return classifier.fio_columns(self.profiles)
+        return classifier.fio_columns(classifier.profile_fio(df))
 
-    def clear_excess_columns(self, df: pd.DataFrame) -> pd.DataFrame:
+    def clear_excess_columns(self, df: pd.DataFrame, inplace=False) -> pd.DataFrame:
         """
         Удаляет столбцы, которые полностью состоят из NaN
 
+        Args:
+            inplace (bool): Изменить df на месте вместо создания нового DataFrame.
         """
-        columns_to_drop = [
-            column_index for column_index in range(df.shape[1])
-            if df.iloc[:, column_index].isna().all()]
-        df.drop(df.columns[columns_to_drop], axis=1, inplace=True)
+        empty = df.isna().all(axis=0).to_numpy()
+        if not inplace:
+            return df.loc[:, ~empty] if empty.any() else df.copy(deep=False)
+
+        if empty.any():
+            # Удаляем по позициям: названия столбцов могут повторяться
+            columns = df.columns
+            df.columns = pd.RangeIndex(len(columns))
+            df.drop(columns=np.flatnonzero(empty), inplace=True)
+            df.columns = columns[~empty]
         return df
 
-    def clear_excess_rows(self, df: pd.DataFrame) -> pd.DataFrame:
+    def clear_excess_rows(self, df: pd.DataFrame, inplace=False) -> pd.DataFrame:
         """
-        Удаляет строки, которые полностью состоят из NaN
+        Удаляет строки, которые полностью состоят из NaN, и нумерует оставшиеся с нуля
 
+        Args:
+            inplace (bool): Изменить df на месте вместо создания нового DataFrame.
         """
-        rows_to_drop = [
-            row_index for row_index in range(df.shape[0])
-            if df.iloc[row_index, :].isna().all()
-        ]
-        df.drop(rows_to_drop, axis=0, inplace=True)
-        df.reset_index(drop=True, inplace=True)
+        empty = df.isna().all(axis=1).to_numpy()
+        if not inplace:
+            df = df.loc[~empty] if empty.any() else df.copy(deep=False)
+        elif empty.any():
+            df.index = pd.RangeIndex(len(df))
+            df.drop(index=np.flatnonzero(empty), inplace=True)
+        # Новый индекс присваивается без копирования данных, в отличие от reset_index
+        df.index = pd.RangeIndex(len(df))
         return df
 
     def count_nan_before_first_value(self, df):
@@ -106,37 +437,11 @@ class Transformer:
         Найти первую строку с числовым значением, установить для каждого столбца
         в качестве заголовка первое не NaN значение из строк выше, удалить строки выше.
         """
-        header_indices = {}  # Словарь для хранения индексов заголовков для каждого столбца
-
-        # Определяем индекс строки, где начинаются числовые данные
-        start_index = None
-        for i, row in dataframe.iterrows():
-            if any(
-                    isinstance(cell, (int, float)) and not pd.isna(cell) or  # Числовые значения
-                    (isinstance(cell, str) and cell.replace(",", "").replace(".", "").isdigit())  # Строковые числа
-                    for cell in row
-            ):
-                start_index = i
-                break
-
-        if start_index is None:
-            raise ValueError("Не удалось найти строку с числовыми значениями.")
-
-        # Ищем заголовок для каждого столбца с приоритетом строк, ближе к start_index
-        for col in dataframe.columns:
-            for i in range(start_index - 1, -1, -1):  # Двигаемся от строки с данными вверх
-                if not pd.isna(dataframe[col].iloc[i]):
-                    header_indices[col] = i
-                    break
-
-        # Формируем новый заголовок для таблицы
-        new_headers = [
-            dataframe[col].iloc[header_indices[col]] if col in header_indices else col
-            for col in dataframe.columns
-        ]
+        start_index, new_headers = self.header_detector.detect(dataframe)
 
         # Создаем очищенный DataFrame
-        cleaned_dataframe = dataframe.iloc[start_index:].reset_index(drop=True)
+        cleaned_dataframe = dataframe.iloc[start_index:]
+        cleaned_dataframe.index = pd.RangeIndex(len(cleaned_dataframe))
         cleaned_dataframe.columns = new_headers
 
         return cleaned_dataframe
@@ -146,42 +451,23 @@ class Transformer:
             Найти столбец с наибольшим количеством совпадений со списком ключевых слов.
 
             """
-        max_matches = 0
-        best_column = None
-
-        for column in df.columns:
-            # Подсчитываем количество совпадений в текущем столбце
-            matches = 0
-            for value in df[column]:
-                if pd.notna(value):
-                    lowered_value = str(value).lower()
-                    if any(keyword in lowered_value for keyword in keywords):
-                        matches += 1
-
-            if matches > max_matches:
-                max_matches = matches
-                best_column = column
-
-        if max_matches < len(df) / 2:
-            return None
-
-        return best_column
+        pattern = keyword_matcher(keywords).substring
+        counts = [
+            self.string_values(series).str.lower().str.contains(pattern).sum()
+            for _, series in df.items()
+        ]
+        return self.best_column(df, counts)
 
     def find_header(self, dataframe, keywords):
         """
         Найти название столбца, в котором заголовок содержитя полностью в списке ключевых слов.
 
         """
-        target_column = None
-        # print(dataframe.columns)
+        keywords = keyword_matcher(keywords)
         for column in dataframe.columns:
-            for keyword in keywords:
-                # print(column)
-                # print(keyword)
-                if column == keyword:
-                    target_column = column
-                    return target_column
-        return target_column
+            if column in keywords.exact:
+                return column
+        return None
 
     def find_most_matches_header(self, dataframe, keywords):
         """
@@ -189,12 +475,13 @@ class Transformer:
         со списком ключевых слов.
 
         """
+        keywords = keyword_matcher(keywords)
         max_matches = 0
         best_column = None
 
         for column in dataframe.columns:
             header = str(column).lower()
-            matches = sum(keyword in header for keyword in keywords)
+            matches = keywords.count_contained(header)
 
             if matches > max_matches:
                 max_matches = matches
@@ -214,56 +501,32 @@ class Transformer:
         Returns:
             str: Название столбца с наибольшим количеством совпадений.
         """
-        max_matches = 0
-        best_column = None
+        pattern = keyword_matcher(keywords).word
+        counts = []
 
-        for column in dataframe.columns:
+        for _, series in dataframe.items():
             # Пропускаем столбцы, где нет буквенных значений
-            if not dataframe[column].apply(
-                    lambda x: isinstance(x, str) and any(c.isalpha() and "а" <= c <= "я" for c in x.lower())).any():
+            if not self.has_cyrillic(series):
+                counts.append(0)
                 continue
 
-            # Подсчитываем количество совпадений в текущем столбце
-            matches = 0
-            for value in dataframe[column]:
-                if pd.notna(value):
-                    cleaned_value = str(value).replace(",", " ").replace(".", " ").lower()
-                    words = [word.strip() for word in cleaned_value.split()]
-                    if any(word in keywords for word in words):
-                        matches += 1
-            if matches > max_matches:
-                max_matches = matches
-                best_column = column
+            # Слова разделены пробелами, запятыми и точками
+            cleaned = self.string_values(series).str.replace(PUNCTUATION, " ", regex=True).str.lower()
+            counts.append(cleaned.str.contains(pattern).sum())
 
-        if max_matches < len(dataframe) / 2:
-            return None
-
-        return best_column
+        return self.best_column(dataframe, counts)
 
     def find_numeric_column_with_length_matches(self, dataframe, lengths):
         """
         Найти столбец, где строки содержат только цифры, и длина этих строк соответствует одной из переданных длин.
 
         """
-        max_matches = 0
-        best_column = None
+        counts = []
+        for _, series in dataframe.items():
+            values = self.string_values(series).str.strip()  # Убираем пробелы
+            counts.append((values.str.isdigit() & values.str.len().isin(lengths)).sum())
 
-        for column in dataframe.columns:
-            matches = 0
-            for value in dataframe[column]:
-                if pd.notna(value):
-                    str_value = str(value).strip()  # Убираем пробелы
-                    if str_value.isdigit() and len(str_value) in lengths:
-                        matches += 1
-
-            if matches > max_matches:
-                max_matches = matches
-                best_column = column
-
-        if max_matches < len(dataframe) / 2:
-            return None
-
-        return best_column
+        return self.best_column(dataframe, counts)
 
     def find_filtered_word_matches_column(self, dataframe, include_keywords, exclude_keywords):
         """
@@ -278,33 +541,44 @@ class Transformer:
         Returns:
             str: Название столбца с наибольшим количеством совпадений.
         """
-        max_matches = 0
-        best_column = None
+        include_pattern = keyword_matcher(include_keywords).word
+        exclude_pattern = keyword_matcher(exclude_keywords).word
+        counts = []
 
-        for column in dataframe.columns:
+        for _, series in dataframe.items():
             # Пропускаем столбцы, где нет буквенных значений
-            if not dataframe[column].apply(
-                    lambda x: isinstance(x, str) and any(c.isalpha() and "а" <= c <= "я" for c in x.lower())).any():
+            if not self.has_cyrillic(series):
+                counts.append(0)
                 continue
 
-            # Подсчитываем количество совпадений в текущем столбце
-            matches = 0
-            for value in dataframe[column]:
-                if pd.notna(value):
-                    cleaned_value = str(value).replace(",", "").replace(".", "").lower()
-                    words = [word.strip() for word in cleaned_value.split()]
-                    if any(word in include_keywords for word in words) and not any(
-                            word in exclude_keywords for word in words):
-                        matches += 1
+            # Запятые и точки удаляются, а не заменяются пробелами
+            cleaned = self.string_values(series).str.replace(PUNCTUATION, "", regex=True).str.lower()
+            matches = cleaned.str.contains(include_pattern) & ~cleaned.str.contains(exclude_pattern)
+            counts.append(matches.sum())
 
-            if matches > max_matches:
-                max_matches = matches
-                best_column = column
+        return self.best_column(dataframe, counts)
 
-        if max_matches < len(dataframe) / 2:
-            return None
+    def string_values(self, series):
+        """
+        Непустые значения столбца, приведенные к строке так же, как str(value).
 
-        return best_column
+        """
+        return series.dropna().astype(str)
+
+    def has_cyrillic(self, series):
+        """
+        Проверить, есть ли в столбце хотя бы одна строка со строчной (после lower) кириллицей.
+
+        """
+        return has_cyrillic(series)
+
+    def best_column(self, dataframe, counts):
+        """
+        Выбрать первый столбец с максимальным числом совпадений, если совпадений
+        не меньше половины строк.
+
+        """
+        return best_column(dataframe.columns, counts, len(dataframe))
 
     def update_address_column(self, dataframe):
         """
@@ -315,11 +589,19 @@ class Transformer:
             dataframe (pd.DataFrame): Исходный DataFrame.
         """
         cols = ["Область/Край", "Город", "Улица, номер дома"]
-        dataframe["Адрес полностью"] = dataframe.apply(
-            lambda row: ', '.join(filter(None, [row[col] for col in cols]))
-            if row["Адрес полностью"] in row[cols].values and all(pd.notna(row[col]) and row[col] != '' for col in cols)
-            else row["Адрес полностью"], axis=1
-        )
+        address = dataframe["Адрес полностью"]
+        parts = dataframe[cols]
+
+        filled = (parts.notna() & parts.ne('')).all(axis=1)
+        replace = filled & parts.eq(address, axis=0).any(axis=1)
+
+        if replace.any():
+            selected = parts[replace].astype(str)
+            joined = selected[cols[0]].str.cat([selected[col] for col in cols[1:]], sep=', ')
+            address = address.where(~replace, joined)
+
+        # Тип столбца выводится по значениям, как это делал построчный apply
+        dataframe["Адрес полностью"] = address.infer_objects()
         return dataframe
 
     def find_fio_columns(self, dataframe):
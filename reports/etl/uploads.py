@@ -0,0 +1,211 @@
+import datetime
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from reports.etl.logger import log_to_db
+from reports.models import ReportInfo
+
+UPLOAD_DEFAULTS = {
+    'ASYNC_STORAGE': True,
+    'STORAGE_THREADS': 2,
+    'DELETE_LOCAL': True,
+    'MAX_RETRIES': 5,
+    'RETRY_AFTER': 300,  # с: повтор загрузки с ошибкой и "зависшей" (поток не завершил загрузку)
+}
+
+# Статусы, после которых pipeline отчет больше не читает (до повторного запуска)
+FINISHED_STATUSES = ('done', 'error')
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_upload_settings():
+    return {**UPLOAD_DEFAULTS, **getattr(settings, 'ETL_UPLOAD', {})}
+
+
+def spool_upload(file):
+    """
+    Записать загруженный файл на диск один раз - в TEMP_MEDIA_ROOT под уникальным
+    именем. Если Django уже сохранил большой файл во временный, на него ставится
+    жесткая ссылка без копирования данных.
+
+    Returns:
+        str: Путь к локальной копии.
+    """
+    os.makedirs(settings.TEMP_MEDIA_ROOT, exist_ok=True)
+    path = os.path.join(settings.TEMP_MEDIA_ROOT, f'{uuid4().hex}_{os.path.basename(file.name)}')
+
+    if hasattr(file, 'temporary_file_path'):
+        try:
+            os.link(file.temporary_file_path(), path)
+            return path
+        except OSError:
+            pass  # другой раздел диска или ФС без жестких ссылок
+
+    with open(path, 'wb') as destination:
+        for chunk in file.chunks():
+            destination.write(chunk)
+    return path
+
+
+def get_storage_path(report):
+    return f"uploads_{report.month}/{os.path.basename(report.local_path)}"
+
+
+def claim_upload(report_id, retry_after=None):
+    """
+    Захватить загрузку файла условным UPDATE, чтобы поток веб-процесса и повтор
+    из воркера не загружали один файл одновременно.
+
+    Args:
+        retry_after (int | None): Захватить только загрузку, которую не начинали или
+            начали больше retry_after секунд назад. None - только еще не начатую.
+
+    Returns:
+        bool: True, если загрузка захвачена.
+    """
+    uploads = ReportInfo.objects.filter(id=report_id, upload_status__in=['pending', 'error'])
+    if retry_after is None:
+        uploads = uploads.filter(upload_claimed_at__isnull=True)
+    else:
+        stale = timezone.now() - datetime.timedelta(seconds=retry_after)
+        uploads = uploads.filter(Q(upload_claimed_at__isnull=True, created_at__lt=stale)
+                                 | Q(upload_claimed_at__lt=stale))
+    return bool(uploads.update(upload_claimed_at=timezone.now(), upload_attempts=F('upload_attempts') + 1))
+
+
+def upload_to_storage(report_id, local_path, storage_path, retry_after=None):
+    """
+    Загрузить локальную копию отчета в хранилище и сохранить s3_uri.
+
+    Returns:
+        str | None: Имя файла в хранилище или None при ошибке или если загрузку
+        уже выполняет другой процесс.
+    """
+    if not claim_upload(report_id, retry_after):
+        return None
+    try:
+        with open(local_path, 'rb') as f:
+            saved_path = default_storage.save(storage_path, File(f, name=os.path.basename(storage_path)))
+    except Exception as e:
+        ReportInfo.objects.filter(id=report_id).update(upload_status='error')
+        log_to_db(report_id, 'Файл не загружен в хранилище', log_level='error', details=f'{type(e).__name__}: {e}')
+        return None
+
+    ReportInfo.objects.filter(id=report_id).update(s3_uri=saved_path, upload_status='done')
+    cleanup_local_file(report_id)
+    return saved_path
+
+
+def _upload_in_background(report_id, local_path, storage_path):
+    try:
+        return upload_to_storage(report_id, local_path, storage_path)
+    finally:
+        close_old_connections()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=get_upload_settings()['STORAGE_THREADS'],
+                                           thread_name_prefix='storage-upload')
+        return _executor
+
+
+def submit_upload(report, storage_path):
+    """
+    Загрузить файл отчета в хранилище: в фоновом потоке (ASYNC_STORAGE) или сразу.
+    Если загрузка не выполнится, ее повторит воркер очереди (retry_uploads).
+
+    """
+    if get_upload_settings()['ASYNC_STORAGE']:
+        # Поток должен видеть созданный отчет: запускаем после фиксации транзакции
+        transaction.on_commit(
+            lambda: get_executor().submit(_upload_in_background, report.id, report.local_path, storage_path))
+        return None
+    return upload_to_storage(report.id, report.local_path, storage_path)
+
+
+def retry_uploads():
+    """
+    Повторить загрузки в хранилище, которые завершились ошибкой или не завершились
+    (процесс с фоновым потоком перезапущен), пока не исчерпан MAX_RETRIES.
+    Вызывается воркерами очереди.
+
+    Returns:
+        int: Число загруженных файлов.
+    """
+    options = get_upload_settings()
+    stale = timezone.now() - datetime.timedelta(seconds=options['RETRY_AFTER'])
+    reports = (ReportInfo.objects
+               .filter(upload_status__in=['pending', 'error'], upload_attempts__lte=options['MAX_RETRIES'],
+                       local_path__isnull=False)
+               .filter(Q(upload_claimed_at__isnull=True, created_at__lt=stale) | Q(upload_claimed_at__lt=stale))
+               .order_by('id'))
+
+    uploaded = 0
+    for report in reports:
+        if not os.path.exists(report.local_path):
+            continue
+        if upload_to_storage(report.id, report.local_path, get_storage_path(report), options['RETRY_AFTER']):
+            log_to_db(report.id, f'Файл загружен в хранилище повторно (попытка {report.upload_attempts + 1})')
+            uploaded += 1
+    return uploaded
+
+
+def cleanup_local_file(report_id):
+    """
+    Удалить локальную копию, если отчет обработан и файл уже есть в хранилище.
+    При повторной обработке копия восстанавливается из хранилища (ensure_local_file).
+
+    Returns:
+        bool: True, если файл удален.
+    """
+    if not get_upload_settings()['DELETE_LOCAL']:
+        return False
+
+    local_path = (ReportInfo.objects
+                  .filter(id=report_id, status__in=FINISHED_STATUSES, upload_status='done')
+                  .values_list('local_path', flat=True)
+                  .first())
+    if not local_path:
+        return False
+    try:
+        os.remove(local_path)
+    except FileNotFoundError:
+        return False
+    return True
+
+
+def ensure_local_file(report):
+    """
+    Вернуть путь к локальной копии отчета, скачав файл из хранилища, если копия
+    уже удалена.
+
+    """
+    if not report.local_path or os.path.exists(report.local_path) or report.upload_status != 'done':
+        return report.local_path
+
+    os.makedirs(os.path.dirname(report.local_path), exist_ok=True)
+    partial_path = f'{report.local_path}.{uuid4().hex}.part'
+    try:
+        with default_storage.open(report.s3_uri, 'rb') as source, open(partial_path, 'wb') as destination:
+            for chunk in source.chunks():
+                destination.write(chunk)
+        os.replace(partial_path, report.local_path)
+    except Exception as e:
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+        log_to_db(report.id, 'Файл не получен из хранилища', log_level='error', details=f'{type(e).__name__}: {e}')
+    return report.local_path
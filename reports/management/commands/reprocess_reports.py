@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from reports.etl.batch import run_batch
+from reports.etl.reprocess import DEFAULT_STAGE, reprocess_reports
+from reports.models import ReportInfo
+
+
+class Command(BaseCommand):
+    help = 'Повторно обрабатывает отчеты с выбранного шага без повторной загрузки файлов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('report_ids', nargs='*', type=int, help='Идентификаторы отчетов')
+        parser.add_argument('--distributor', help='Все отчеты дистрибьютора')
+        parser.add_argument('--month', help='Все отчеты за месяц')
+        parser.add_argument('--stage', choices=[stage for stage, _ in ReportInfo.STAGE_CHOICES],
+                            default=DEFAULT_STAGE, help='Шаг, с которого начать обработку')
+        parser.add_argument('--run', action='store_true',
+                            help='Обработать сразу в пуле процессов, а не ставить в очередь воркеров')
+        parser.add_argument('--processes', type=int, help='Количество процессов для --run')
+
+    def handle(self, *args, **options):
+        if not (options['report_ids'] or options['distributor'] or options['month']):
+            raise CommandError('Укажите отчеты, --distributor или --month')
+
+        reports = ReportInfo.objects.all()
+        if options['report_ids']:
+            reports = reports.filter(id__in=options['report_ids'])
+        if options['distributor']:
+            reports = reports.filter(distributor=options['distributor'])
+        if options['month']:
+            reports = reports.filter(month=options['month'])
+
+        report_ids = reprocess_reports(reports, options['stage'])
+        self.stdout.write(f"Поставлено в очередь с шага {options['stage']}: {len(report_ids)} отчетов")
+        if not options['run'] or not report_ids:
+            return
+
+        results = run_batch(report_ids, options['processes'])
+        done = sum(1 for status in results.values() if status == 'done')
+        self.stdout.write(f'Обработано: {done} из {len(results)}')
@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from reports.etl.batch import get_processes, run_batch, run_report_batch
+from reports.models import ReportInfo, ReportBatch
+
+
+class Command(BaseCommand):
+    help = 'Обрабатывает пакет отчетов в пуле процессов и выводит общий прогресс'
+
+    def add_arguments(self, parser):
+        parser.add_argument('report_ids', nargs='*', type=int, help='Идентификаторы отчетов')
+        parser.add_argument('--batch', type=int, help='Идентификатор ReportBatch')
+        parser.add_argument('--queued', action='store_true', help='Все отчеты со статусом queued')
+        parser.add_argument('--processes', type=int, help='Количество процессов (по умолчанию - по числу ядер)')
+        parser.add_argument('--max-retries', type=int, help='Количество повторов для отчета с ошибкой')
+
+    def progress(self, tracker, report_id, status, seconds):
+        counts = ', '.join(f'{name}: {count}' for name, count in sorted(tracker.counts.items()))
+        self.stdout.write(
+            f'[{tracker.finished}/{tracker.total}] отчет {report_id}: {status} за {seconds:.1f} с '
+            f'({counts}; прошло {tracker.elapsed:.1f} с)'
+        )
+
+    def handle(self, *args, **options):
+        processes = options['processes']
+        max_retries = options['max_retries']
+
+        if options['batch']:
+            try:
+                batch = ReportBatch.objects.get(id=options['batch'])
+            except ReportBatch.DoesNotExist:
+                raise CommandError(f"Пакет {options['batch']} не найден")
+            self.stdout.write(f'Пакет {batch.id}: {batch.reports.count()} отчетов, '
+                              f'{get_processes(processes or batch.processes)} процессов')
+            results = run_report_batch(batch, processes, max_retries, self.progress)
+        else:
+            report_ids = list(options['report_ids'])
+            if options['queued']:
+                report_ids += list(ReportInfo.objects.filter(status='queued')
+                                   .order_by('created_at', 'id').values_list('id', flat=True))
+            if not report_ids:
+                raise CommandError('Укажите отчеты, --batch или --queued')
+            self.stdout.write(f'Пакет: {len(report_ids)} отчетов, {get_processes(processes)} процессов')
+            results = run_batch(report_ids, processes, max_retries, self.progress)
+
+        done = sum(1 for status in results.values() if status == 'done')
+        self.stdout.write(f'Обработано: {done} из {len(results)}')
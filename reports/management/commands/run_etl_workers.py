@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from reports.etl.queue import WorkerPool
+
+
+class Command(BaseCommand):
+    help = 'Запускает пул воркеров, обрабатывающих отчеты со статусом queued'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, help='Количество процессов-воркеров')
+        parser.add_argument('--max-retries', type=int, help='Количество повторов для отчета с ошибкой')
+        parser.add_argument('--poll-interval', type=float, help='Пауза между опросами пустой очереди, сек')
+        parser.add_argument('--once', action='store_true', help='Завершиться, когда очередь опустеет')
+
+    def handle(self, *args, **options):
+        pool = WorkerPool(
+            concurrency=options['concurrency'],
+            poll_interval=options['poll_interval'],
+            max_retries=options['max_retries'],
+            once=options['once'],
+        )
+        self.stdout.write(f'Запуск {pool.concurrency} воркеров ETL')
+        pool.run()
+        self.stdout.write('Воркеры ETL остановлены')
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.20 on 2026-10-18 07:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0006_alter_systemlog_log_level_alter_systemlog_step'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reportinfo',
+            name='attempts',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='reportinfo',
+            name='distributor',
+            field=models.CharField(blank=True, max_length=255, null=True),
+        ),
+        migrations.AddField(
+            model_name='reportinfo',
+            name='local_path',
+            field=models.CharField(blank=True, max_length=1024, null=True),
+        ),
+        migrations.AddField(
+            model_name='reportinfo',
+            name='month',
+            field=models.CharField(blank=True, max_length=20, null=True),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.20 on 2026-10-18 07:28
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0008_systemlog_timestamp_default'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StageMetric',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('stage', models.CharField(choices=[('extract', 'Extract'), ('transform', 'Transform'), ('load', 'Load')], max_length=50)),
+                ('name', models.CharField(blank=True, default='', max_length=255)),
+                ('wall_time', models.FloatField()),
+                ('cpu_time', models.FloatField()),
+                ('peak_rss', models.BigIntegerField()),
+                ('rows', models.BigIntegerField(default=0)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('report', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='metrics', to='reports.reportinfo')),
+            ],
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 4.2.20 on 2026-10-18 07:43
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0009_stagemetric'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ColumnMapping',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('distributor', models.CharField(max_length=255)),
+                ('fingerprint', models.CharField(max_length=64)),
+                ('mapping', models.JSONField()),
+                ('hits', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('last_used_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='columnmapping',
+            constraint=models.UniqueConstraint(fields=('distributor', 'fingerprint'), name='unique_distributor_fingerprint'),
+        ),
+    ]
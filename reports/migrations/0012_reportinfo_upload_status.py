@@ -0,0 +1,18 @@
+# Generated by Django 4.2.20 on 2026-10-18 07:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0011_reportbatch'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reportinfo',
+            name='upload_status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('done', 'Done'), ('error', 'Error')], default='pending', max_length=20),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.20 on 2026-10-18 08:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0012_reportinfo_upload_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reportinfo',
+            name='restart_stage',
+            field=models.CharField(blank=True, choices=[('extract', 'Extract'), ('transform', 'Transform'), ('load', 'Load')], max_length=20, null=True),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.20 on 2026-10-18 08:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0013_reportinfo_restart_stage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reportinfo',
+            name='upload_attempts',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='reportinfo',
+            name='upload_claimed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
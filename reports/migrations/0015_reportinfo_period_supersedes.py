@@ -0,0 +1,24 @@
+# Generated by Django 4.2.20 on 2026-10-18 08:43
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0014_reportinfo_upload_attempts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reportinfo',
+            name='period',
+            field=models.CharField(blank=True, max_length=7, null=True),
+        ),
+        migrations.AddField(
+            model_name='reportinfo',
+            name='supersedes',
+            field=models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='superseded_by', to='reports.reportinfo'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.20 on 2026-10-18 08:55
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0016_reportinfo_heartbeat_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PoolMetric',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('worker', models.CharField(max_length=255)),
+                ('alias', models.CharField(max_length=100)),
+                ('url', models.CharField(max_length=1024)),
+                ('size', models.IntegerField()),
+                ('checked_in', models.IntegerField()),
+                ('checked_out', models.IntegerField()),
+                ('overflow', models.IntegerField()),
+                ('max_overflow', models.IntegerField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+    ]
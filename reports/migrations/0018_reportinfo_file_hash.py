@@ -0,0 +1,18 @@
+# Generated by Django 4.2.20 on 2026-10-18 09:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0017_poolmetric'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reportinfo',
+            name='file_hash',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+    ]
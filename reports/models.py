@@ -1,5 +1,6 @@
 from django.db import models
 from django.conf import settings
+from django.utils import timezone
 
 class ReportInfo(models.Model):
     STATUS_CHOICES = (
@@ -9,6 +10,19 @@ class ReportInfo(models.Model):
         ('error', 'Error'),
     )
 
+    STAGE_CHOICES = (
+        ('extract', 'Extract'),
+        ('transform', 'Transform'),
+        ('load', 'Load'),
+    )
+
+    # Загрузка исходного файла в объектное хранилище (выполняется параллельно с обработкой)
+    UPLOAD_STATUS_CHOICES = (
+        ('pending', 'Pending'),
+        ('done', 'Done'),
+        ('error', 'Error'),
+    )
+
     s3_uri = models.CharField(max_length=255, blank=True, null=True)
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_DEFAULT , related_name='reports',blank=True,default=1)
     file_name = models.CharField(max_length=255, blank=True, null=True)
@@ -16,6 +30,43 @@ class ReportInfo(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     details = models.TextField(blank=True, null=True)
+    distributor = models.CharField(max_length=255, blank=True, null=True)
+    month = models.CharField(max_length=20, blank=True, null=True)
+    local_path = models.CharField(max_length=1024, blank=True, null=True)
+    # SHA-256 файла: по нему находится кэш извлечения без локальной копии файла
+    file_hash = models.CharField(max_length=64, blank=True, null=True)
+    attempts = models.PositiveIntegerField(default=0)
+    # Последняя отметка воркера, что отчет обрабатывается (heartbeat); устаревшая - воркер не отвечает
+    heartbeat_at = models.DateTimeField(blank=True, null=True)
+    batch = models.ForeignKey('ReportBatch', on_delete=models.SET_NULL, related_name='reports', blank=True, null=True)
+    upload_status = models.CharField(max_length=20, choices=UPLOAD_STATUS_CHOICES, default='pending')
+    # Попытки загрузки в хранилище и время начала последней (повтор - retry_uploads)
+    upload_attempts = models.PositiveIntegerField(default=0)
+    upload_claimed_at = models.DateTimeField(blank=True, null=True)
+    # Шаг, с которого выполнить повторную обработку (reprocess). Пусто - обычная обработка
+    restart_stage = models.CharField(max_length=20, choices=STAGE_CHOICES, blank=True, null=True)
+    # Период отчета 'ГГГГ-ММ' (в month - только номер месяца)
+    period = models.CharField(max_length=7, blank=True, null=True)
+    # Заменяемый отчет того же дистрибьютора и периода: при загрузке в режиме 'replace'
+    # его строки удаляются из таблицы отчетов
+    supersedes = models.OneToOneField('self', on_delete=models.SET_NULL, related_name='superseded_by',
+                                      blank=True, null=True)
+
+
+class ReportBatch(models.Model):
+    # Пакетная обработка отчетов в пуле процессов (run_etl_batch)
+    STATUS_CHOICES = (
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+    )
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, related_name='batches',
+                             blank=True, null=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    processes = models.PositiveIntegerField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
 
 
 class SystemLog(models.Model):
@@ -32,8 +83,58 @@ class SystemLog(models.Model):
     )
 
     report = models.ForeignKey(ReportInfo, on_delete=models.CASCADE, related_name='logs')
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # Не auto_now_add: буфер логов сохраняет время записи, а не время bulk_create
+    timestamp = models.DateTimeField(default=timezone.now)
     log_level = models.CharField(max_length=50, choices=LOG_LVL, default='info')
     step = models.CharField(max_length=50, choices=STEP, default='other')
     message = models.TextField()
     details = models.TextField(blank=True, null=True)
+
+
+class StageMetric(models.Model):
+    STAGE = (
+        ('extract', 'Extract'),
+        ('transform', 'Transform'),
+        ('load', 'Load'),
+    )
+
+    report = models.ForeignKey(ReportInfo, on_delete=models.CASCADE, related_name='metrics')
+    stage = models.CharField(max_length=50, choices=STAGE)
+    # Подшаг: функция из columns_config или метод Transformer. Пусто - шаг целиком
+    name = models.CharField(max_length=255, blank=True, default='')
+    wall_time = models.FloatField()
+    cpu_time = models.FloatField()
+    peak_rss = models.BigIntegerField()
+    rows = models.BigIntegerField(default=0)
+    created_at = models.DateTimeField(default=timezone.now)
+
+
+class PoolMetric(models.Model):
+    # Снимок пула соединений SQLAlchemy процесса-воркера (engine.pool_metrics) после
+    # обработки отчета. Загрузки идут в воркерах, у веб-процесса своих пулов нет.
+    # worker - хост:pid
+    worker = models.CharField(max_length=255)
+    alias = models.CharField(max_length=100)
+    url = models.CharField(max_length=1024)
+    size = models.IntegerField()
+    checked_in = models.IntegerField()
+    checked_out = models.IntegerField()
+    overflow = models.IntegerField()
+    max_overflow = models.IntegerField(blank=True, null=True)
+    updated_at = models.DateTimeField(default=timezone.now)
+
+
+class ColumnMapping(models.Model):
+    # Сохраненное соответствие столбцов для макета отчета дистрибьютора.
+    # fingerprint - хэш заголовков и конфига, mapping - new_column -> позиция исходного столбца
+    distributor = models.CharField(max_length=255)
+    fingerprint = models.CharField(max_length=64)
+    mapping = models.JSONField()
+    hits = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['distributor', 'fingerprint'], name='unique_distributor_fingerprint'),
+        ]
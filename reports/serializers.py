@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from .models import ReportInfo, SystemLog
+from .models import ReportInfo, SystemLog, StageMetric, PoolMetric
 
 
 class ReportInfoSerializer(serializers.ModelSerializer):
@@ -7,7 +7,9 @@ class ReportInfoSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = ReportInfo
-        fields = ['id', 's3_uri', 'file_name', 'status', 'created_at', 'updated_at', 'details', 'username']
+        fields = ['id', 's3_uri', 'file_name', 'status', 'created_at', 'updated_at', 'details', 'username',
+                  'distributor', 'month', 'period', 'attempts', 'heartbeat_at', 'batch', 'upload_status',
+                  'upload_attempts', 'restart_stage', 'supersedes']
 
 
 class SystemLogsSerializer(serializers.ModelSerializer):
@@ -16,5 +18,54 @@ class SystemLogsSerializer(serializers.ModelSerializer):
         fields = ['id', 'report', 'timestamp', 'log_level', 'step', 'message', 'details']
 
 
+class StageMetricSerializer(serializers.ModelSerializer):
+    distributor = serializers.CharField(source='report.distributor', read_only=True)
+
+    class Meta:
+        model = StageMetric
+        fields = ['id', 'report', 'distributor', 'stage', 'name', 'wall_time', 'cpu_time', 'peak_rss', 'rows',
+                  'created_at']
+
+
+class PoolMetricSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = PoolMetric
+        fields = ['worker', 'alias', 'url', 'size', 'checked_in', 'checked_out', 'overflow', 'max_overflow',
+                  'updated_at']
+
+
+class ReportBatchSerializer(serializers.Serializer):
+    report_ids = serializers.ListField(child=serializers.IntegerField(), allow_empty=False)
+    processes = serializers.IntegerField(min_value=1, required=False)
+
+
+class ReprocessSerializer(serializers.Serializer):
+    stage = serializers.ChoiceField(choices=ReportInfo.STAGE_CHOICES, default='transform')
+
+
+class BulkReprocessSerializer(ReprocessSerializer):
+    distributor = serializers.CharField(required=False)
+    month = serializers.CharField(required=False)
+
+    def validate(self, attrs):
+        if not attrs.get('distributor') and not attrs.get('month'):
+            raise serializers.ValidationError('Укажите distributor и/или month')
+        return attrs
+
+
 class UploadReportSerializer(serializers.Serializer):
-    file = serializers.FileField()
\ No newline at end of file
+    file = serializers.FileField()
+    distributor = serializers.CharField()
+    month = serializers.RegexField(r'^\d{4}-\d{2}$', help_text='Период отчета ГГГГ-ММ')
+    # Повторная загрузка отчета за период: строки заменяемого отчета удаляются при загрузке
+    supersedes = serializers.PrimaryKeyRelatedField(queryset=ReportInfo.objects.all(), required=False)
+
+    def validate(self, attrs):
+        report = attrs.get('supersedes')
+        if report is None:
+            return attrs
+        if (report.distributor, report.period) != (attrs['distributor'], attrs['month']):
+            raise serializers.ValidationError({'supersedes': 'Заменить можно только отчет того же дистрибьютора и периода'})
+        if ReportInfo.objects.filter(supersedes=report).exists():
+            raise serializers.ValidationError({'supersedes': 'Отчет уже заменен другим отчетом'})
+        return attrs
@@ -1,19 +1,227 @@
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import TestCase
-from reports.etl.pipeline import run_pipeline
+from django.test import TestCase, TransactionTestCase
+from django.conf import settings
+from django.db import OperationalError
+from django.test import override_settings
+from reports.etl.extractors import cache
+from reports.etl.extractors.extractors import CSVExtractor, ExcelExtractor, CalamineWorkbook, rows_to_frame
+import unittest
+from unittest import mock
+from io import StringIO
+from django.core.management import call_command
+from reports.etl.logger import LogBuffer
+from reports.etl.metrics import clear_pool_metrics, save_pool_metrics, worker_name
+from reports.etl.mapping_cache import MappingCache
+from reports.etl.pipeline import extract_first_sheet, run_pipeline, use_chunked_csv
+from reports.etl.loaders.engine import dispose_engines, get_engine, pool_metrics
+from reports.etl.loaders.loader import Loader, build_connection_url
+from reports.etl.loaders.strategies import STRATEGIES, MultiValuesStrategy
+from sqlalchemy import create_engine, inspect
+from reports.etl.queue import Heartbeat, WorkerPool, claim_next_job, requeue_stale_jobs, run_job, worker_loop
+from reports.etl.batch import launch_batch, run_batch
+from reports.etl.schema import apply_schema, normalize_codes, parse_numbers
+from reports.etl.uploads import cleanup_local_file, ensure_local_file, retry_uploads
+from django.core.files.storage import default_storage
+from reports.etl.transformers.classifier import ColumnClassifier, PROFILE_FUNCTIONS
+from reports.etl.transformers.header import HeaderDetector
+from reports.etl.transformers.matchers import KeywordMatcher
+from reports.etl.transformers.parallel import profile_parallel, reset_executor
+from reports.etl.transformers.config_manager import ConfigError, ConfigManager, get_config_manager
+from reports.etl.transformers.transformers import Transformer
+import numpy as np
+import pandas as pd
+import datetime
+import json
+import multiprocessing
+import subprocess
+import sys
 import tempfile
+import threading
+import time
 import os
 from rest_framework.test import APITestCase
 from rest_framework import status
 from django.contrib.auth import get_user_model
-from reports.models import ReportInfo, SystemLog
+from django.utils import timezone
+from reports.models import ReportInfo, SystemLog, StageMetric, ColumnMapping, ReportBatch, PoolMetric
 
 
-class UploadReportTest(APITestCase):
+config = get_config_manager().get().config
+keyword_matchers = get_config_manager().get().matchers
+
+
+class ReportsDatabaseMixin:
+    """
+    pipeline загружает отчеты через SQLAlchemy в DATABASES['reports'], а не в тестовую
+    БД Django. На время теста она заменяется временным файлом SQLite с настройками
+    загрузчика из конфигурации, а кэш извлечения - временным каталогом.
+
+    """
+
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.reports_db = os.path.join(directory.name, 'reports.sqlite3')
+        databases = override_settings(DATABASES={
+            **settings.DATABASES,
+            'reports': {
+                'ENGINE': 'django.db.backends.sqlite3',
+                'NAME': self.reports_db,
+                'LOADER': settings.DATABASES['reports'].get('LOADER', {}),
+            },
+        }, ETL_EXTRACT_CACHE={
+            **getattr(settings, 'ETL_EXTRACT_CACHE', {}),
+            'DIR': os.path.join(directory.name, 'extract_cache'),
+        })
+        databases.enable()
+        self.addCleanup(databases.disable)
+        dispose_engines()
+        self.addCleanup(dispose_engines)
+
+    def sales_rows(self):
+        engine = create_engine(f'sqlite:///{self.reports_db}')
+        try:
+            if not inspect(engine).has_table('sales'):
+                return []
+            with engine.connect() as connection:
+                return connection.exec_driver_sql('SELECT * FROM sales').fetchall()
+        finally:
+            engine.dispose()
+
+
+class UploadReportTest(ReportsDatabaseMixin, APITestCase):
     def setUp(self):
+        super().setUp()
         self.user = get_user_model().objects.create_user(username='test', password='testpass')
         self.client.force_authenticate(self.user)
 
+        temp_media = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_media.cleanup)
+        # Вместо S3 из настроек - файловое хранилище во временном каталоге. Пока задан
+        # DEFAULT_FILE_STORAGE, OPTIONS из STORAGES не применяются: каталог - MEDIA_ROOT
+        storages = {**settings.STORAGES, 'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'}}
+        upload_settings = self.settings(TEMP_MEDIA_ROOT=temp_media.name, ETL_UPLOAD={'ASYNC_STORAGE': False},
+                                        STORAGES=storages, MEDIA_ROOT=os.path.join(temp_media.name, 'storage'))
+        upload_settings.enable()
+        self.addCleanup(upload_settings.disable)
+
+    def upload(self, name, content):
+        response = self.client.post(
+            '/api/upload_report/',
+            {
+                'file': SimpleUploadedFile(name, content, content_type='text/csv'),
+                'distributor': 'ООО Дистрибьютор',
+                'month': '2024-04'
+            },
+            format='multipart'
+        )
+        report = ReportInfo.objects.get(id=response.data['report_id'])
+        if report.s3_uri:
+            self.addCleanup(default_storage.delete, report.s3_uri)
+        return report
+
+    def test_same_names_get_unique_local_copies(self):
+        first = self.upload('same.csv', b'col1\nfirst')
+        second = self.upload('same.csv', b'col1\nsecond')
+
+        self.assertNotEqual(first.local_path, second.local_path)
+        self.assertTrue(first.local_path.startswith(settings.TEMP_MEDIA_ROOT))
+        with open(first.local_path, 'rb') as f:
+            self.assertEqual(f.read(), b'col1\nfirst')
+
+        self.assertEqual(second.upload_status, 'done')
+        with default_storage.open(second.s3_uri) as f:
+            self.assertEqual(f.read(), b'col1\nsecond')
+
+    def test_storage_upload_runs_after_commit(self):
+        with self.settings(ETL_UPLOAD={'ASYNC_STORAGE': True}), \
+                mock.patch('reports.etl.uploads.get_executor') as get_executor:
+            get_executor.return_value.submit.side_effect = lambda function, *args: function(*args)
+            with self.captureOnCommitCallbacks(execute=True) as callbacks:
+                report = self.upload('async.csv', b'col1\nvalue')
+                self.assertEqual(report.upload_status, 'pending')
+
+        self.assertEqual(len(callbacks), 1)
+        report.refresh_from_db()
+        self.assertEqual(report.upload_status, 'done')
+        self.addCleanup(default_storage.delete, report.s3_uri)
+
+    def test_local_copy_is_removed_after_processing(self):
+        report = self.upload('clean.csv', 'Товар,Кол-во\nКрем детский,1'.encode())
+        run_job(claim_next_job())
+
+        report.refresh_from_db()
+        self.assertEqual(report.status, 'done')
+        self.assertFalse(os.path.exists(report.local_path))
+
+        # Повторная обработка восстанавливает копию из хранилища
+        self.assertEqual(ensure_local_file(report), report.local_path)
+        with open(report.local_path, encoding='utf-8') as f:
+            self.assertEqual(f.read(), 'Товар,Кол-во\nКрем детский,1')
+
+    def test_local_copy_is_kept_until_uploaded(self):
+        report = self.upload('pending.csv', b'col1\nvalue')
+        ReportInfo.objects.filter(id=report.id).update(status='done', upload_status='pending')
+        self.assertFalse(cleanup_local_file(report.id))
+        self.assertTrue(os.path.exists(report.local_path))
+
+    def test_failed_upload_is_retried(self):
+        with mock.patch.object(default_storage, 'save', side_effect=OSError('Connection reset')):
+            report = self.upload('retry.csv', b'col1\nvalue')
+        report.refresh_from_db()
+        self.assertEqual((report.upload_status, report.upload_attempts), ('error', 1))
+
+        # Повтор - только после RETRY_AFTER
+        with self.settings(ETL_UPLOAD={'RETRY_AFTER': 60}):
+            self.assertEqual(retry_uploads(), 0)
+        with self.settings(ETL_UPLOAD={'RETRY_AFTER': 0}):
+            self.assertEqual(retry_uploads(), 1)
+
+        report.refresh_from_db()
+        self.addCleanup(default_storage.delete, report.s3_uri)
+        self.assertEqual((report.upload_status, report.upload_attempts), ('done', 2))
+
+    def test_lost_background_upload_is_retried(self):
+        # Процесс с фоновым потоком завершился до загрузки: отчет остался pending
+        with self.settings(ETL_UPLOAD={'ASYNC_STORAGE': True}), self.captureOnCommitCallbacks(execute=False):
+            report = self.upload('lost.csv', b'col1\nvalue')
+        ReportInfo.objects.filter(id=report.id).update(created_at=timezone.now() - datetime.timedelta(hours=1))
+
+        run_job(claim_next_job())
+        worker_loop(threading.Event(), once=True)
+
+        report.refresh_from_db()
+        self.addCleanup(default_storage.delete, report.s3_uri)
+        self.assertEqual(report.upload_status, 'done')
+        self.assertFalse(os.path.exists(report.local_path))
+
+    def test_upload_retries_are_limited(self):
+        report = self.upload('limit.csv', b'col1\nvalue')
+        ReportInfo.objects.filter(id=report.id).update(upload_status='error', upload_attempts=3,
+                                                       upload_claimed_at=None)
+        with self.settings(ETL_UPLOAD={'RETRY_AFTER': 0, 'MAX_RETRIES': 2}):
+            self.assertEqual(retry_uploads(), 0)
+
+    def test_upload_supersedes_report_of_same_period(self):
+        previous = self.upload('first.csv', b'col1\nvalue')
+
+        def upload(month, supersedes):
+            return self.client.post('/api/upload_report/', {
+                'file': SimpleUploadedFile('second.csv', b'col1\nvalue', content_type='text/csv'),
+                'distributor': 'ООО Дистрибьютор',
+                'month': month,
+                'supersedes': supersedes,
+            }, format='multipart')
+
+        self.assertEqual(upload('2025-04', previous.id).status_code, status.HTTP_400_BAD_REQUEST)
+        response = upload('2024-04', previous.id)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        report = ReportInfo.objects.get(id=response.data['report_id'])
+        self.assertEqual((report.period, report.month, report.supersedes_id), ('2024-04', '04', previous.id))
+        # Один отчет заменяется только одним
+        self.assertEqual(upload('2024-04', previous.id).status_code, status.HTTP_400_BAD_REQUEST)
+
     def test_upload_valid_report(self):
         file = SimpleUploadedFile("test.csv", b"col1,col2\nval1,val2", content_type="text/csv")
         response = self.client.post(
@@ -28,6 +236,23 @@ class UploadReportTest(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
         self.assertIn('report_id', response.data)
 
+    def test_upload_only_enqueues_report(self):
+        file = SimpleUploadedFile("queued.csv", b"col1,col2\nval1,val2", content_type="text/csv")
+        response = self.client.post(
+            '/api/upload_report/',
+            {
+                'file': file,
+                'distributor': 'ООО Дистрибьютор',
+                'month': '2024-04'
+            },
+            format='multipart'
+        )
+        report = ReportInfo.objects.get(id=response.data['report_id'])
+        self.assertEqual(report.status, 'queued')
+        self.assertEqual(report.distributor, 'ООО Дистрибьютор')
+        self.assertEqual(report.month, '04')
+        self.assertFalse(SystemLog.objects.filter(report=report).exists())
+
     def test_upload_without_file(self):
         response = self.client.post(
             '/api/upload_report/',
@@ -40,8 +265,9 @@ class UploadReportTest(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
 
 
-class PipelineTest(TestCase):
+class PipelineTest(ReportsDatabaseMixin, TestCase):
     def setUp(self):
+        super().setUp()
         # Создаём пользователя
         User = get_user_model()
         self.user = User.objects.create_user(username='testuser', password='testpass')
@@ -74,6 +300,16 @@ class PipelineTest(TestCase):
         logs = SystemLog.objects.filter(report=self.report)
         self.assertTrue(logs.exists(), "Логи должны быть созданы после запуска pipeline.")
 
+    def test_pipeline_logs_detection_mode(self):
+        with tempfile.NamedTemporaryFile(delete=False, mode='w+', suffix='.csv') as report_file:
+            report_file.write("Товар,Кол-во\nКрем детский,1\nШампунь,2")
+            report_path = report_file.name
+
+        run_pipeline(report_path, self.report.id, distr='ООО ТестДистрибьютор', month='04')
+        os.unlink(report_path)
+        self.assertTrue(SystemLog.objects.filter(
+            report=self.report, step='transform', message__startswith='Столбцы определены').exists())
+
     def test_pipeline_with_invalid_file(self):
         with tempfile.NamedTemporaryFile(delete=False, mode='w+', suffix='.csv') as bad_file:
             bad_file.write(";;;")  # кривой CSV
@@ -83,6 +319,27 @@ class PipelineTest(TestCase):
         self.report.refresh_from_db()
         self.assertEqual(self.report.status, 'error')
 
+    def test_superseding_report_replaces_previous_rows(self):
+        with tempfile.NamedTemporaryFile(delete=False, mode='w+', suffix='.csv') as report_file:
+            report_file.write("Товар,Кол-во\nКрем детский,1\nШампунь,2")
+        self.addCleanup(os.unlink, report_file.name)
+        distributor = 'ООО ТестДистрибьютор'
+        ReportInfo.objects.filter(id=self.report.id).update(distributor=distributor, month='04', period='2024-04')
+        previous_year = ReportInfo.objects.create(distributor=distributor, month='04', period='2023-04', user=self.user)
+        new = ReportInfo.objects.create(distributor=distributor, month='04', period='2024-04', user=self.user,
+                                        supersedes=self.report)
+
+        for report in (previous_year, self.report, new):
+            run_pipeline(report_file.name, report.id, distr=distributor, month='04')
+        self.assertEqual(sorted(row[-1] for row in self.sales_rows()), [previous_year.id] * 2 + [new.id] * 2)
+
+        # Замененный отчет больше не загружается, в том числе при повторной обработке
+        run_pipeline(report_file.name, self.report.id, distr=distributor, month='04')
+        self.report.refresh_from_db()
+        self.assertEqual(self.report.status, 'error')
+        self.assertIn(f'заменен отчетом {new.id}', self.report.details)
+        self.assertEqual(len(self.sales_rows()), 4)
+
 
 
 
@@ -217,4 +474,1274 @@ class RoleAccessTest(APITestCase):
         self.assertEqual(log_ids, expected)
 
 
+class QueueTest(ReportsDatabaseMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = get_user_model().objects.create_user(username='queueuser', password='testpass')
+
+        with tempfile.NamedTemporaryFile(delete=False, mode='w+', suffix='.csv') as bad_file:
+            bad_file.write(";;;")
+            self.bad_file_path = bad_file.name
+
+    def tearDown(self):
+        os.unlink(self.bad_file_path)
+
+    def create_report(self, **kwargs):
+        return ReportInfo.objects.create(
+            file_name='queued.csv',
+            status=kwargs.pop('status', 'queued'),
+            user=self.user,
+            distributor='ООО Очередь',
+            month='04',
+            local_path=self.bad_file_path,
+            **kwargs
+        )
+
+    def test_claim_takes_oldest_queued_report(self):
+        self.create_report(status='done')
+        first = self.create_report()
+        self.create_report()
+
+        claimed = claim_next_job()
+        self.assertEqual(claimed.id, first.id)
+        self.assertEqual(claimed.status, 'processing')
+        self.assertEqual(claimed.attempts, 1)
+
+    def test_claim_returns_none_on_empty_queue(self):
+        self.create_report(status='done')
+        self.assertIsNone(claim_next_job())
+
+    def test_failed_job_is_retried_until_limit(self):
+        report = self.create_report()
+
+        run_job(claim_next_job(), max_retries=1)
+        report.refresh_from_db()
+        self.assertEqual(report.status, 'queued')
+
+        run_job(claim_next_job(), max_retries=1)
+        report.refresh_from_db()
+        self.assertEqual(report.status, 'error')
+        self.assertEqual(report.attempts, 2)
+        self.assertIsNone(claim_next_job())
+
+    def test_stale_claim_is_requeued_until_limit(self):
+        report = self.create_report()
+        claim_next_job()
+        # Воркер убит: heartbeat больше не обновляется
+        self.assertEqual(requeue_stale_jobs(lease_timeout=60, max_retries=1), 0)
+        ReportInfo.objects.filter(id=report.id).update(heartbeat_at=timezone.now() - datetime.timedelta(minutes=5))
+        self.assertEqual(requeue_stale_jobs(lease_timeout=60, max_retries=1), 1)
+        report.refresh_from_db()
+        self.assertEqual((report.status, report.attempts), ('queued', 1))
+
+        claim_next_job()
+        ReportInfo.objects.filter(id=report.id).update(heartbeat_at=timezone.now() - datetime.timedelta(minutes=5))
+        self.assertEqual(requeue_stale_jobs(lease_timeout=60, max_retries=1), 1)
+        report.refresh_from_db()
+        self.assertEqual((report.status, report.attempts), ('error', 2))
+        self.assertTrue(SystemLog.objects.filter(report=report, log_level='error',
+                                                 message__startswith='Обработка прервана').exists())
+
+
+class CleanupTest(TestCase):
+    def setUp(self):
+        self.transformer = Transformer()
+        self.df = pd.DataFrame(
+            [['Крем', None, 1, None], [None, None, None, None], ['Мыло', None, None, 2]],
+            columns=['Товар', 'Пусто', 'Кол-во', 'Кол-во'],
+            index=[10, 11, 12],
+            dtype=object,
+        )
+
+    def test_clear_excess_columns_keeps_duplicate_names(self):
+        for inplace in (False, True):
+            df = self.df.copy()
+            result = self.transformer.clear_excess_columns(df, inplace=inplace)
+            self.assertEqual(list(result.columns), ['Товар', 'Кол-во', 'Кол-во'])
+            self.assertEqual(result is df, inplace)
+
+    def test_clear_excess_rows_resets_index(self):
+        for inplace in (False, True):
+            df = self.df.copy()
+            result = self.transformer.clear_excess_rows(df, inplace=inplace)
+            self.assertEqual(list(result.index), [0, 1])
+            self.assertEqual(list(result['Товар']), ['Крем', 'Мыло'])
+            self.assertEqual(result is df, inplace)
+        self.assertEqual(len(self.df), 3)
+
+
+class HeaderDetectorTest(TestCase):
+    def setUp(self):
+        self.rows = [
+            ['Отчет по отгрузкам', None, None],
+            [None, None, None],
+            ['Товар', 'Покупатель', None],
+            [None, None, 'Кол-во'],
+            ['Крем детский', 'ООО "Ромашка"', '1,5'],
+            ['Шампунь', 'ИП Иванов', 2],
+        ]
+
+    def test_detect_in_frame(self):
+        df = pd.DataFrame(self.rows[1:], columns=self.rows[0], dtype=object)
+        start, headers = HeaderDetector(window=2).detect(df)
+        self.assertEqual(start, 3)
+        self.assertEqual(headers, ['Товар', 'Покупатель', 'Кол-во'])
+
+    def test_detect_in_row_stream_reads_only_top_of_sheet(self):
+        consumed = []
+
+        def stream():
+            for row in self.rows + [['Мыло', 'ИП Петров', 3]] * 1000:
+                consumed.append(row)
+                yield row
+
+        headers, data = HeaderDetector(window=5).detect_rows(stream())
+        self.assertEqual(headers, ['Товар', 'Покупатель', 'Кол-во'])
+        self.assertEqual(len(consumed), 6)
+        self.assertEqual(next(data), self.rows[4])
+        self.assertEqual(sum(1 for _ in data), 1001)
+
+    def test_first_row_is_never_data(self):
+        # Как при pd.read_excel(header=0): год в заголовке отчета - не начало данных
+        rows = [['Отчет о продажах за год', None, 2024]] + self.rows[1:]
+        headers, data = HeaderDetector(window=2).detect_rows(rows)
+        self.assertEqual(headers, ['Товар', 'Покупатель', 'Кол-во'])
+        self.assertEqual(next(data), self.rows[4])
+
+        headers, _ = HeaderDetector().detect_rows([['Товар', 'Товар', None, None], ['Крем', 'Мыло', 1]])
+        self.assertEqual(headers, ['Товар', 'Товар.1', 'Unnamed: 2', 'Unnamed: 3'])
+
+    def test_no_numeric_rows(self):
+        with self.assertRaises(ValueError):
+            HeaderDetector().detect_rows(self.rows[:4])
+        with self.assertRaises(ValueError):
+            HeaderDetector(max_rows=3).detect(pd.DataFrame(self.rows, dtype=object))
+
+
+class AddressColumnTest(TestCase):
+    def test_update_address_column(self):
+        df = pd.DataFrame({
+            'Адрес полностью': ['г. Пенза', 'ул. Мира, 1', 'г. Самара, ул. Ленина', 'г. Пенза', np.nan, 'Москва'],
+            'Область/Край': ['Пензенская обл.', 'Пензенская обл.', 'Самарская обл.', '', np.nan, 'Москва'],
+            'Город': ['г. Пенза', 'г. Пенза', 'г. Самара', 'г. Пенза', np.nan, 'Москва'],
+            'Улица, номер дома': ['ул. Мира, 1', 'ул. Мира, 1', 'ул. Ленина', 'ул. Мира, 1', np.nan, 'ул. Тверская'],
+        }, dtype=object)
+
+        result = Transformer().update_address_column(df)
+
+        self.assertEqual(list(result['Адрес полностью'].fillna('')), [
+            'Пензенская обл., г. Пенза, ул. Мира, 1',
+            'Пензенская обл., г. Пенза, ул. Мира, 1',
+            'г. Самара, ул. Ленина',  # уже полный адрес, не совпадает с частями
+            'г. Пенза',  # область пустая
+            '',
+            'Москва, Москва, ул. Тверская',
+        ])
+
+
+class ConfigManagerTest(TestCase):
+    def setUp(self):
+        self.config = get_config_manager().get().config
+        with tempfile.NamedTemporaryFile(delete=False, mode='w', suffix='.json', encoding='utf-8') as config_file:
+            self.path = config_file.name
+        self.write(self.config)
+
+    def tearDown(self):
+        os.unlink(self.path)
+
+    def write(self, config):
+        with open(self.path, 'w', encoding='utf-8') as config_file:
+            json.dump(config, config_file, ensure_ascii=False)
+        # mtime меняется не чаще, чем позволяет файловая система, поэтому сдвигаем его явно
+        stat = os.stat(self.path)
+        os.utime(self.path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+    def test_reloads_changed_file(self):
+        manager = ConfigManager(self.path)
+        in_flight = manager.get()
+
+        changed = dict(self.config, product={'items': ['бальзам']})
+        self.write(changed)
+
+        self.assertEqual(manager.get().matchers['product'].words, frozenset(['бальзам']))
+        self.assertEqual(in_flight.matchers['product'].keywords, self.config['product']['items'])
+
+    def test_invalid_version_keeps_previous(self):
+        manager = ConfigManager(self.path)
+        broken = dict(self.config, columns_config=[{'new_column': 'Клиент', 'function': 'find_everything',
+                                                    'config_key': ['client']}])
+        self.write(broken)
+
+        self.assertEqual(manager.get().config['columns_config'], self.config['columns_config'])
+        self.assertIsInstance(manager.last_error, ConfigError)
+
+        with self.assertRaises(ConfigError):
+            ConfigManager(self.path)
+
+    def test_distributor_override(self):
+        override = {
+            'product': {'items': ['бальзам']},
+            'columns_config': [{'new_column': 'Отгрузка, шт', 'function': 'find_header', 'config_key': ['product']}],
+        }
+        self.write(dict(self.config, distributors={'ООО Особый': override}))
+        manager = ConfigManager(self.path)
+
+        special = manager.get(' ООО Особый ')
+        self.assertEqual(special.matchers['product'].words, frozenset(['бальзам']))
+        quantity = [column for column in special.config['columns_config'] if column['new_column'] == 'Отгрузка, шт']
+        self.assertEqual(quantity[0]['config_key'], ['product'])
+        self.assertEqual(len(special.config['columns_config']), len(self.config['columns_config']))
+
+        self.assertIs(manager.get('ООО Обычный'), manager.get())
+        self.assertEqual(manager.get().config['product'], self.config['product'])
+
+    def test_transformer_uses_distributor_config(self):
+        override = {'quantity': {'items': ['Штуки']}}
+        self.write(dict(self.config, distributors={'ООО Особый': override}))
+        transformer = Transformer(config_manager=ConfigManager(self.path))
+        df = pd.DataFrame({'Товар': ['Крем детский'] * 3, 'Штуки': [1, 2, 3]}, dtype=object)
+
+        self.assertEqual(list(transformer.transform(df.copy(), 'ООО Особый', '04')['Отгрузка, шт']), [1, 2, 3])
+        self.assertTrue(transformer.transform(df.copy(), 'ООО Обычный', '04')['Отгрузка, шт'].isna().all())
+
+
+class MappingCacheTest(TestCase):
+    def make_report(self, quantity_header='Кол-во'):
+        rows = [[f'Крем детский {i} мл', f'ООО "Аптека {i % 5}"', i % 7 + 1, f'46067111{i:05d}'] for i in range(60)]
+        return pd.DataFrame(rows, columns=['Товар', 'Покупатель', quantity_header, 'ШК'], dtype=object)
+
+    def transform(self, df):
+        transformer = Transformer(mapping_cache=MappingCache())
+        return transformer, transformer.transform(df, 'ООО Дистрибьютор', '04')
+
+    def test_same_layout_reuses_mapping(self):
+        first, expected = self.transform(self.make_report())
+        second, result = self.transform(self.make_report())
+
+        self.assertEqual(first.detection_mode, 'full')
+        self.assertEqual(second.detection_mode, 'cache')
+        pd.testing.assert_frame_equal(result, expected)
+        self.assertEqual(ColumnMapping.objects.get().hits, 1)
+
+    def test_changed_layout_is_detected_again(self):
+        self.transform(self.make_report())
+        transformer, result = self.transform(self.make_report('Количество'))
+
+        self.assertEqual(transformer.detection_mode, 'full')
+        self.assertEqual(list(result['Отгрузка, шт'])[:3], [1, 2, 3])
+        self.assertEqual(ColumnMapping.objects.count(), 2)
+
+    def test_mapping_failing_sample_check_is_replaced(self):
+        _, expected = self.transform(self.make_report())
+        entry = ColumnMapping.objects.get()
+        entry.mapping = dict(entry.mapping, **{'Название продукта': 1})  # столбец покупателя
+        entry.save()
+
+        transformer, result = self.transform(self.make_report())
+
+        self.assertEqual(transformer.detection_mode, 'full')
+        self.assertIsNotNone(transformer.detection_details)
+        pd.testing.assert_frame_equal(result, expected)
+        self.assertEqual(ColumnMapping.objects.get().mapping['Название продукта'], 0)
+
+
+class TransformerScorerTest(TestCase):
+    def setUp(self):
+        self.transformer = Transformer()
+        self.df = pd.DataFrame({
+            'Товар': ['Крем детский 50мл', 'Шампунь 200 мл', 'Мыло'],
+            'Покупатель': ['ООО "Ромашка"', 'ИП Иванов', np.nan],
+            'Адрес': ['г.Пенза, ул.Ленина, д.1', 'г Самара, ул Мира', 'Москва'],
+            'Регион': ['Пензенская обл.', 'Самарская обл', 'респ. Татарстан'],
+            'ШК': [4606711100532, '4606711703276 ', 12345],
+        }, dtype=object)
+
+    def test_substring_scorer(self):
+        self.assertEqual(self.transformer.find_most_matches_column(self.df, config['product']['items']), 'Товар')
+        self.assertEqual(self.transformer.find_most_matches_column(self.df, config['client']['items']), 'Покупатель')
+
+    def test_word_scorers(self):
+        self.assertEqual(self.transformer.find_word_matches_column(self.df, config['address']['items']), 'Адрес')
+        self.assertEqual(
+            self.transformer.find_filtered_word_matches_column(
+                self.df, config['region']['items'], config['address']['items']),
+            'Регион'
+        )
+
+    def test_numeric_length_scorer(self):
+        self.assertEqual(
+            self.transformer.find_numeric_column_with_length_matches(self.df, config['barcode']['items']),
+            'ШК'
+        )
+
+    def test_scorer_below_threshold_returns_none(self):
+        self.assertIsNone(self.transformer.find_most_matches_column(self.df, ['несуществующее']))
+
+    def test_header_scorers_use_compiled_keywords(self):
+        df = pd.DataFrame(columns=['Товар', 'Кол-во', 'ИНН/inn покупателя'])
+        self.assertEqual(self.transformer.find_header(df, keyword_matchers['quantity']), 'Кол-во')
+        self.assertEqual(self.transformer.find_most_matches_header(df, keyword_matchers['INN']), 'ИНН/inn покупателя')
+        self.assertIsNone(self.transformer.find_header(df, ['товар']))
+
+    def test_keyword_matcher_counts_repeated_keywords(self):
+        matcher = KeywordMatcher(['инн', 'инн', 'inn', 13])
+        self.assertEqual(matcher.count_contained('инн/inn'), 3)
+        self.assertEqual(matcher.count_contained('кпп'), 0)
+        self.assertIn(13, matcher.exact)
+        self.assertNotIn(13, matcher.words)
+
+    def test_classifier_matches_scorers(self):
+        classifier = ColumnClassifier(config)
+        profiles = classifier.profile(self.df)
+        function_args = {
+            column['new_column']: [config[key]['items'] for key in column['config_key']]
+            for column in config['columns_config']
+        }
+
+        for column in config['columns_config']:
+            if column['function'] not in PROFILE_FUNCTIONS:
+                continue
+            expected = getattr(self.transformer, column['function'])(self.df, *function_args[column['new_column']])
+            self.assertEqual(classifier.resolve(column, profiles, len(self.df)), expected, column['new_column'])
+
+    def test_classifier_finds_fio_column(self):
+        df = pd.DataFrame({'Контрагент': ['Иванов И.И.'] * 11 + [np.nan], 'Сумма': list(range(12))}, dtype=object)
+        classifier = ColumnClassifier(config)
+        self.assertEqual(classifier.fio_columns(classifier.profile(df)), ['Контрагент'])
+
+
+def make_sales_report(rows):
+    """
+    Отчет из rows одинаковых строк с заголовком: товар, покупатель, количество.
+
+    """
+    return pd.DataFrame({
+        'Товар': ['Крем детский 50мл'] * rows,
+        'Покупатель': ['ООО "Ромашка"'] * rows,
+        'Количество': [str(i % 7 + 1) for i in range(rows)],
+    }, dtype=object)
+
+
+class SampledDetectionTest(TestCase):
+    def test_large_report_uses_sample(self):
+        df = make_sales_report(3000)
+        transformer = Transformer(sample_size=500, sample_min_rows=1000)
+        mapping = transformer.detect_columns(df, ColumnClassifier(config))
+
+        self.assertEqual(transformer.detection_mode, 'sample')
+        self.assertEqual(mapping['Название продукта'], 'Товар')
+        self.assertEqual(mapping['Клиент'], 'Покупатель')
+
+    def test_close_candidates_fall_back_to_full_scan(self):
+        df = make_sales_report(3000)
+        # Примерно половина строк с ключевыми словами - результат зависит от порога
+        df['Покупатель'] = ['ООО "Ромашка"' if i % 2 else 'Аптека' for i in range(3000)]
+        transformer = Transformer(sample_size=500, sample_min_rows=1000)
+        mapping = transformer.detect_columns(df, ColumnClassifier(config))
+
+        self.assertEqual(transformer.detection_mode, 'full')
+        self.assertIn('Клиент', transformer.detection_details)
+        self.assertEqual(mapping['Клиент'], 'Покупатель')
+
+    def test_small_report_is_scanned_fully(self):
+        transformer = Transformer(sample_size=500, sample_min_rows=1000)
+        transformer.detect_columns(make_sales_report(100), ColumnClassifier(config))
+        self.assertEqual(transformer.detection_mode, 'full')
+
+
+class ParallelProfileTest(TestCase):
+    def tearDown(self):
+        reset_executor()
+
+    def test_pool_profiles_match_serial(self):
+        df = pd.DataFrame({
+            'Товар': ['Крем детский 50мл', None, 'Шампунь 200 мл'] * 50,
+            'Покупатель': ['ООО "Ромашка"', 'Иванов Иван Иванович', np.nan] * 50,
+            'ИНН': ['7707083893', 4606711100532, 3.5] * 50,
+            'Адрес': ['г. Пенза, ул. Мира', '', '😀'] * 50,
+        }, dtype=object)
+        classifier = ColumnClassifier(config)
+
+        serial = [vars(profile) for profile in classifier.profile(df)]
+        parallel = [vars(profile) for profile in profile_parallel(df, classifier.spec, 2)]
+        self.assertEqual(parallel, serial)
+
+    def test_small_report_is_profiled_in_process(self):
+        df = make_sales_report(100)
+        transformer = Transformer(profile_workers=2, profile_min_cells=10_000)
+        with mock.patch('reports.etl.transformers.transformers.profile_parallel') as parallel:
+            mapping = transformer.detect_columns(df, ColumnClassifier(config))
+        parallel.assert_not_called()
+        self.assertEqual(mapping['Клиент'], 'Покупатель')
+
+        transformer.profile_min_cells = 100
+        with mock.patch('reports.etl.transformers.transformers.profile_parallel',
+                        side_effect=profile_parallel) as parallel:
+            self.assertEqual(transformer.detect_columns(df, ColumnClassifier(config)), mapping)
+        parallel.assert_called_once()
+
+
+class MultiSheetTest(ReportsDatabaseMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        from openpyxl import Workbook
+
+        workbook = Workbook()
+        for position, title in enumerate(['Москва', 'Пенза', 'Пусто', 'Склад', 'Примечания']):
+            sheet = workbook.active if position == 0 else workbook.create_sheet()
+            sheet.title = title
+            if title == 'Пусто':
+                sheet.append(['Отчет'])
+                continue
+            if title == 'Примечания':
+                sheet.append(['Примечания'])
+                sheet.append(['Возвраты учтены в следующем месяце'])
+                continue
+            sheet.append([f'Отгрузки: {title}'])
+            if title == 'Склад':
+                sheet.append(['Покупатель', 'Товар', 'Кол-во'])
+                sheet.append(['ООО "Ромашка"', 'Шампунь', 4])
+            else:
+                sheet.append(['Товар', 'Покупатель', 'Кол-во'])
+                sheet.append(['Крем детский', 'ООО "Ромашка"', 1])
+                sheet.append(['Шампунь', 'ООО "Лютик"', 2])
+
+        with tempfile.NamedTemporaryFile(delete=False, suffix='.xlsx') as report_file:
+            self.path = report_file.name
+        workbook.save(self.path)
+
+    def tearDown(self):
+        os.unlink(self.path)
+
+    def test_sheets_with_data_are_extracted(self):
+        sheets = ExcelExtractor().extract_sheets(self.path)
+        self.assertEqual(list(sheets), ['Москва', 'Пенза', 'Склад', 'Примечания'])
+
+        parallel = ExcelExtractor().extract_sheets(self.path, workers=2)
+        self.assertEqual(list(parallel), list(sheets))
+        for name, df in sheets.items():
+            pd.testing.assert_frame_equal(parallel[name], df)
+
+    def test_matching_layouts_are_mapped_once(self):
+        transformer = Transformer()
+        sheets = ExcelExtractor().extract_sheets(self.path)
+        with mock.patch.object(transformer, 'detect_columns', wraps=transformer.detect_columns) as detect:
+            result = transformer.transform_sheets(sheets, 'ООО Дистрибьютор', '04')
+
+        self.assertEqual(detect.call_count, 2)
+        self.assertEqual(transformer.sheet_layouts, 2)
+        self.assertEqual(transformer.skipped_sheets, ['Примечания'])
+        self.assertEqual(list(result['Название продукта']), ['Крем детский', 'Шампунь', 'Крем детский', 'Шампунь', 'Шампунь'])
+        self.assertEqual(list(result.index), list(range(5)))
+
+    def test_pipeline_loads_all_sheets(self):
+        user = get_user_model().objects.create_user(username='sheets', password='testpass')
+        report = ReportInfo.objects.create(s3_uri='sheets.xlsx', file_name='sheets.xlsx', status='queued', user=user)
+
+        with override_settings(ETL_EXTRACT={'SHEETS': 'all'}):
+            run_pipeline(self.path, report.id, distr='ООО Дистрибьютор', month='04')
+
+        report.refresh_from_db()
+        self.assertEqual(report.status, 'done')
+        self.assertEqual(len(self.sales_rows()), 5)
+        self.assertTrue(SystemLog.objects.filter(report=report, message='Листы без строк данных пропущены',
+                                                 details='Примечания').exists())
+
+    def test_workbook_without_data_rows_fails(self):
+        sheets = ExcelExtractor().extract_sheets(self.path)
+        with self.assertRaises(ValueError):
+            Transformer().transform_sheets({'Примечания': sheets['Примечания']}, 'ООО Дистрибьютор', '04')
+
+
+class OutputSchemaTest(TestCase):
+    def test_numbers_with_spaces_and_comma_decimals(self):
+        series = pd.Series([2, 2.5, '1 234,50', '1\u00a0234', '1,234.5', '-3', 'нет', None], dtype=object)
+        self.assertEqual(parse_numbers(series).fillna(0).tolist(), [2, 2.5, 1234.5, 1234, 1234.5, -3, 0, 0])
+
+    def test_decimal_separator_is_the_last_one(self):
+        series = pd.Series(['1.234,50', '1,234.50', '1.234.567,8', '12,5', '0.75'], dtype=object)
+        self.assertEqual(parse_numbers(series).tolist(), [1234.5, 1234.5, 1234567.8, 12.5, 0.75])
+
+    def test_dropped_codes_are_counted(self):
+        dropped = {}
+        df = apply_schema(pd.DataFrame({'ИНН клиента': ['7707083893', 'нет ИНН', ' ', None, '12345678901234']}),
+                          dropped)
+        self.assertEqual(df['ИНН клиента'].notna().sum(), 1)
+        self.assertEqual(dropped, {'ИНН клиента': 2})
+
+    def test_codes_keep_leading_zeros(self):
+        series = pd.Series([274051582, '0274051582', ' 7707083893 ', 253810779187.0, '7707083893, 7707083894', None],
+                           dtype=object)
+        self.assertEqual(normalize_codes(series, (10, 12)).fillna('').tolist(),
+                         ['0274051582', '0274051582', '7707083893', '253810779187', '7707083893', ''])
+
+    def test_codes_are_extracted_from_annotated_strings(self):
+        series = pd.Series(['7707083893/770701001', 'ИНН 7707083893', 'ИНН: 77 07 08 38 93', 'ИНН 253810779187',
+                            'КПП 770701001', 'н/д', '12345678901234567'], dtype=object)
+        self.assertEqual(normalize_codes(series, (10, 12)).fillna('').tolist(),
+                         ['7707083893', '7707083893', '7707083893', '253810779187', '', '', ''])
+        barcodes = pd.Series(['ШК 4606711100532 шт', 'арт. 123'], dtype=object)
+        self.assertEqual(normalize_codes(barcodes, (8, 12, 13, 14)).fillna('').tolist(), ['4606711100532', ''])
+
+    def test_transform_output_is_typed(self):
+        df = pd.DataFrame([
+            ['Товар', 'Покупатель', 'ИНН', 'Штрихкод', 'Кол-во', 'Сумма'],
+            ['Крем детский', 'ООО "Ромашка"', 7707083893, 4606711100532, '2', '1 234,50'],
+            ['Шампунь', 'ООО "Лютик"', 274051582, '4606711703276', 3, 99.9],
+        ], dtype=object)
+        result = Transformer().transform(df, 'ООО Дистрибьютор', '04')
+
+        self.assertEqual(result['Отгрузка, шт'].dtype, 'float64')
+        self.assertEqual(result['Отгрузка, руб'].tolist(), [1234.5, 99.9])
+        self.assertEqual(result['ИНН клиента'].tolist(), ['7707083893', '0274051582'])
+        self.assertEqual(result['Штрихкод продукта'].tolist(), ['4606711100532', '4606711703276'])
+        self.assertEqual(result['Дистрибьютор'].dtype, 'category')
+
+        transformer = Transformer()
+        transformer.transform(df.replace(274051582, 'н/д'), 'ООО Дистрибьютор', '04')
+        self.assertEqual(transformer.dropped_codes, {'ИНН клиента': 1})
+
+    def test_loader_creates_typed_columns(self):
+        with tempfile.TemporaryDirectory() as db_dir:
+            engine = create_engine(f'sqlite:///{os.path.join(db_dir, "reports.sqlite3")}')
+            df = apply_schema(pd.DataFrame({'Отгрузка, руб': ['1,5'], 'ИНН клиента': ['7707083893'], 'Месяц': ['04']}))
+            Loader(engine=engine).load(df)
+            types = {column['name']: str(column['type']) for column in inspect(engine).get_columns('sales')}
+            engine.dispose()
+
+        self.assertEqual(types, {'Отгрузка, руб': 'NUMERIC(18, 2)', 'ИНН клиента': 'VARCHAR(12)', 'Месяц': 'VARCHAR(20)'})
+
+
+@unittest.skipIf(cache.pa is None, 'pyarrow не установлен')
+class ExtractCacheTest(ReportsDatabaseMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.df = pd.DataFrame({
+            'Товар': ['Крем', 1, 2.5, np.nan, None, True, pd.Timestamp('2024-04-01'), pd.Timedelta('1h')],
+            2: [datetime.datetime(2024, 4, 2, 10, 30), datetime.date(2024, 4, 3), pd.NaT, 'ё', 7, 8, 9, 10],
+        }, dtype=object)
+
+    def test_round_trip_keeps_values_and_types(self):
+        extract_cache = cache.ExtractCache(self.directory, 10 ** 9)
+        self.assertTrue(extract_cache.put('key', {None: self.df}))
+        restored = extract_cache.get('key')[None]
+
+        self.assertEqual(list(restored.columns), ['Товар', 2])
+        for column in self.df.columns:
+            for expected, value in zip(self.df[column], restored[column]):
+                self.assertIs(type(value), type(expected))
+                self.assertTrue(value == expected or (pd.isna(value) and pd.isna(expected)))
+
+    def test_least_recently_read_entry_is_evicted(self):
+        extract_cache = cache.ExtractCache(self.directory, 10 ** 9)
+        for key in ('a', 'b'):
+            extract_cache.put(key, {None: self.df})
+        for key, mtime in (('a', 1000), ('b', 2000)):
+            os.utime(os.path.join(self.directory, key, cache.META_FILE), (mtime, mtime))
+        extract_cache.get('a')
+
+        extract_cache.max_bytes = sum(size for _, size, _ in extract_cache.entries())
+        extract_cache.put('c', {None: self.df})
+        self.assertEqual(sorted(os.path.basename(entry) for _, _, entry in extract_cache.entries()), ['a', 'c'])
+
+    def test_vanished_entry_and_failed_eviction_are_skipped(self):
+        extract_cache = cache.ExtractCache(self.directory, 10 ** 9)
+        for key in ('a', 'b'):
+            extract_cache.put(key, {None: self.df})
+
+        listdir = os.listdir
+
+        def racing_listdir(path):
+            if path == os.path.join(self.directory, 'a'):  # запись удалили между проверкой и чтением
+                raise FileNotFoundError(path)
+            return listdir(path)
+
+        with mock.patch('reports.etl.extractors.cache.os.listdir', side_effect=racing_listdir):
+            self.assertEqual([os.path.basename(entry) for _, _, entry in extract_cache.entries()], ['b'])
+
+        with mock.patch.object(extract_cache, 'evict', side_effect=PermissionError('busy')):
+            self.assertTrue(extract_cache.put('c', {None: self.df}))
+        self.assertIsNotNone(extract_cache.get('c'))
+
+    def test_rerun_skips_parsing(self):
+        user = get_user_model().objects.create_user(username='cache', password='testpass')
+        report = ReportInfo.objects.create(s3_uri='cache.csv', file_name='cache.csv', status='queued', user=user)
+        path = os.path.join(self.directory, 'report.csv')
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write('Товар,Кол-во\nКрем детский,1\nШампунь,2')
+
+        with self.settings(ETL_EXTRACT_CACHE={'DIR': os.path.join(self.directory, 'cache')}), \
+                mock.patch.object(CSVExtractor, 'extract', autospec=True, side_effect=CSVExtractor.extract) as extract:
+            run_pipeline(path, report.id, distr='ООО Дистрибьютор', month='04')
+            run_pipeline(path, report.id, distr='ООО Дистрибьютор', month='04')
+
+        self.assertEqual(extract.call_count, 1)
+        report.refresh_from_db()
+        self.assertEqual(report.status, 'done')
+        self.assertTrue(SystemLog.objects.filter(report=report, message='Данные извлечены из кэша').exists())
+
+    def test_restart_does_not_fetch_cached_file(self):
+        user = get_user_model().objects.create_user(username='cachefetch', password='testpass')
+        report = ReportInfo.objects.create(s3_uri='cache.xlsx', file_name='cache.xlsx', status='queued', user=user)
+        path = os.path.join(self.directory, 'report.xlsx')
+        make_sales_report(20).to_excel(path, index=False)
+        fetch_file = mock.Mock()
+
+        with self.settings(ETL_EXTRACT_CACHE={'DIR': os.path.join(self.directory, 'cache')}):
+            run_pipeline(path, report.id, distr='ООО Дистрибьютор', month='04', fetch_file=fetch_file)
+            fetched = fetch_file.call_count
+            self.assertGreater(fetched, 0)
+            os.remove(path)  # локальная копия удалена после загрузки в хранилище
+            for stage in ('transform', 'load'):
+                run_pipeline(path, report.id, distr='ООО Дистрибьютор', month='04', stage=stage, fetch_file=fetch_file)
+                report.refresh_from_db()
+                self.assertEqual(report.status, 'done')
+
+        self.assertEqual(fetch_file.call_count, fetched)
+        self.assertEqual(len(report.file_hash), 64)
+
+
+class ReprocessTest(ReportsDatabaseMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        User = get_user_model()
+        self.manager = User.objects.create_user(username='manager', password='1234', role='manager')
+        self.tech = User.objects.create_user(username='tech', password='1234', role='tech')
+        self.failed = ReportInfo.objects.create(file_name='rep1.csv', status='error', attempts=3, details='KeyError',
+                                                user=self.manager, distributor='ООО Дистрибьютор', month='04')
+        self.done = ReportInfo.objects.create(file_name='rep2.csv', status='done', user=self.tech,
+                                              distributor='ООО Дистрибьютор', month='05')
+        self.processing = ReportInfo.objects.create(file_name='rep3.csv', status='processing', user=self.manager,
+                                                    distributor='ООО Дистрибьютор', month='04')
+
+    def test_owner_requeues_report_from_stage(self):
+        self.client.force_authenticate(self.manager)
+        response = self.client.post(f'/api/reports/{self.failed.id}/reprocess/', {'stage': 'load'}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.failed.refresh_from_db()
+        self.assertEqual((self.failed.status, self.failed.attempts, self.failed.restart_stage, self.failed.details),
+                         ('queued', 0, 'load', None))
+        self.assertEqual(self.client.post(f'/api/reports/{self.done.id}/reprocess/').status_code,
+                         status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.client.post(f'/api/reports/{self.processing.id}/reprocess/').status_code,
+                         status.HTTP_409_CONFLICT)
+        self.assertEqual(self.client.post(f'/api/reports/{self.failed.id}/reprocess/', {'stage': 'upload'},
+                                          format='json').status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_bulk_reprocess_by_distributor_is_tech_only(self):
+        data = {'distributor': 'ООО Дистрибьютор'}
+        self.client.force_authenticate(self.manager)
+        self.assertEqual(self.client.post('/api/reports/reprocess/', data, format='json').status_code,
+                         status.HTTP_403_FORBIDDEN)
+
+        self.client.force_authenticate(self.tech)
+        self.assertEqual(self.client.post('/api/reports/reprocess/', {}, format='json').status_code,
+                         status.HTTP_400_BAD_REQUEST)
+        response = self.client.post('/api/reports/reprocess/', data, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.json(), {'report_ids': [self.failed.id, self.done.id], 'stage': 'transform'})
+        self.processing.refresh_from_db()
+        self.assertEqual(self.processing.status, 'processing')
+
+    def test_superseded_report_is_not_requeued(self):
+        newer = ReportInfo.objects.create(file_name='rep1_v2.csv', status='done', user=self.manager,
+                                          distributor='ООО Дистрибьютор', month='04', supersedes=self.failed)
+        self.client.force_authenticate(self.manager)
+        response = self.client.post(f'/api/reports/{self.failed.id}/reprocess/')
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertIn(str(newer.id), response.json()['detail'])
+
+        self.client.force_authenticate(self.tech)
+        response = self.client.post('/api/reports/reprocess/', {'month': '04'}, format='json')
+        self.assertEqual(response.json()['report_ids'], [newer.id])
+        self.assertEqual(ReportInfo.objects.get(id=self.failed.id).status, 'error')
+
+    def test_command_requeues_month(self):
+        out = StringIO()
+        call_command('reprocess_reports', '--month', '04', '--stage', 'extract', stdout=out)
+
+        self.assertIn('1 отчетов', out.getvalue())
+        self.assertEqual(ReportInfo.objects.get(id=self.failed.id).restart_stage, 'extract')
+        self.assertEqual(ReportInfo.objects.get(id=self.done.id).status, 'done')
+
+    @unittest.skipIf(cache.pa is None, 'pyarrow не установлен')
+    def test_load_stage_uses_stored_output(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, 'report.csv')
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write('Товар,Кол-во\nКрем детский,1\nШампунь,2')
+
+        with self.settings(ETL_EXTRACT_CACHE={'DIR': os.path.join(directory.name, 'cache')}):
+            run_pipeline(path, self.failed.id, distr='ООО Дистрибьютор', month='04')
+            with mock.patch.object(CSVExtractor, 'extract') as extract, \
+                    mock.patch.object(Transformer, 'transform') as transform:
+                run_pipeline(path, self.failed.id, distr='ООО Дистрибьютор', month='04', stage='load')
+
+        extract.assert_not_called()
+        transform.assert_not_called()
+        self.failed.refresh_from_db()
+        self.assertEqual(self.failed.status, 'done')
+        self.assertTrue(SystemLog.objects.filter(report=self.failed, message='Повторная обработка с шага загрузки')
+                        .exists())
+
+    def test_load_stage_without_stored_output_runs_all_stages(self):
+        with tempfile.NamedTemporaryFile(delete=False, mode='w+', suffix='.csv', encoding='utf-8') as report_file:
+            report_file.write('Товар,Кол-во\nКрем детский,1')
+        self.addCleanup(os.remove, report_file.name)
+        ReportInfo.objects.filter(id=self.failed.id).update(restart_stage='load')
+
+        with self.settings(ETL_EXTRACT_CACHE={'ENABLED': False}):
+            run_pipeline(report_file.name, self.failed.id, distr='ООО Дистрибьютор', month='04', stage='load')
+
+        self.failed.refresh_from_db()
+        self.assertEqual((self.failed.status, self.failed.restart_stage), ('done', None))
+
+
+class ChunkedCSVTest(TestCase):
+    def setUp(self):
+        rows = ['Отчет по отгрузкам,,,', 'Товар,Покупатель,Кол-во,ШК']
+        for i in range(250):
+            rows.append(f'Крем детский {i} мл,ООО "Аптека {i % 5}",{i % 7 + 1},46067111{i:05d}')
+        with tempfile.NamedTemporaryFile(delete=False, mode='w+', suffix='.csv', encoding='utf-8') as report_file:
+            report_file.write('\n'.join(rows))
+            self.path = report_file.name
+
+    def tearDown(self):
+        os.unlink(self.path)
+
+    def test_chunks_match_full_transform(self):
+        extractor = CSVExtractor()
+        expected = Transformer().transform(extractor.extract(self.path), 'ООО Дистрибьютор', '04')
+        parts = list(Transformer().transform_chunks(extractor.extract_chunks(self.path, 60), 'ООО Дистрибьютор', '04'))
+
+        self.assertEqual(len(parts), 5)
+        result = pd.concat(parts, ignore_index=True)
+        pd.testing.assert_frame_equal(result, expected, check_dtype=False)
+
+    @override_settings(ETL_EXTRACT={'CSV_CHUNKED_MIN_BYTES': 1024})
+    def test_large_csv_is_processed_in_chunks(self):
+        self.assertTrue(use_chunked_csv(self.path))
+
+
+class ExcelExtractorTest(TestCase):
+    def setUp(self):
+        from openpyxl import Workbook
+
+        workbook = Workbook()
+        sheet = workbook.active
+        sheet.append(['Отчет за апрель'])
+        sheet.append([])
+        sheet.append(['Товар', 'Кол-во', 'Сумма', None, 'Дата'])
+        sheet.append(['Крем детский', 2, 10.5, None, datetime.datetime(2024, 4, 1)])
+        sheet.append(['Шампунь', 3.0, None, None, datetime.datetime(2024, 4, 2)])
+
+        with tempfile.NamedTemporaryFile(delete=False, suffix='.xlsx') as report_file:
+            self.path = report_file.name
+        workbook.save(self.path)
+
+    def tearDown(self):
+        os.unlink(self.path)
+
+    def check_engine(self, engine):
+        expected = pd.read_excel(self.path, dtype='object')
+        extractor = ExcelExtractor(engine)
+        pd.testing.assert_frame_equal(extractor.extract(self.path), expected)
+        pd.testing.assert_frame_equal(rows_to_frame(extractor.iter_rows(self.path)), expected)
+
+    def test_openpyxl_streaming_matches_read_excel(self):
+        self.check_engine('openpyxl')
+
+    @unittest.skipIf(CalamineWorkbook is None, 'python-calamine не установлен')
+    def test_calamine_matches_read_excel(self):
+        self.check_engine('calamine')
+
+    def test_numeric_title_row_matches_read_excel(self):
+        from openpyxl import Workbook
+
+        workbook = Workbook()
+        sheet = workbook.active
+        sheet.append(['Отчет о продажах за год', None, 2024, datetime.datetime(2024, 11, 1)])
+        sheet.append(['Товар', 'Покупатель', 'Кол-во', 'Сумма'])
+        sheet.append(['Крем детский', 'ООО "Ромашка"', 2, 10.5])
+        sheet.append(['Шампунь', 'ИП Иванов', 3, 20])
+        with tempfile.NamedTemporaryFile(delete=False, suffix='.xlsx') as report_file:
+            path = report_file.name
+        workbook.save(path)
+        self.addCleanup(os.unlink, path)
+
+        expected = Transformer().transform(pd.read_excel(path, dtype='object'), 'ООО Дистрибьютор', '04')
+        for engine in ['openpyxl'] + (['calamine'] if CalamineWorkbook is not None else []):
+            with self.subTest(engine=engine):
+                df = extract_first_sheet(ExcelExtractor(engine), path)
+                result = Transformer().transform(df, 'ООО Дистрибьютор', '04')
+                pd.testing.assert_frame_equal(result, expected)
+                self.assertEqual(result['Клиент'].tolist(), ['ООО "Ромашка"', 'ИП Иванов'])
+                self.assertEqual(result['Отгрузка, шт'].tolist(), [2, 3])
+
+    def test_first_sheet_keeps_only_data_rows(self):
+        df = extract_first_sheet(ExcelExtractor('openpyxl'), self.path)
+        self.assertEqual(list(df.columns), ['Товар', 'Кол-во', 'Сумма', 'Unnamed: 3', 'Дата'])
+        self.assertEqual(df['Товар'].tolist(), ['Крем детский', 'Шампунь'])
+
+        transformed = Transformer().transform(df, 'ООО Дистрибьютор', '04')
+        expected = Transformer().transform(pd.read_excel(self.path, dtype='object'), 'ООО Дистрибьютор', '04')
+        pd.testing.assert_frame_equal(transformed, expected)
+
+
+class LoaderStrategyTest(TestCase):
+    def setUp(self):
+        self.db_dir = tempfile.TemporaryDirectory()
+        self.engine = create_engine(f'sqlite:///{os.path.join(self.db_dir.name, "reports.sqlite3")}')
+        self.df = pd.DataFrame({
+            'Название продукта': ['Крем детский', 'Шампунь, 200 мл', 'Мыло "Детское"'],
+            'Отгрузка, шт': [1, 2, np.nan],
+            'Клиент': ['ООО "Ромашка"', np.nan, 'ИП Иванов'],
+            'Месяц': ['04', '04', '04'],
+        })
+
+    def tearDown(self):
+        self.engine.dispose()
+        self.db_dir.cleanup()
+
+    def loaded_rows(self):
+        return pd.read_sql('SELECT * FROM sales', self.engine)
+
+    def test_every_strategy_loads_same_rows(self):
+        for name in STRATEGIES:
+            with self.subTest(strategy=name):
+                Loader(engine=self.engine, strategy=name, options={'CHUNK_SIZE': 2}).load(self.df)
+                loaded = self.loaded_rows()
+                self.assertEqual(len(loaded), len(self.df))
+                self.assertEqual(list(loaded['Клиент'].fillna('')), ['ООО "Ромашка"', '', 'ИП Иванов'])
+                self.assertEqual(list(loaded['Отгрузка, шт'].fillna(0)), [1, 2, 0])
+                with self.engine.begin() as connection:
+                    connection.exec_driver_sql('DROP TABLE sales')
+
+    def test_bulk_copy_follows_existing_column_order(self):
+        Loader(engine=self.engine, strategy='to_sql').load(self.df)
+        Loader(engine=self.engine, strategy='bulk_copy').load(self.df[self.df.columns[::-1]])
+        loaded = self.loaded_rows()
+        self.assertEqual(len(loaded), 6)
+        self.assertEqual(list(loaded['Название продукта'][3:]), list(self.df['Название продукта']))
+
+    def replace_load(self, df, report_id, distributor='ООО Дистрибьютор', period='2024-04', strategy='to_sql',
+                     superseded=(), check=None):
+        loader = Loader(engine=self.engine, strategy=strategy, options={'MODE': 'replace', 'CHUNK_SIZE': 2})
+        with loader.report_load(report_id, distributor, period, superseded=superseded, check=check) as target:
+            target.load(df.assign(**{'Дистрибьютор': distributor, 'Месяц': period.split('-')[1]}))
+            return target.commit()
+
+    def test_replace_mode_reloads_report_without_duplicates(self):
+        for name in STRATEGIES:
+            with self.subTest(strategy=name):
+                self.replace_load(self.df, 1, strategy=name)
+                self.replace_load(self.df, 1, strategy=name)
+                self.replace_load(self.df, 2, distributor='ООО Другой', strategy=name)
+                # Тот же месяц другого года и другой файл (склад) того же периода не заменяются
+                self.replace_load(self.df.head(1), 3, period='2025-04', strategy=name)
+                self.replace_load(self.df.head(1), 4, strategy=name)
+                self.replace_load(self.df.head(2), 5, strategy=name, superseded=[4])
+
+                loaded = self.loaded_rows()
+                self.assertEqual(sorted(loaded['ID отчета']), [1, 1, 1, 2, 2, 2, 3, 5, 5])
+                self.assertEqual(list(loaded[loaded['ID отчета'] == 3]['Название продукта']), ['Крем детский'])
+                self.assertEqual(inspect(self.engine).get_table_names(), ['sales'])
+                self.assertIn('ix_sales_report_id', [index['name'] for index in inspect(self.engine).get_indexes('sales')])
+                with self.engine.begin() as connection:
+                    connection.exec_driver_sql('DROP TABLE sales')
+
+    def test_replace_mode_extends_existing_table(self):
+        Loader(engine=self.engine).load(self.df.assign(**{'Дистрибьютор': 'ООО Старый', 'Месяц': '03'}))
+        self.replace_load(self.df, 5)
+
+        loaded = self.loaded_rows()
+        self.assertEqual(len(loaded), 6)
+        self.assertEqual(list(loaded['ID отчета'].fillna(0)), [0, 0, 0, 5, 5, 5])
+
+    def test_failed_replace_keeps_previous_rows(self):
+        self.replace_load(self.df, 1)
+        loader = Loader(engine=self.engine, options={'MODE': 'replace'})
+        with self.assertRaises(RuntimeError):
+            with loader.report_load(2, 'ООО Дистрибьютор', '2024-04', superseded=[1]) as target:
+                target.load(self.df.head(1).assign(**{'Дистрибьютор': 'ООО Дистрибьютор', 'Месяц': '04'}))
+                raise RuntimeError('ошибка трансформации')
+
+        self.assertEqual(list(self.loaded_rows()['ID отчета']), [1, 1, 1])
+        self.assertEqual(inspect(self.engine).get_table_names(), ['sales'])
+
+    def test_replace_check_cancels_load(self):
+        def superseded():
+            raise ValueError('Отчет заменен отчетом 3, загрузка отменена')
+
+        self.replace_load(self.df, 1)
+        with self.assertRaises(ValueError):
+            self.replace_load(self.df.head(1), 1, check=superseded)
+        self.assertEqual(list(self.loaded_rows()['ID отчета']), [1, 1, 1])
+
+    def test_multi_values_respects_parameter_limit(self):
+        strategy = MultiValuesStrategy({'CHUNK_SIZE': 1000, 'MAX_PARAMS': 2100})
+        self.assertEqual(strategy.rows_per_statement(pd.DataFrame(columns=range(12))), 174)
+
+    def test_unknown_strategy(self):
+        with self.assertRaises(ValueError):
+            Loader(engine=self.engine, strategy='unknown')
+
+    def test_sqlite_connection_url(self):
+        self.assertEqual(
+            build_connection_url({'ENGINE': 'django.db.backends.sqlite3', 'NAME': '/tmp/reports.sqlite3'}),
+            'sqlite:////tmp/reports.sqlite3'
+        )
+
+
+class EngineRegistryTest(APITestCase):
+    def setUp(self):
+        self.db_dir = tempfile.TemporaryDirectory()
+        self.databases_override = override_settings(DATABASES={
+            **settings.DATABASES,
+            'reports': {
+                'ENGINE': 'django.db.backends.sqlite3',
+                'NAME': os.path.join(self.db_dir.name, 'reports.sqlite3'),
+                'POOL': {'SIZE': 3, 'MAX_OVERFLOW': 1},
+            },
+        })
+        self.databases_override.enable()
+        dispose_engines()
+
+    def tearDown(self):
+        dispose_engines()
+        self.databases_override.disable()
+        self.db_dir.cleanup()
+
+    def test_engine_is_shared_between_loaders(self):
+        first = Loader().get_engine()
+        second = Loader().get_engine()
+        self.assertIs(first, second)
+        self.assertIs(first, get_engine('reports'))
+
+    def test_pool_metrics(self):
+        engine = get_engine('reports')
+        with engine.connect():
+            metrics = pool_metrics()
+        self.assertEqual(len(metrics), 1)
+        self.assertEqual(metrics[0]['size'], 3)
+        self.assertEqual(metrics[0]['checked_out'], 1)
+        self.assertEqual(metrics[0]['max_overflow'], 1)
+
+    def test_pool_metrics_endpoint_for_tech_only(self):
+        manager = get_user_model().objects.create_user(username='poolmanager', password='1234', role='manager')
+        tech = get_user_model().objects.create_user(username='pooltech', password='1234', role='tech')
+        get_engine('reports')
+
+        self.client.force_authenticate(manager)
+        self.assertEqual(self.client.get('/api/etl/pool/').status_code, status.HTTP_403_FORBIDDEN)
+
+        self.client.force_authenticate(tech)
+        # Пулы есть только у воркеров: endpoint показывает сохраненные ими снимки
+        save_pool_metrics()
+        response = self.client.get('/api/etl/pool/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data[0]['alias'], 'reports')
+        self.assertEqual(response.data[0]['worker'], worker_name())
+
+        clear_pool_metrics()
+        self.assertEqual(self.client.get('/api/etl/pool/').data, [])
+
+    def test_pipeline_saves_pool_metrics(self):
+        user = get_user_model().objects.create_user(username='pooluser', password='1234')
+        report = ReportInfo.objects.create(file_name='pool.csv', status='queued', user=user)
+        with tempfile.NamedTemporaryFile(delete=False, mode='w', suffix='.csv', encoding='utf-8') as report_file:
+            report_file.write('Товар,Кол-во\nКрем детский,1')
+        self.addCleanup(os.unlink, report_file.name)
+
+        with self.settings(ETL_EXTRACT_CACHE={'ENABLED': False}):
+            run_pipeline(report_file.name, report.id, distr='ООО Дистрибьютор', month='04')
+        snapshot = PoolMetric.objects.get(worker=worker_name())
+        self.assertEqual((snapshot.alias, snapshot.checked_out), ('reports', 0))
+
+
+class LogBufferTest(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='loguser', password='testpass')
+        self.report = ReportInfo.objects.create(file_name='log.csv', status='queued', user=self.user)
+
+    def saved_messages(self):
+        return list(SystemLog.objects.filter(report=self.report).order_by('id').values_list('message', flat=True))
+
+    def test_entries_are_saved_on_step_change(self):
+        logs = LogBuffer(self.report.id)
+        logs.log('Начало извлечения', step='extract')
+        logs.log('Извлечение завершено', step='extract')
+        self.assertEqual(self.saved_messages(), [])
+
+        logs.log('Начало трансформации', step='transform')
+        self.assertEqual(self.saved_messages(), ['Начало извлечения', 'Извлечение завершено'])
+
+        logs.close()
+        self.assertEqual(self.saved_messages()[-1], 'Начало трансформации')
+
+    def test_error_is_saved_immediately(self):
+        logs = LogBuffer(self.report.id)
+        logs.log('Начало загрузки', step='load')
+        logs.log('Ошибка загрузки', step='load', log_level='error')
+        self.assertEqual(self.saved_messages(), ['Начало загрузки', 'Ошибка загрузки'])
+        logs.close()
+
+    def test_timestamps_are_taken_at_log_time(self):
+        with LogBuffer(self.report.id) as logs:
+            logs.log('Первая запись')
+            logs.entries[0].timestamp -= datetime.timedelta(minutes=5)
+            logs.log('Вторая запись')
+
+        first, second = SystemLog.objects.filter(report=self.report).order_by('id')
+        self.assertEqual(first.message, 'Первая запись')
+        self.assertGreaterEqual(second.timestamp - first.timestamp, datetime.timedelta(minutes=5))
+
+    def test_pipeline_writes_logs_in_order(self):
+        run_pipeline('report.pdf', self.report.id, distr='ООО ТестДистрибьютор', month='04')
+        self.assertEqual(self.saved_messages(), [
+            'Запуск обработки файла',
+            'Расширение не соответствует требованиям',
+            'Обработка отчета прервана исключением',
+        ])
+
+
+class LogBufferBackgroundTest(TransactionTestCase):
+    def test_background_thread_flushes_buffer(self):
+        user = get_user_model().objects.create_user(username='bgloguser', password='testpass')
+        report = ReportInfo.objects.create(file_name='log.csv', status='queued', user=user)
+
+        logs = LogBuffer(report.id, background_interval=0.05)
+        logs.log('Фоновая запись', step='transform')
+        # Ждем буфер, а не строку в БД: чтение во время записи из потока блокирует таблицу SQLite
+        for _ in range(100):
+            with logs.lock:
+                if not logs.entries:
+                    break
+            time.sleep(0.05)
+        self.assertFalse(logs.entries)
+        logs.close()
+
+        self.assertEqual(SystemLog.objects.filter(report=report).count(), 1)
+
+
+class HeartbeatTest(TransactionTestCase):
+    def test_heartbeat_keeps_claim_alive(self):
+        user = get_user_model().objects.create_user(username='heartbeatuser', password='testpass')
+        report = ReportInfo.objects.create(file_name='heartbeat.csv', status='processing', user=user,
+                                           heartbeat_at=timezone.now() - datetime.timedelta(minutes=5))
+
+        # Не читаем отчет, пока поток пишет: чтение во время записи из потока блокирует таблицу SQLite
+        with Heartbeat(report.id, interval=0.05):
+            time.sleep(0.3)
+
+        self.assertEqual(requeue_stale_jobs(lease_timeout=60), 0)
+        report.refresh_from_db()
+        self.assertEqual(report.status, 'processing')
+        self.assertGreater(report.heartbeat_at, timezone.now() - datetime.timedelta(minutes=1))
+
+    def test_heartbeat_survives_database_error(self):
+        user = get_user_model().objects.create_user(username='heartbeatfail', password='testpass')
+        report = ReportInfo.objects.create(file_name='heartbeat.csv', status='processing', user=user,
+                                           heartbeat_at=timezone.now() - datetime.timedelta(minutes=5))
+
+        original = ReportInfo.objects.filter
+        calls = []
+
+        def flaky_filter(*args, **kwargs):
+            calls.append(1)
+            if len(calls) == 1:
+                raise OperationalError('database is locked')
+            return original(*args, **kwargs)
+
+        with mock.patch.object(ReportInfo.objects, 'filter', side_effect=flaky_filter):
+            with Heartbeat(report.id, interval=0.05):
+                time.sleep(0.3)
+
+        self.assertGreater(len(calls), 1)
+        report.refresh_from_db()
+        self.assertGreater(report.heartbeat_at, timezone.now() - datetime.timedelta(minutes=1))
+
+
+class WorkerResilienceTest(TestCase):
+    def test_worker_loop_survives_database_error(self):
+        stop_event = threading.Event()
+        with mock.patch('reports.etl.queue.claim_next_job', side_effect=[OperationalError('gone away'), None]) as claim, \
+                mock.patch('reports.etl.queue.retry_uploads'):
+            worker_loop(stop_event, poll_interval=0, once=True)
+        self.assertEqual(claim.call_count, 2)
+
+    def test_pool_restarts_crashed_worker(self):
+        pool = WorkerPool(concurrency=1, poll_interval=0)
+        exit_codes = iter([1, 0])
+
+        def start_worker(index):
+            process = multiprocessing.Process(target=sys.exit, args=(next(exit_codes),))
+            process.start()
+            return process
+
+        with mock.patch.object(pool, 'start_worker', side_effect=start_worker) as start:
+            pool.start()
+            pool.join()
+        self.assertEqual(start.call_count, 2)
+        self.assertEqual(pool.processes[0].exitcode, 0)
+
+
+class StageMetricTest(ReportsDatabaseMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = get_user_model().objects.create_user(username='metricuser', password='testpass')
+        self.report = ReportInfo.objects.create(file_name='metrics.csv', status='queued', user=self.user)
+
+        rows = ['Отчет по отгрузкам,,,', 'Товар,Покупатель,Кол-во,ШК']
+        for i in range(250):
+            rows.append(f'Крем детский {i} мл,ООО "Аптека {i % 5}",{i % 7 + 1},46067111{i:05d}')
+        with tempfile.NamedTemporaryFile(delete=False, mode='w+', suffix='.csv', encoding='utf-8') as report_file:
+            report_file.write('\n'.join(rows))
+            self.path = report_file.name
+
+    def tearDown(self):
+        os.unlink(self.path)
+
+    def metrics(self):
+        return {(metric.stage, metric.name): metric for metric in StageMetric.objects.filter(report=self.report)}
+
+    def check_stages(self, metrics):
+        self.report.refresh_from_db()
+        self.assertEqual(self.report.status, 'done')
+
+        self.assertEqual(metrics[('extract', '')].rows, 251)
+        self.assertEqual(metrics[('load', '')].rows, 250)
+        for function in {column['function'] for column in config['columns_config']}:
+            self.assertIn(('transform', function), metrics)
+        self.assertIn(('transform', 'profile'), metrics)
+
+        for metric in metrics.values():
+            self.assertGreaterEqual(metric.wall_time, 0)
+            self.assertGreaterEqual(metric.cpu_time, 0)
+            self.assertGreater(metric.peak_rss, 0)
+
+    def test_pipeline_records_stage_metrics(self):
+        run_pipeline(self.path, self.report.id, distr='ООО Дистрибьютор', month='04')
+        metrics = self.metrics()
+        self.check_stages(metrics)
+        self.assertEqual(metrics[('transform', '')].rows, 251)
+
+    @override_settings(ETL_EXTRACT={'CSV_CHUNKED_MIN_BYTES': 0, 'CSV_CHUNK_SIZE': 60})
+    def test_chunked_pipeline_sums_chunks(self):
+        run_pipeline(self.path, self.report.id, distr='ООО Дистрибьютор', month='04')
+        metrics = self.metrics()
+        self.check_stages(metrics)
+        self.assertEqual(metrics[('transform', '')].rows, 251)
+        self.assertEqual(metrics[('transform', 'clear_excess_rows')].rows, 250)
+
+
+class StageMetricApiTest(APITestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.manager = User.objects.create_user(username='manager', password='1234', role='manager')
+        self.tech = User.objects.create_user(username='tech', password='1234', role='tech')
+
+        self.report1 = ReportInfo.objects.create(file_name='rep1.csv', status='done', user=self.manager,
+                                                 distributor='ООО Первый')
+        self.report2 = ReportInfo.objects.create(file_name='rep2.csv', status='done', user=self.tech,
+                                                 distributor='ООО Второй')
+        StageMetric.objects.create(report=self.report1, stage='load', wall_time=1.0, cpu_time=0.5,
+                                   peak_rss=1, rows=10)
+        StageMetric.objects.create(report=self.report2, stage='load', wall_time=2.0, cpu_time=1.0,
+                                   peak_rss=1, rows=20)
+
+    def test_manager_sees_only_own_metrics(self):
+        self.client.force_authenticate(self.manager)
+        response = self.client.get('/api/metrics/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([metric['report'] for metric in response.json()], [self.report1.id])
+
+    def test_tech_filters_by_distributor(self):
+        self.client.force_authenticate(self.tech)
+        response = self.client.get('/api/metrics/', {'distributor': 'ООО Второй'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([metric['rows'] for metric in response.json()], [20])
+
+
+class BatchTest(ReportsDatabaseMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        User = get_user_model()
+        self.manager = User.objects.create_user(username='manager', password='1234', role='manager')
+        self.tech = User.objects.create_user(username='tech', password='1234', role='tech')
+
+        with tempfile.NamedTemporaryFile(delete=False, mode='w+', suffix='.csv', encoding='utf-8') as report_file:
+            report_file.write("Товар,Кол-во\nКрем детский,1\nШампунь,2")
+            self.path = report_file.name
+
+        self.good = ReportInfo.objects.create(file_name='good.csv', status='queued', user=self.manager,
+                                              local_path=self.path, distributor='ООО Дистрибьютор', month='04')
+        self.bad = ReportInfo.objects.create(file_name='bad.pdf', status='queued', user=self.manager,
+                                             local_path='report.pdf', distributor='ООО Дистрибьютор', month='04')
+        self.done = ReportInfo.objects.create(file_name='done.csv', status='done', user=self.manager)
+
+    def tearDown(self):
+        os.unlink(self.path)
+
+    def test_run_batch_reports_progress(self):
+        progress = []
+        results = run_batch([self.good.id, self.bad.id, self.done.id], processes=1, max_retries=1,
+                            progress=lambda tracker, report_id, status, seconds: progress.append(
+                                (tracker.finished, tracker.total, status)))
+
+        self.assertEqual(results, {self.good.id: 'done', self.bad.id: 'error', self.done.id: 'skipped'})
+        self.assertEqual(progress, [(1, 3, 'done'), (2, 3, 'error'), (3, 3, 'skipped')])
+        self.bad.refresh_from_db()
+        self.assertEqual(self.bad.attempts, 2)
+
+    def test_command_prints_aggregate_progress(self):
+        out = StringIO()
+        call_command('run_etl_batch', str(self.good.id), str(self.bad.id), processes=1, max_retries=0, stdout=out)
+        output = out.getvalue()
+        self.assertIn(f'[2/2] отчет {self.bad.id}: error', output)
+        self.assertIn('Обработано: 1 из 2', output)
+
+    def test_batch_api(self):
+        self.client.force_authenticate(self.manager)
+        response = self.client.post('/api/etl/batches/', {'report_ids': [self.good.id]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        self.client.force_authenticate(self.tech)
+        with mock.patch('reports.views.launch_batch') as launch:
+            response = self.client.post('/api/etl/batches/', {'report_ids': [self.good.id, self.done.id],
+                                                              'processes': 2}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        batch = ReportBatch.objects.get(id=response.data['id'])
+        launch.assert_called_once_with(batch)
+        self.assertEqual(response.data['total'], 2)
+        self.assertEqual(response.data['finished'], 1)
+
+        call_command('run_etl_batch', batch=batch.id, processes=1, stdout=StringIO())
+        response = self.client.get(f'/api/etl/batches/{batch.id}/')
+        self.assertEqual(response.data['status'], 'done')
+        self.assertEqual(response.data['percent'], 100.0)
+        self.assertEqual(response.data['counts']['done'], 2)
+
+    def test_launched_batch_is_reaped(self):
+        batch = ReportBatch.objects.create(user=self.tech)
+        process = subprocess.Popen([sys.executable, '-c', 'pass'])
+        with mock.patch('reports.etl.batch.subprocess.Popen', return_value=process):
+            self.assertIs(launch_batch(batch), process)
+
+        deadline = time.monotonic() + 10
+        while process.returncode is None and time.monotonic() < deadline:
+            time.sleep(0.05)
+        self.assertEqual(process.returncode, 0)
+
+    def test_batch_api_rejects_unknown_reports(self):
+        self.client.force_authenticate(self.tech)
+        response = self.client.post('/api/etl/batches/', {'report_ids': [self.good.id, 999]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(ReportBatch.objects.exists())
 
@@ -1,9 +1,16 @@
 from django.urls import path, include
 
-from reports.views import UploadReportView, ReportListView, SystemLogListView
+from reports.views import UploadReportView, ReportListView, SystemLogListView, PoolMetricsView, \
+    StageMetricListView, ReportBatchView, ReprocessReportView, BulkReprocessView
 
 urlpatterns = [
     path('upload_report/', UploadReportView.as_view(), name='upload-report') ,
     path('reports/', ReportListView.as_view()),
+    path('reports/reprocess/', BulkReprocessView.as_view()),
+    path('reports/<int:report_id>/reprocess/', ReprocessReportView.as_view()),
     path('logs/', SystemLogListView.as_view()),
+    path('metrics/', StageMetricListView.as_view()),
+    path('etl/batches/', ReportBatchView.as_view()),
+    path('etl/batches/<int:batch_id>/', ReportBatchView.as_view()),
+    path('etl/pool/', PoolMetricsView.as_view()),
 ]
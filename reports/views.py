@@ -1,19 +1,17 @@
-import os
 from rest_framework.views import APIView
 from rest_framework.parsers import MultiPartParser
 from rest_framework.response import Response
 from rest_framework import status, generics, permissions
-from django.conf import settings
-from django.core.files.storage import default_storage
-from .models import ReportInfo, SystemLog
-from .serializers import ReportInfoSerializer, SystemLogsSerializer
-from reports.etl.pipeline import run_pipeline
+from .models import ReportInfo, SystemLog, StageMetric, ReportBatch, PoolMetric
+from reports.etl.batch import batch_progress, launch_batch
+from reports.etl.reprocess import reprocess_reports
+from reports.etl.uploads import get_storage_path, spool_upload, submit_upload
+from .serializers import ReportInfoSerializer, SystemLogsSerializer, StageMetricSerializer, ReportBatchSerializer, \
+    ReprocessSerializer, BulkReprocessSerializer, PoolMetricSerializer
 from rest_framework.generics import CreateAPIView
 from .serializers import UploadReportSerializer
 from rest_framework.permissions import IsAuthenticated
-from django.core.files.storage import default_storage
 from django.utils.text import slugify
-from uuid import uuid4
 
 class UploadReportView(CreateAPIView):
     parser_classes = [MultiPartParser]
@@ -25,31 +23,25 @@ class UploadReportView(CreateAPIView):
         serializer.is_valid(raise_exception=True)
 
         file = serializer.validated_data['file']
-        distributor = request.data.get('distributor')
-        month = request.data.get('month').split("-")[1]
+        distributor = serializer.validated_data['distributor']
+        period = serializer.validated_data['month']
+        month = period.split("-")[1]
         f_name = f"{distributor}-{month}"
 
-        filename = f"{uuid4().hex}_{file.name}"
-        s3_path = f"uploads_{month}/{filename}"
-
-        saved_path = default_storage.save(s3_path, file)
-
-        tmp_dir = os.path.join(settings.BASE_DIR, 'temp_media')
-        os.makedirs(tmp_dir, exist_ok=True)
-
-        tmp_path = os.path.join(tmp_dir, file.name)
-        with open(tmp_path, 'wb+') as destination:
-            for chunk in file.chunks():
-                destination.write(chunk)
+        # Файл записывается на диск один раз; в хранилище он загружается из этой же копии
+        local_path = spool_upload(file)
 
         report = ReportInfo.objects.create(
-            s3_uri=saved_path,
             file_name=f_name,
             status='queued',
-            user=request.user
+            user=request.user,
+            distributor=distributor,
+            month=month,
+            period=period,
+            supersedes=serializer.validated_data.get('supersedes'),
+            local_path=local_path
         )
-
-        run_pipeline(tmp_path, report.id, distributor, month)
+        submit_upload(report, get_storage_path(report))
 
         return Response({"report_id": report.id}, status=status.HTTP_201_CREATED)
 
@@ -73,4 +65,131 @@ class SystemLogListView(generics.ListAPIView):
         user = self.request.user
         if user.role == 'tech':
             return SystemLog.objects.all().order_by('-timestamp')
-        return SystemLog.objects.filter(report__user=user).order_by('-timestamp')
\ No newline at end of file
+        return SystemLog.objects.filter(report__user=user).order_by('-timestamp')
+
+
+class StageMetricListView(generics.ListAPIView):
+    """
+    Замеры шагов обработки отчетов. Фильтры: ?report=<id>, ?distributor=, ?stage=.
+
+    """
+    serializer_class = StageMetricSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        user = self.request.user
+        if user.role == 'tech':
+            queryset = StageMetric.objects.all()
+        else:
+            queryset = StageMetric.objects.filter(report__user=user)
+
+        params = self.request.query_params
+        if params.get('report'):
+            queryset = queryset.filter(report_id=params['report'])
+        if params.get('distributor'):
+            queryset = queryset.filter(report__distributor=params['distributor'])
+        if params.get('stage'):
+            queryset = queryset.filter(stage=params['stage'])
+
+        return queryset.select_related('report').order_by('-created_at', 'id')
+
+
+class PoolMetricsView(APIView):
+    """
+    GET - последние снимки пулов соединений воркеров (PoolMetric). Снимок
+    обновляется после каждого отчета; updated_at показывает его возраст.
+
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        if request.user.role != 'tech':
+            return Response(status=status.HTTP_403_FORBIDDEN)
+        metrics = PoolMetric.objects.order_by('worker', 'alias', 'id')
+        return Response(PoolMetricSerializer(metrics, many=True).data)
+
+
+class ReportBatchView(APIView):
+    """
+    POST - запустить пакетную обработку отчетов в пуле процессов,
+    GET <id> - общий прогресс пакета по статусам отчетов.
+
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        if request.user.role != 'tech':
+            return Response(status=status.HTTP_403_FORBIDDEN)
+
+        serializer = ReportBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        report_ids = set(serializer.validated_data['report_ids'])
+
+        reports = ReportInfo.objects.filter(id__in=report_ids)
+        missing = report_ids - set(reports.values_list('id', flat=True))
+        if missing:
+            return Response({'report_ids': f'Отчеты не найдены: {sorted(missing)}'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        batch = ReportBatch.objects.create(user=request.user, processes=serializer.validated_data.get('processes'))
+        reports.update(batch=batch)
+        launch_batch(batch)
+
+        return Response(batch_progress(batch), status=status.HTTP_202_ACCEPTED)
+
+    def get(self, request, batch_id):
+        if request.user.role != 'tech':
+            return Response(status=status.HTTP_403_FORBIDDEN)
+        try:
+            batch = ReportBatch.objects.get(id=batch_id)
+        except ReportBatch.DoesNotExist:
+            return Response(status=status.HTTP_404_NOT_FOUND)
+        return Response(batch_progress(batch))
+
+
+class ReprocessReportView(APIView):
+    """
+    POST - повторно обработать отчет с шага stage (extract, transform, load)
+    без повторной загрузки файла.
+
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request, report_id):
+        reports = ReportInfo.objects.filter(id=report_id)
+        if request.user.role != 'tech':
+            reports = reports.filter(user=request.user)
+        if not reports.exists():
+            return Response(status=status.HTTP_404_NOT_FOUND)
+
+        serializer = ReprocessSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        superseding_id = ReportInfo.objects.filter(supersedes_id=report_id).values_list('id', flat=True).first()
+        if superseding_id:
+            return Response({'detail': f'Отчет заменен отчетом {superseding_id}'}, status=status.HTTP_409_CONFLICT)
+        if not reprocess_reports(reports, serializer.validated_data['stage']):
+            return Response({'detail': 'Отчет уже обрабатывается'}, status=status.HTTP_409_CONFLICT)
+
+        return Response(ReportInfoSerializer(reports.get()).data, status=status.HTTP_202_ACCEPTED)
+
+
+class BulkReprocessView(APIView):
+    """
+    POST - повторно обработать все отчеты дистрибьютора и/или месяца,
+    например после изменения конфига столбцов. Замененные отчеты пропускаются.
+
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        if request.user.role != 'tech':
+            return Response(status=status.HTTP_403_FORBIDDEN)
+
+        serializer = BulkReprocessSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        filters = {field: serializer.validated_data[field] for field in ('distributor', 'month')
+                   if serializer.validated_data.get(field)}
+
+        report_ids = reprocess_reports(ReportInfo.objects.filter(**filters), serializer.validated_data['stage'])
+        return Response({'report_ids': report_ids, 'stage': serializer.validated_data['stage']},
+                        status=status.HTTP_202_ACCEPTED)